@@ -1,4 +1,5 @@
 const cartService = require("../services/cartService"); 
+const { trackEvent } = require("../services/recommendationEventService");
 
 const addOrUpdateCartItem = async (req, res) => {
     try {
@@ -22,6 +23,10 @@ const addOrUpdateCartItem = async (req, res) => {
             quantity   
         );
 
+        if (parseInt(quantity, 10) > 0) {
+            trackEvent({ sessionId: userId.toString(), productId, type: "cart" });
+        }
+
         if (updatedCart === null && parseInt(quantity, 10) === 0) {
             return res.status(200).json({ message: "Item not in cart, nothing removed.", cart: null });
         }
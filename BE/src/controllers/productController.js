@@ -1,5 +1,6 @@
 const { default: mongoose } = require("mongoose");
 const { createProductService, getAllProductsService, getProductByIdService, getProductsByNameService, updateProductService, deleteProductService, getProductsByCategoryService, searchProductService, getVariantByIdService, updateVariantService, deleteVariantService, updateVariantStockService, addVariantToProductService, getFeaturedProductsService } = require("../services/productService");
+const { trackEvent } = require("../services/recommendationEventService");
 
 const createProduct = async (req, res) => {
 
@@ -21,13 +22,17 @@ const createProduct = async (req, res) => {
 
 const getAllProducts = async (req, res) => {
   try {
-    const { sort } = req.query;
+    const { sort, page, limit } = req.query;
 
     let sortParam = sort;
     if (sort === 'popular') {
       sortParam = 'purchasedQuantity:desc';
     }
-    const data = await getAllProductsService(sortParam);
+    // Optional paging (page is 1-based); without limit the whole catalog is returned
+    const data = await getAllProductsService(sortParam, {
+      page: Number(page) || 1,
+      limit: Number(limit) || 0,
+    });
     res.status(200).json(data);
   } catch (error) {
     console.error("Error in getAllProducts controller:", error);
@@ -39,6 +44,13 @@ const getProductById = async (req, res) => {
   try {
     const { id } = req.params;
     const data = await getProductByIdService(id);
+    // Signed-in views are keyed on the user id, like cart adds (cartController), so both
+    // land in one session; anonymous callers may send an opaque x-session-id instead
+    const anonymousId = req.headers["x-session-id"];
+    const sessionId = req.user?._id?.toString() || (anonymousId ? `anon:${anonymousId}` : null);
+    if (sessionId) {
+      trackEvent({ sessionId, productId: id, type: "view" });
+    }
     res.status(200).json(data);
   } catch (error) {
     console.error(`Error in getProductById controller for ID ${req.params.id}:`, error);
@@ -1,5 +1,10 @@
 const axios = require('axios');
 const logger = require('../config/logger');
+const {
+    getPrecomputedUserItems,
+    getPrecomputedSimilarItems,
+    getRankedProducts
+} = require('../services/precomputedRecommendationService');
 
 const getUserRecommendations = async (req, res) => {
     const userId = req.query.userId;
@@ -15,9 +20,40 @@ const getUserRecommendations = async (req, res) => {
         return res.status(401).json({ message: "Authorization header is required" });
     }
 
+    // A personalised list is only readable by its owner or an admin (same rule as
+    // /user/:userId/purchased-products, which the recommendation service checks too)
+    const authenticatedUser = req.user;
+    const canReadUserList = Boolean(authenticatedUser?._id) &&
+        (authenticatedUser._id.toString() === userId || authenticatedUser.role === 'ADMIN');
+
+    // Lists precomputed by the recommender are served straight from MongoDB; category
+    // filters and field projections still go through the recommendation service
+    if (canReadUserList && !req.query.category && !req.query.fields) {
+        try {
+            const items = await getPrecomputedUserItems(userId);
+            if (items && items.length > 0) {
+                if (req.query.mode === 'ids') {
+                    return res.status(200).json(items);
+                }
+                const products = await getRankedProducts(items);
+                if (products.length > 0) {
+                    return res.status(200).json(products);
+                }
+            }
+        } catch (error) {
+            logger.warn(`Precomputed recommendations unavailable: ${error.message}`);
+        }
+    }
+
     try {
         const response = await axios.get('http://localhost:5000/recommendations', {
-            params: { userId },
+            // mode=ids / fields=... / category=... are passed through so callers can ask for lean payloads
+            params: {
+                userId,
+                mode: req.query.mode,
+                fields: req.query.fields,
+                category: req.query.category
+            },
             headers: {
                 'Authorization': authHeader
             },
@@ -31,6 +67,10 @@ const getUserRecommendations = async (req, res) => {
 
         return res.status(200).json(response.data);
     } catch (error) {
+        const status = error.response?.status;
+        if (status === 401 || status === 403) {
+            return res.status(status).json({ message: error.response.data?.error || "Not allowed" });
+        }
         logger.error(`Recommendation failed: ${error.message}`);
         return res.status(500).json({
             message: error.response?.data?.error || "Recommendation service unavailable"
@@ -38,4 +78,39 @@ const getUserRecommendations = async (req, res) => {
     }
 };
 
-module.exports = { getUserRecommendations };
\ No newline at end of file
+// The signed-in user's own session (views and cart adds are keyed on their id); the
+// recommendation service only answers callers holding the API key
+const getSessionRecommendations = async (req, res) => {
+    const userId = req.user?._id?.toString();
+    if (!userId) {
+        return res.status(401).json({ message: "Authentication required." });
+    }
+
+    try {
+        const response = await axios.get('http://localhost:5000/session-recommendations', {
+            params: { sessionId: userId, limit: Number(req.query.limit) || 10 },
+            headers: { 'x-api-key': process.env.API_KEY },
+            timeout: 5000
+        });
+        return res.status(200).json(response.data);
+    } catch (error) {
+        logger.error(`Session recommendations failed: ${error.message}`);
+        return res.status(500).json({ message: "Recommendation service unavailable" });
+    }
+};
+
+const getSimilarProducts = async (req, res) => {
+    const { id } = req.params;
+    const limit = Number(req.query.limit) || 10;
+
+    try {
+        const items = (await getPrecomputedSimilarItems(id)) || [];
+        const products = await getRankedProducts(items.slice(0, limit));
+        return res.status(200).json(products);
+    } catch (error) {
+        logger.error(`Similar products failed for ${id}: ${error.message}`);
+        return res.status(500).json({ message: "Failed to retrieve similar products." });
+    }
+};
+
+module.exports = { getUserRecommendations, getSessionRecommendations, getSimilarProducts };
\ No newline at end of file
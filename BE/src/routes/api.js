@@ -59,6 +59,8 @@ const {
 
 const {
   getUserRecommendations,
+  getSessionRecommendations,
+  getSimilarProducts,
 } = require("../controllers/recommendationsController");
 
 const {
@@ -100,6 +102,7 @@ const {
 } = require("../controllers/faqCategoryController");
 
 const { Product } = require("../models/product");
+const { attachStockTotals } = require("../services/productService");
 const {
   validateCouponForUser,
   createCoupon,
@@ -153,7 +156,8 @@ routerAPI.get("/products/featured", getFeaturedProducts);
 routerAPI.get("/productsByCategory", getProductsByCategory);
 routerAPI.get("/product/search", getProductsByName);
 routerAPI.get("/productsBySearch", searchProduct);
-routerAPI.get("/product/:id", getProductById);
+routerAPI.get("/product/:id", optionalAuth, getProductById);
+routerAPI.get("/product/:id/similar", getSimilarProducts);
 routerAPI.get("/variants/:variantId", getVariantById);
 routerAPI.get("/categories", getAllCategories);
 routerAPI.get("/products/:productId/reviews", getReviewsForProduct);
@@ -194,6 +198,7 @@ routerAPI.get("/cart/:userId", getCartInfo);
 routerAPI.delete("/cart/:userId", removeAllProductsFromCart);
 
 routerAPI.get("/recommendations", getUserRecommendations);
+routerAPI.get("/recommendations/session", getSessionRecommendations);
 
 routerAPI.post("/email/payment/notify-success", sendPaymentConfirmationEmail);
 
@@ -216,7 +221,7 @@ routerAPI.post("/products/batch", async (req, res) => {
       .populate("brand", "name")
       .lean();
 
-    res.status(200).json(products || []);
+    res.status(200).json(await attachStockTotals(products || []));
   } catch (error) {
     console.error("Error in /products/batch:", error);
     res.status(500).json({ message: error.message });
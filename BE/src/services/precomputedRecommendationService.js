@@ -0,0 +1,44 @@
+const mongoose = require("mongoose");
+const { Product } = require("../models/product");
+
+// Written by recommendation-service/precompute_recommendations.py
+const USER_RECOMMENDATIONS = "user_recommendations";
+const PRODUCT_SIMILARITIES = "product_similarities";
+const MAX_AGE_MS = Number(process.env.PRECOMPUTED_RECS_MAX_AGE_MS) || 24 * 60 * 60 * 1000;
+
+const findFresh = async (collection, filter) => {
+  if (mongoose.connection.readyState !== 1) return null;
+  const doc = await mongoose.connection.db
+    .collection(collection)
+    .findOne(filter, { projection: { items: 1, updatedAt: 1 } });
+  if (!doc || !doc.updatedAt || Date.now() - new Date(doc.updatedAt).getTime() > MAX_AGE_MS) {
+    return null;
+  }
+  return doc.items || [];
+};
+
+// Ranked { productId, score } list for the user, or null when nothing fresh is stored
+const getPrecomputedUserItems = (userId) =>
+  findFresh(USER_RECOMMENDATIONS, { userId: String(userId) });
+
+const getPrecomputedSimilarItems = (productId) =>
+  findFresh(PRODUCT_SIMILARITIES, { productId: String(productId) });
+
+// Same documents /products/batch returns, in ranked order
+const getRankedProducts = async (items) => {
+  const ids = items
+    .map((item) => item.productId)
+    .filter((id) => mongoose.Types.ObjectId.isValid(id));
+  const products = await Product.find({ _id: { $in: ids } })
+    .populate("category", "name")
+    .populate("brand", "name")
+    .lean();
+  const byId = new Map(products.map((product) => [String(product._id), product]));
+  return ids.map((id) => byId.get(id)).filter(Boolean);
+};
+
+module.exports = {
+  getPrecomputedUserItems,
+  getPrecomputedSimilarItems,
+  getRankedProducts,
+};
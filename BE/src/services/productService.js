@@ -108,7 +108,22 @@ const createProductService = async (productData) => {
   }
 };
 
-const getAllProductsService = async (sort) => {
+// Adds `stock` (sum of the product's variant stock) to each lean product; list endpoints
+// do not populate variants, and the recommender filters on this total
+const attachStockTotals = async (products) => {
+  if (!products || products.length === 0) return products;
+  const totals = await Variant.aggregate([
+    { $match: { product: { $in: products.map((p) => p._id) } } },
+    { $group: { _id: "$product", stock: { $sum: "$stock" } } },
+  ]);
+  const stockById = new Map(totals.map((t) => [t._id.toString(), t.stock]));
+  products.forEach((product) => {
+    product.stock = stockById.get(product._id.toString()) || 0;
+  });
+  return products;
+};
+
+const getAllProductsService = async (sort, { page = 1, limit = 0 } = {}) => {
   try {
     let sortOption = {};
     if (sort && typeof sort === "string") {
@@ -122,12 +137,18 @@ const getAllProductsService = async (sort) => {
     } else {
       sortOption = { purchasedQuantity: -1, createdAt: -1 };
     }
-    const products = await Product.find({})
+    let query = Product.find({});
+    if (limit > 0) {
+      // Tie-break on _id so consecutive pages neither repeat nor skip products
+      if (!("_id" in sortOption)) sortOption._id = 1;
+      query = query.skip((Math.max(page, 1) - 1) * limit).limit(limit);
+    }
+    const products = await query
       .sort(sortOption)
       .populate("category", "name")
       .populate("brand", "name")
       .lean();
-    return products;
+    return await attachStockTotals(products);
   } catch (error) {
     console.error("Error in getAllProductsService:", error);
     throw new Error("Error getting products: " + error.message);
@@ -668,6 +689,7 @@ const getFeaturedProductsService = async (limit = 3) => {
 module.exports = {
   createProductService,
   getAllProductsService,
+  attachStockTotals,
   getProductByIdService,
   getProductsByNameService,
   updateProductService,
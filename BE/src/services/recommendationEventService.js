@@ -0,0 +1,41 @@
+const axios = require("axios");
+
+const RECOMMENDER_URL = process.env.RECOMMENDER_URL || "http://localhost:5000";
+const FLUSH_INTERVAL_MS = 1000;
+const MAX_BATCH_SIZE = 500;
+
+let pendingEvents = [];
+let flushTimer = null;
+
+const flushEvents = async () => {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (pendingEvents.length === 0) return;
+
+  const batch = pendingEvents;
+  pendingEvents = [];
+  try {
+    await axios.post(
+      `${RECOMMENDER_URL}/events`,
+      { events: batch },
+      { headers: { "x-api-key": process.env.API_KEY }, timeout: 2000 }
+    );
+  } catch (error) {
+    console.warn(`Dropped ${batch.length} recommendation event(s): ${error.message}`);
+  }
+};
+
+// Fire-and-forget: events are batched and never block or fail the caller's request
+const trackEvent = (event) => {
+  pendingEvents.push({ ...event, timestamp: Date.now() });
+  if (pendingEvents.length >= MAX_BATCH_SIZE) {
+    flushEvents();
+  } else if (!flushTimer) {
+    flushTimer = setTimeout(flushEvents, FLUSH_INTERVAL_MS);
+    flushTimer.unref();
+  }
+};
+
+module.exports = { trackEvent, flushEvents };
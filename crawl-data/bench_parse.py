@@ -0,0 +1,143 @@
+"""Parse benchmark over saved pages.
+
+    python bench_parse.py [page.html | directory | https://url ...]
+
+Files (or every *.html in a directory, default ./fixtures) are parsed with
+html.parser over the whole page -- what the crawlers used to do -- and with the
+configured backend, whole page and restricted to the crawler regions. The same
+fields the crawlers read are extracted each time and must come out identical.
+URLs are downloaded into ./fixtures first (static HTML only; save category
+pages from the browser after 'Show More' to benchmark the large ones). With no
+arguments the checked-in fixtures are used (written by make_fixtures.py if
+missing), so the benchmark runs offline.
+"""
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+import make_fixtures
+
+from html_parse import (PARSER, CATEGORY_REGIONS, DETAIL_REGIONS, PRODUCT_ITEMS, PRODUCT_LINK, PRODUCT_NAME,
+                        PRODUCT_PRICE, ANY_PRICE, DESCRIPTION_ITEMS, GALLERY_LINKS, STORAGE_LINKS)
+
+FIXTURE_DIR = os.getenv("FIXTURE_DIR", make_fixtures.FIXTURE_DIR)
+REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+CATEGORY_MARKERS = ("filter-sort__list-product", "product-list-filter")
+
+
+# --- Extraction (same selectors as the crawlers) ---
+def extract_category(soup, compiled):
+    container = soup.select_one("div.filter-sort__list-product, .product-list-filter")
+    if not container:
+        return []
+    if compiled:
+        items = PRODUCT_ITEMS.select(container)
+        return [link.get("href") for link in (PRODUCT_LINK.select_one(item) for item in items) if link]
+    items = container.select(".product-info-container.product-item")
+    return [link.get("href") for link in (item.select_one(".product-info a.product__link") for item in items) if link]
+
+
+def extract_detail(soup, compiled):
+    if compiled:
+        name, price = PRODUCT_NAME.select_one(soup), PRODUCT_PRICE.select_one(soup) or ANY_PRICE.select_one(soup)
+        description, images, variants = DESCRIPTION_ITEMS.select(soup), GALLERY_LINKS.select(soup), STORAGE_LINKS.select(soup)
+    else:
+        name = soup.select_one(".box-product-name h1")
+        price = soup.select_one(".box-product-name .price .tpt---price") or soup.select_one(".tpt---price")
+        description = soup.select(".ksp-content ul li, #cpsContentSEO li")
+        images = soup.select(".gallery-top .swiper-slide:not(#v2Gallery) a.spotlight")
+        variants = soup.select("div.list-linked a.item-linked")
+    return {
+        "name": name.text.strip() if name else None,
+        "price": price.text.strip() if price else None,
+        "description": [li.get_text(strip=True) for li in description],
+        "images": [a.get("href") for a in images],
+        "variants": [" ".join(a.get_text(" ", strip=True).split()) for a in variants],
+    }
+
+
+# --- Fixtures ---
+def download(url):
+    from page_fetch import get_session # Only needed for URLs
+    from driver_pool import DEFAULT_USER_AGENT
+    response = get_session(DEFAULT_USER_AGENT).get(url, timeout=30)
+    response.raise_for_status()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    name = urlparse(url).path.strip("/").replace("/", "_") or "index"
+    path = os.path.join(FIXTURE_DIR, name if name.endswith(".html") else f"{name}.html")
+    with open(path, "wb") as f:
+        f.write(response.content)
+    print(f"Saved {url} -> {path}")
+    return path
+
+
+def fixture_paths(args):
+    if not args and not os.path.isdir(FIXTURE_DIR):
+        return make_fixtures.write(FIXTURE_DIR)
+    paths = []
+    for arg in args or [FIXTURE_DIR]:
+        if arg.startswith(("http://", "https://")):
+            paths.append(download(arg))
+        elif os.path.isdir(arg):
+            paths.extend(sorted(os.path.join(arg, f) for f in os.listdir(arg) if f.endswith((".html", ".htm"))))
+        else:
+            paths.append(arg)
+    return paths
+
+
+# --- Benchmark ---
+def run(html, parser, regions, extract, compiled):
+    """Best of REPEAT runs of parse + extract; returns (seconds, extracted)"""
+    best, result = None, None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        soup = BeautifulSoup(html, parser, parse_only=regions)
+        result = extract(soup, compiled)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    paths = fixture_paths(sys.argv[1:])
+    if not paths:
+        print(f"No pages to benchmark: pass .html files or a directory, or save pages into '{FIXTURE_DIR}/'.")
+        return 1
+
+    totals = {}
+    print(f"Backend: {PARSER}, best of {REPEAT} run(s) per page\n")
+    for path in paths:
+        with open(path, "rb") as f:
+            html = f.read()
+        category = any(marker.encode() in html for marker in CATEGORY_MARKERS)
+        extract = extract_category if category else extract_detail
+        regions = CATEGORY_REGIONS if category else DETAIL_REGIONS
+        setups = [
+            ("html.parser, full page", "html.parser", None, False),
+            (f"{PARSER}, full page", PARSER, None, True),
+            (f"{PARSER}, regions", PARSER, regions, True),
+        ]
+
+        print(f"{os.path.basename(path)} ({len(html) / 1024:.0f} KiB, {'category' if category else 'detail'} page)")
+        baseline = None
+        for label, parser, strainer, compiled in setups:
+            seconds, extracted = run(html, parser, strainer, extract, compiled)
+            if baseline is None:
+                baseline = (seconds, extracted)
+            same = "same fields" if extracted == baseline[1] else "DIFFERENT FIELDS"
+            totals[label] = totals.get(label, 0.0) + seconds
+            print(f"  {label:<28} {seconds * 1000:9.1f} ms  x{baseline[0] / seconds:5.1f}  {same}")
+
+    if len(paths) > 1:
+        print("\nAll pages")
+        base = next(iter(totals.values()))
+        for label, seconds in totals.items():
+            print(f"  {label:<28} {seconds * 1000:9.1f} ms  x{base / seconds:5.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
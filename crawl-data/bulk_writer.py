@@ -0,0 +1,191 @@
+import atexit
+import os
+import threading
+import time
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Write Settings ---
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100")) # Flush once this many URLs are buffered
+WRITE_FLUSH_SECONDS = float(os.getenv("WRITE_FLUSH_SECONDS", "5")) # ...or when the oldest buffered write is this old
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "3"))
+
+# Write errors worth retrying: duplicate key from two concurrent upserts of a new url
+# (the retry matches the inserted document) and transient server-side failures
+RETRYABLE_CODES = {11000, 6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class BulkWriter:
+    """Buffers `$set` upserts keyed on `url` and writes them with unordered bulk_write.
+
+    A buffer is flushed when it holds `batch_size` URLs, when its oldest write is
+    `flush_seconds` old (checked by a background thread), and on flush()/close().
+    Several writes to the same URL before a flush are merged into one update.
+    Operations that fail with a retryable error are retried (only the failed
+    subset) up to `max_retries` times with a short backoff.
+    on_written callbacks run after the write of their URL succeeded.
+    """
+
+    def __init__(self, collection, batch_size=WRITE_BATCH_SIZE, flush_seconds=WRITE_FLUSH_SECONDS,
+                 max_retries=WRITE_MAX_RETRIES, label="documents", verbose=True):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.label = label
+        self.verbose = verbose # Print a line per flushed batch
+        self._buffer = {} # url -> {"fields": {...}, "callbacks": [...]}
+        self._inflight = {} # The batch being written by flush()
+        self._failed = set() # URLs whose last write failed for good
+        self._oldest = None
+        self._lock = threading.Lock() # Guards the buffer
+        self._flush_lock = threading.Lock() # One bulk_write at a time
+        self._closed = threading.Event()
+        self.stats = {"upserted": 0, "modified": 0, "unchanged": 0, "failed": 0, "batches": 0, "retries": 0}
+        self.ensure_index()
+        self._flusher = threading.Thread(target=self._flush_periodically, name=f"bulk-writer-{label}", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def ensure_index(self):
+        """Unique index on url: upserts use it instead of a collection scan"""
+        try:
+            self.collection.create_index([("url", ASCENDING)], unique=True)
+        except DuplicateKeyError as e:
+            print(f"Warning: '{self.collection.name}' has duplicate urls, unique index not created: {e}")
+        except PyMongoError as e:
+            print(f"Warning: Could not ensure url index on '{self.collection.name}': {e}")
+
+    def upsert(self, url, fields, on_written=None):
+        """Queues {"$set": fields} for the document with this url"""
+        flush_now = False
+        with self._lock:
+            entry = self._buffer.get(url)
+            if entry is None:
+                entry = self._buffer[url] = {"fields": {}, "callbacks": []}
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            entry["fields"].update(fields)
+            if on_written:
+                entry["callbacks"].append(on_written)
+            flush_now = len(self._buffer) >= self.batch_size or self._closed.is_set()
+        if flush_now:
+            self.flush()
+        return True
+
+    def when_written(self, url, callback):
+        """Runs callback once the queued write of url has succeeded, or right away if
+           nothing is queued for url. Never runs it if that write fails."""
+        with self._lock:
+            entry = self._buffer.get(url) or self._inflight.get(url)
+            if entry is not None:
+                entry["callbacks"].append(callback)
+                return
+            if url in self._failed:
+                return
+        callback()
+
+    def _take(self):
+        with self._lock:
+            batch, self._buffer, self._oldest = self._buffer, {}, None
+            self._inflight = batch
+        return batch
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(1.0, self.flush_seconds)):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_seconds
+            if due:
+                self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of URLs written."""
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            pending = list(batch)
+            written = []
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    with self._lock:
+                        self.stats["retries"] += 1
+                    time.sleep(min(2 ** attempt * 0.25, 5))
+                pending = self._write(pending, batch, written)
+                if not pending:
+                    break
+            with self._lock:
+                self._failed.difference_update(written)
+                self._failed.update(batch.keys() - set(written))
+            if pending:
+                with self._lock:
+                    self.stats["failed"] += len(pending)
+                print(f"  Error: {len(pending)} {self.label} write(s) failed after {self.max_retries} retries: "
+                      f"{', '.join(pending[:3])}{' ...' if len(pending) > 3 else ''}")
+            with self._lock:
+                self._inflight = {} # Callbacks added from now on see the writes as done
+
+        for url in written:
+            for callback in batch[url]["callbacks"]:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"  Warning: Post-write callback failed for {url}: {e}")
+        return len(written)
+
+    def _write(self, urls, batch, written):
+        """One unordered bulk_write; returns the urls that should be retried"""
+        operations = [UpdateOne({"url": url}, {"$set": batch[url]["fields"]}, upsert=True) for url in urls]
+        retry = []
+        try:
+            result = self.collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            failed = set()
+            for error in details.get("writeErrors", []):
+                url = urls[error["index"]]
+                failed.add(url)
+                if error.get("code") in RETRYABLE_CODES:
+                    retry.append(url)
+                else:
+                    with self._lock:
+                        self.stats["failed"] += 1
+                    print(f"  Error writing {url}: {error.get('errmsg')}")
+            written.extend(url for url in urls if url not in failed)
+        except PyMongoError as e:
+            # Connection-level failure: nothing is known to be written, retry the lot
+            print(f"  Warning: Bulk write of {len(urls)} {self.label} failed ({e}); retrying...")
+            return urls
+        else:
+            written.extend(urls)
+
+        upserted = details.get("nUpserted", 0)
+        matched = details.get("nMatched", 0)
+        modified = details.get("nModified", 0)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["upserted"] += upserted
+            self.stats["modified"] += modified
+            self.stats["unchanged"] += matched - modified
+        if self.verbose:
+            print(f"  Flushed {len(urls)} {self.label}: {upserted} inserted, {modified} updated, "
+                  f"{matched - modified} unchanged{f', {len(retry)} to retry' if retry else ''}")
+        return retry
+
+    def close(self):
+        """Flushes what is left and stops the background flusher. Safe to call more than once."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.flush()
+
+    def print_summary(self):
+        s = self.stats
+        print(f"Writes ({self.label}): {s['upserted']} inserted, {s['modified']} updated, {s['unchanged']} unchanged, "
+              f"{s['failed']} failed in {s['batches']} batch(es), {s['retries']} retr{'y' if s['retries'] == 1 else 'ies'}")
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+from driver_pool import DRIVER_POOL_SIZE
+
+load_dotenv()
+
+# --- Concurrency & Politeness Settings ---
+# Workers default to the browser pool size: each worker holds one browser while it works
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", str(DRIVER_POOL_SIZE)))
+CRAWL_RATE = os.getenv("CRAWL_RATE") # Requests per second per host, shared by all workers; unset = one per DELAY
+CRAWL_BURST = int(os.getenv("CRAWL_BURST", "1")) # Requests allowed back to back before the rate applies
+
+
+# --- Per-Host Rate Limiter ---
+def host_rate(delay):
+    """Requests per second per host: CRAWL_RATE, else the crawler's old DELAY between pages"""
+    if CRAWL_RATE:
+        return float(CRAWL_RATE)
+    return 1 / delay if delay > 0 else 0
+
+
+class HostRateLimiter:
+    """Token bucket per host. Every worker takes a token before requesting a page,
+       so the combined request rate to one host stays at `rate` per second no matter
+       how many workers run."""
+
+    def __init__(self, rate, burst=CRAWL_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets = {} # host -> [tokens, last refill time]
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, url):
+        """Blocks until a request to the url's host is allowed"""
+        if self.rate <= 0:
+            return 0.0 # Rate limiting disabled
+        host = urlsplit(url).netloc
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._buckets.setdefault(host, [float(self.burst), now])
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                if bucket[0] >= 1:
+                    bucket[0] -= 1
+                    self.waited += waited
+                    return waited
+                delay = (1 - bucket[0]) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# --- Aggregated Results ---
+class CrawlStats:
+    """Thread-safe success/failure counts for one crawl run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0 # Items the skip predicate answered without a request
+        self.errors = Counter() # Exception class name -> count
+        self.busy_seconds = 0.0 # Sum of per-item task time across workers
+        self.started = time.time()
+        self.interrupted = False # Set when Ctrl+C stopped the run
+
+    def record(self, ok, seconds, error=None):
+        with self._lock:
+            if ok:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            if error:
+                self.errors[type(error).__name__] += 1
+            self.busy_seconds += seconds
+
+    def record_skip(self):
+        """A skipped item counts as a success that took no time"""
+        with self._lock:
+            self.succeeded += 1
+            self.skipped += 1
+
+    def summary(self):
+        elapsed = time.time() - self.started
+        done = self.succeeded + self.failed
+        return {
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "errors": dict(self.errors),
+            "elapsed": elapsed,
+            "items_per_minute": done / elapsed * 60 if elapsed > 0 else 0,
+            "avg_item_seconds": self.busy_seconds / (done - self.skipped) if done > self.skipped else 0,
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"Throughput: {s['items_per_minute']:.1f} item(s)/min, "
+              f"avg {s['avg_item_seconds']:.2f}s per item")
+        if s["skipped"]:
+            print(f"Skipped without a request: {s['skipped']}")
+        if s["errors"]:
+            print(f"Errors by type: {s['errors']}")
+
+
+# --- Runner ---
+def crawl_all(items, task, url_of=lambda item: item, workers=CRAWL_WORKERS, rate=1, label="URL", stats=None,
+              skip=None):
+    """Runs task(item) for every item on `workers` threads.
+
+    task returns True on success and False on failure; exceptions count as failures.
+    Before each task the worker takes a token for the item's host (at most `rate`
+    requests per second per host, 0 disables the limit), which replaces the fixed
+    time.sleep(REQUEST_DELAY) between pages. Threads are enough here: the work
+    happens in the browser processes and over the network.
+    Ctrl+C stops handing out new items; items already running finish.
+    Pass `stats` to add the results to those of an earlier run (e.g. a retry pass).
+    skip(url) -> True marks an item that needs no request (e.g. crawled recently): it
+    is counted as done without taking a rate-limit token and task is not run.
+    """
+    limiter = HostRateLimiter(rate)
+    stats = stats or CrawlStats()
+    stop = threading.Event()
+    total = len(items)
+    workers = max(1, min(workers, total)) if total else 1
+    limit = f"{limiter.rate:g} request(s)/s per host" if limiter.rate > 0 else "no rate limit"
+    print(f"Running {total} {label}(s) on {workers} worker(s), {limit}")
+
+    def run(position, item):
+        if stop.is_set():
+            return
+        url = url_of(item)
+        if skip and skip(url):
+            print(f"[{position}/{total}] Skipping {label}, nothing to fetch: {url}")
+            stats.record_skip()
+            return
+        limiter.acquire(url)
+        if stop.is_set():
+            return
+        print(f"\n[{position}/{total}] Processing {label}: {url}")
+        start = time.time()
+        try:
+            ok = bool(task(item))
+            stats.record(ok, time.time() - start)
+        except Exception as e:
+            print(f"  Unhandled error processing {label} {url}: {e}")
+            traceback.print_exc()
+            stats.record(False, time.time() - start, e)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawl")
+    try:
+        futures = [executor.submit(run, i + 1, item) for i, item in enumerate(items)]
+        for future in futures:
+            future.result()
+    except KeyboardInterrupt:
+        print("\nCtrl+C detected. Finishing in-flight pages and stopping...")
+        stop.set()
+        stats.interrupted = True
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return stats
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from bulk_writer import BulkWriter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Re-crawl Settings ---
+CRAWL_STATE_COLLECTION = os.getenv("CRAWL_STATE_COLLECTION", "crawl_state")
+CRAWL_FRESH_HOURS = float(os.getenv("CRAWL_FRESH_HOURS", "24")) # Skip URLs crawled more recently; 0 = always fetch
+CRAWL_FORCE = os.getenv("CRAWL_FORCE", "0").strip().lower() in ("1", "true", "yes") # Ignore stored state
+
+
+def content_hash(doc):
+    """Stable hash of the extracted fields (key order does not matter)"""
+    payload = json.dumps(doc, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """Per-URL crawl state kept in Mongo: last crawl time, HTTP validators (ETag /
+    Last-Modified) and a hash of the fields last written for the URL.
+
+    Typical use per URL:
+        if not state.should_fetch(url): skip (crawled recently)
+        page = fetch with state.validators(url) -> 304 means state.not_modified(url)
+        if not state.changed(url, doc): skip the write
+        save, then state.record(url, doc, validators)
+
+    load(urls) reads the state of a whole run in one query; lookups are then
+    served from memory and updates are buffered. Safe to use from several crawl
+    workers; call close() at the end of a run.
+    """
+
+    def __init__(self, collection, fresh_hours=CRAWL_FRESH_HOURS, force=CRAWL_FORCE):
+        self.collection = collection
+        self.fresh_for = timedelta(hours=fresh_hours) if fresh_hours > 0 else None
+        self.force = force
+        self._states = {}
+        self._lock = threading.Lock()
+        self.counts = {"fresh": 0, "not_modified": 0, "unchanged": 0, "changed": 0}
+        # State updates are batched like product writes (unique url index included)
+        self.writer = BulkWriter(collection, label="crawl states", verbose=False)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def load(self, urls, chunk_size=1000):
+        """Prefetches the stored state of `urls`"""
+        if self.force:
+            return 0
+        urls = list(urls)
+        loaded = 0
+        try:
+            for start in range(0, len(urls), chunk_size):
+                for doc in self.collection.find({"url": {"$in": urls[start:start + chunk_size]}}, {"_id": 0}):
+                    with self._lock:
+                        self._states[doc["url"]] = doc
+                    loaded += 1
+        except Exception as e:
+            print(f"Warning: Could not load crawl state, every URL will be fetched: {e}")
+        print(f"Loaded crawl state for {loaded} of {len(urls)} URL(s).")
+        return loaded
+
+    def _state(self, url):
+        with self._lock:
+            return self._states.get(url)
+
+    def should_fetch(self, url):
+        """False when the URL was crawled within the freshness window"""
+        state = self._state(url)
+        if self.force or not state or not self.fresh_for or not state.get("crawledAt"):
+            return True
+        crawled_at = state["crawledAt"]
+        if crawled_at.tzinfo is None:
+            crawled_at = crawled_at.replace(tzinfo=timezone.utc) # pymongo returns naive UTC datetimes
+        if datetime.now(timezone.utc) - crawled_at < self.fresh_for:
+            self._count("fresh")
+            return False
+        return True
+
+    def validators(self, url):
+        """Conditional request headers from the last crawl (empty if none)"""
+        state = self._state(url) or {}
+        headers = {}
+        if not self.force and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if not self.force and state.get("lastModified"):
+            headers["If-Modified-Since"] = state["lastModified"]
+        return headers
+
+    def changed(self, url, doc, validators=None):
+        """False (and the crawl time is refreshed) when `doc` hashes like the last write"""
+        state = self._state(url)
+        if not self.force and state and state.get("hash") == content_hash(doc):
+            self._count("unchanged")
+            self.touch(url, validators)
+            return False
+        self._count("changed")
+        return True
+
+    def not_modified(self, url):
+        """Server answered 304: nothing to parse or write"""
+        self._count("not_modified")
+        self.touch(url)
+
+    def touch(self, url, validators=None):
+        fields = {"crawledAt": datetime.now(timezone.utc)}
+        if validators:
+            fields["etag"] = validators.get("etag")
+            fields["lastModified"] = validators.get("lastModified")
+        self._update(url, fields)
+
+    def record(self, url, doc, validators=None):
+        """Stores the hash of what was just written, with the response validators"""
+        validators = validators or {}
+        self._update(url, {
+            "crawledAt": datetime.now(timezone.utc),
+            "hash": content_hash(doc),
+            "etag": validators.get("etag"),
+            "lastModified": validators.get("lastModified"),
+        })
+
+    def _update(self, url, fields):
+        with self._lock:
+            self._states.setdefault(url, {"url": url}).update(fields)
+        self.writer.upsert(url, fields)
+
+    def close(self):
+        self.writer.close()
+
+    def print_summary(self):
+        c = self.counts
+        print(f"Re-crawl: {c['fresh']} skipped as fresh, {c['not_modified']} not modified (304), "
+              f"{c['unchanged']} unchanged (write skipped), {c['changed']} new/changed")
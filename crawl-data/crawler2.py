@@ -5,20 +5,24 @@ from datetime import datetime, timezone
 from urllib.parse import urljoin # Import urljoin for robustness
 
 import requests # requests is imported but not used directly, consider removing if not needed elsewhere
-from bs4 import BeautifulSoup
 from pymongo import MongoClient
 
 # Selenium imports for Edge
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException # Import specific exception
 
-# Webdriver Manager import for Edge
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
+# Shared pool of warm browsers, HTTP-first page fetching and the parallel crawl runner
+from driver_pool import DriverPool, crawl_profile
+from html_parse import (CATEGORY_REGIONS, DETAIL_REGIONS, parse_page, PRODUCT_LINK, PRODUCT_NAME,
+                        PRODUCT_PRICE, ANY_PRICE, DESCRIPTION_ITEMS, GALLERY_LINKS, STORAGE_LINKS)
+from page_fetch import PageFetcher, NOT_MODIFIED
+from crawl_state import CrawlState, CRAWL_STATE_COLLECTION
+from bulk_writer import BulkWriter
+from waits import SETTLE_TIMEOUT, wait_stats, wait_until, dom_settled
+from crawl_runner import CRAWL_WORKERS, host_rate
+from frontier import Frontier, PENDING, crawl_frontier
 
 from dotenv import load_dotenv
 
@@ -64,38 +68,27 @@ def clean_price(price_str):
         print(f"Warning: Could not convert price string '{price_str}' to float after cleaning. Input: '{cleaned_str}'. Returning 0.")
         return 0
 
-def get_driver():
-    """Initialize Microsoft Edge browser with Selenium"""
-    options = EdgeOptions()
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 Edg/100.0.1185.39") # Slightly updated UA
-    options.add_argument("--headless") # Run headless
-    options.add_argument("--disable-gpu") # Often needed for headless
-    options.add_experimental_option('excludeSwitches', ['enable-logging']) # Suppress DevTools messages
-
-    # Disable image loading to speed up page load (optional)
-    # prefs = {"profile.managed_default_content_settings.images": 2}
-    # options.add_experimental_option("prefs", prefs)
+# One browser per crawl worker for the whole run; pages reuse a warm browser instead of starting Edge
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 Edg/100.0.1185.39"
+# Text and image URLs are read from the markup: images, fonts, media and trackers are not loaded
+driver_pool = DriverPool(size=CRAWL_WORKERS, user_agent=USER_AGENT, profile=crawl_profile())
 
-    try:
-        service = EdgeService(executable_path=EdgeChromiumDriverManager().install())
-        driver = webdriver.Edge(service=service, options=options)
-        return driver
-    except Exception as e:
-        print(f"Error initializing WebDriver: {e}")
-        return None
+# Per-URL crawl time, HTTP validators and content hash, so re-crawls skip unchanged products
+crawl_state = CrawlState(db[CRAWL_STATE_COLLECTION])
+
+# Product upserts are buffered and written in unordered bulk batches (unique index on url)
+product_writer = BulkWriter(collection, label="products")
 
 # --- NEW FUNCTION ---
 def get_product_urls_from_category1(category_url, max_urls=20):
     """Scrapes a category page to get individual product URLs."""
     print(f"Attempting to get product URLs from: {category_url}")
-    driver = get_driver()
+    driver = driver_pool.acquire()
     if not driver:
         return []
 
     product_urls = []
+    seen_urls = set() # Membership checks on the list were O(n) per link
     try:
         driver.get(category_url)
         # Wait for the product list container to be present
@@ -108,11 +101,11 @@ def get_product_urls_from_category1(category_url, max_urls=20):
         # driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         # time.sleep(3)
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = parse_page(driver.page_source)
 
         # Find product links based on the HTML structure provided
         # Selector: finds <a> tags with class 'product__link' inside divs with class 'product-info'
-        link_elements = soup.select('.product-info a.product__link')
+        link_elements = PRODUCT_LINK.select(soup)
 
         print(f"Found {len(link_elements)} potential product links on the page.")
 
@@ -125,7 +118,8 @@ def get_product_urls_from_category1(category_url, max_urls=20):
             if href:
                 # Ensure URL is absolute (using urljoin as a safeguard)
                 absolute_url = urljoin(category_url, href)
-                if absolute_url not in product_urls: # Avoid duplicates
+                if absolute_url not in seen_urls: # Avoid duplicates
+                    seen_urls.add(absolute_url)
                     product_urls.append(absolute_url)
 
         print(f"Extracted {len(product_urls)} unique product URLs.")
@@ -140,19 +134,19 @@ def get_product_urls_from_category1(category_url, max_urls=20):
         traceback.print_exc()
         return []
     finally:
-        if driver:
-            driver.quit()
+        driver_pool.release(driver)
 
 # --- NEW FUNCTION ---
 def get_product_urls_from_category(category_url, max_urls=20):
     """Scrapes a category page to get individual product URLs,
        attempting to exclude 'hot sale' boxes."""
     print(f"Attempting to get product URLs from: {category_url}")
-    driver = get_driver()
+    driver = driver_pool.acquire()
     if not driver:
         return []
 
     product_urls = []
+    seen_urls = set() # Membership checks on the list were O(n) per link
     try:
         driver.get(category_url)
         # Wait for the main product filter/list container area to be present
@@ -161,10 +155,10 @@ def get_product_urls_from_category(category_url, max_urls=20):
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, main_container_selector))
         )
-        # Give a brief moment for JS rendering within the container (optional)
-        time.sleep(2)
+        # Give JS rendering within the container a moment: until the DOM stops changing
+        wait_until(driver, "category_settled", dom_settled(), SETTLE_TIMEOUT)
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = parse_page(driver.page_source, CATEGORY_REGIONS)
 
         # --- Find the main product list container ---
         main_list_container = soup.select_one(main_container_selector)
@@ -176,7 +170,7 @@ def get_product_urls_from_category(category_url, max_urls=20):
             # This selector finds <a> tags with class 'product__link'
             # that are descendants of a div with class 'product-info',
             # which itself is a descendant of the main_list_container
-            link_elements = main_list_container.select('.product-info a.product__link')
+            link_elements = PRODUCT_LINK.select(main_list_container)
 
             # --- Optional Refinement: Explicitly exclude boxHotSale if needed ---
             # If the above still includes hot sale items (meaning boxHotSale is *inside* product-list-filter),
@@ -200,7 +194,8 @@ def get_product_urls_from_category(category_url, max_urls=20):
             href = link_tag.get('href')
             if href:
                 absolute_url = urljoin(category_url, href)
-                if absolute_url not in product_urls:
+                if absolute_url not in seen_urls:
+                    seen_urls.add(absolute_url)
                     product_urls.append(absolute_url)
 
         print(f"Extracted {len(product_urls)} unique product URLs.")
@@ -215,13 +210,12 @@ def get_product_urls_from_category(category_url, max_urls=20):
         traceback.print_exc()
         return []
     finally:
-        if driver:
-            driver.quit()
+        driver_pool.release(driver)
 
 def extract_product_data1(url):
     """Scrapes CellphoneS product page and formats data for productSchema"""
     print(f"  Extracting data from: {url}")
-    driver = get_driver()
+    driver = driver_pool.acquire()
     if not driver:
         return {} # Return empty if driver fails
 
@@ -231,11 +225,11 @@ def extract_product_data1(url):
         WebDriverWait(driver, 45).until(
             EC.visibility_of_element_located((By.CSS_SELECTOR, ".box-product-name h1"))
         )
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = parse_page(driver.page_source, DETAIL_REGIONS)
 
         # --- Extract Raw Data ---
         product_name = "Unknown Product"
-        name_element = soup.select_one('.box-product-name h1')
+        name_element = PRODUCT_NAME.select_one(soup)
         if name_element:
             product_name = name_element.text.strip()
 
@@ -247,14 +241,14 @@ def extract_product_data1(url):
         brand_name = "Apple"
         category_name = "Smartphone"
 
-        main_images = [a["href"] for a in soup.select('.gallery-top .swiper-slide:not(#v2Gallery) a.spotlight') if a.has_attr("href")]
+        main_images = [a["href"] for a in GALLERY_LINKS.select(soup) if a.has_attr("href")]
 
         base_price = 0
-        price_element = soup.select_one('.box-product-name .price .tpt---price') or soup.select_one('.tpt---price')
+        price_element = PRODUCT_PRICE.select_one(soup) or ANY_PRICE.select_one(soup)
         if price_element:
              base_price = clean_price(price_element.text)
 
-        specifications = [item.get_text(strip=True) for item in soup.select('.ksp-content ul li, #cpsContentSEO li')]
+        specifications = [item.get_text(strip=True) for item in DESCRIPTION_ITEMS.select(soup)]
 
         # --- Process Variants (Updated) ---
         target_variants = []
@@ -310,17 +304,13 @@ def extract_product_data1(url):
         traceback.print_exc() # Print full traceback for debugging product page errors
         return {}
     finally:
-        if driver:
-             driver.quit()
+        driver_pool.release(driver)
 
-def extract_product_data(url):
-    """Scrapes CellphoneS product page and formats data for productSchema,
-       extracting storage variants from the 'list-linked' section."""
-    print(f"  Extracting data from: {url}")
-    driver = get_driver()
+def render_product_page(url):
+    """Browser fallback for product pages: renders in a pooled browser, returns the HTML"""
+    driver = driver_pool.acquire()
     if not driver:
-        return {}
-
+        return None
     try:
         driver.get(url)
         WebDriverWait(driver, 45).until(
@@ -330,12 +320,28 @@ def extract_product_data(url):
         WebDriverWait(driver, 15).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, "div.list-linked"))
         )
+        return driver.page_source
+    finally:
+        driver_pool.release(driver)
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+# Product pages come from plain HTTP when the server-rendered HTML has every field read below
+page_fetcher = PageFetcher(required=("name", "description", "variants", "images"),
+                           render=render_product_page, user_agent=USER_AGENT)
+
+def extract_product_data(url):
+    """Scrapes CellphoneS product page and formats data for productSchema,
+       extracting storage variants from the 'list-linked' section."""
+    print(f"  Extracting data from: {url}")
+    try:
+        soup = page_fetcher.fetch(url, crawl_state.validators(url))
+        if soup is None:
+            return {}
+        if soup is NOT_MODIFIED:
+            return NOT_MODIFIED
 
         # --- Extract Raw Data ---
         product_name_full = "Unknown Product" # Keep the full name including default storage
-        name_element = soup.select_one('.box-product-name h1')
+        name_element = PRODUCT_NAME.select_one(soup)
         if name_element:
             product_name_full = name_element.text.strip()
             # Extract base name without storage/specifics for potential use (optional)
@@ -345,21 +351,21 @@ def extract_product_data(url):
         brand_name = "Samsung"
         category_name = "Smartphone"
 
-        main_images = [a["href"] for a in soup.select('.gallery-top .swiper-slide:not(#v2Gallery) a.spotlight') if a.has_attr("href")]
+        main_images = [a["href"] for a in GALLERY_LINKS.select(soup) if a.has_attr("href")]
 
         # Base price shown prominently on the page (often matches the 'active' variant)
         base_price = 0
-        price_element = soup.select_one('.box-product-name .price .tpt---price') or soup.select_one('.tpt---price')
+        price_element = PRODUCT_PRICE.select_one(soup) or ANY_PRICE.select_one(soup)
         if price_element:
              base_price = clean_price(price_element.text)
 
         # Description from specifications section
-        specifications = [item.get_text(strip=True) for item in soup.select('.ksp-content ul li, #cpsContentSEO li')]
+        specifications = [item.get_text(strip=True) for item in DESCRIPTION_ITEMS.select(soup)]
 
         # --- Process Variants (FROM list-linked) ---
         target_variants = []
         # Select the 'a' tags within the 'div.list-linked' container
-        storage_variant_links = soup.select('div.list-linked a.item-linked')
+        storage_variant_links = STORAGE_LINKS.select(soup)
         print(f"    Found {len(storage_variant_links)} storage variant links in 'list-linked'.")
 
         for link_tag in storage_variant_links:
@@ -408,38 +414,35 @@ def extract_product_data(url):
         import traceback
         traceback.print_exc()
         return {}
-    finally:
-        if driver:
-             driver.quit()
 
-def save_to_mongodb(data):
-    """Upsert product data based on URL"""
+def save_to_mongodb(data, on_written=None):
+    """Queue an upsert of product data based on URL"""
     if not data or "url" not in data:
         print("  Missing URL in data, skipping save.")
         return False # Indicate failure
 
     target_url = data["url"]
-    update_doc = {"$set": data}
-
-    try:
-        # print(f"  Attempting to save/update product with URL: {target_url}") # Verbose
-        result = collection.update_one(
-            {"url": target_url},
-            update_doc,
-            upsert=True
-        )
-        # Less verbose success message
-        if result.upserted_id:
-            print(f"  Inserted new document for URL: {target_url}")
-        elif result.matched_count > 0:
-            # Only print if modified? result.modified_count > 0
-            print(f"  Updated existing document for URL: {target_url}")
-        else:
-             print(f"  No document inserted or updated for URL: {target_url}") # Should not happen
-        return True # Indicate success
-    except Exception as e:
-        print(f"  Error saving to MongoDB for URL {target_url}: {e}")
-        return False # Indicate failure
+    # Queued; written with other products in one unordered bulk_write (see bulk_writer.py)
+    return product_writer.upsert(target_url, data, on_written)
+
+
+# --- Extract + Save One URL (run by the crawl workers) ---
+def process_product_url(url):
+    """Extracts and saves one product. Returns True on success (including skips).
+    URLs crawled recently are skipped before this runs (crawl_frontier skip=)."""
+    product_data = extract_product_data(url)
+    validators = page_fetcher.validators_for(url)
+    if product_data is NOT_MODIFIED:
+        print(f"  Not modified since last crawl: {url}")
+        crawl_state.not_modified(url)
+        return True
+    if not product_data:
+        return False # Count extraction failures
+    if not crawl_state.changed(url, product_data, validators):
+        print(f"  Unchanged since last crawl, skipping write: {url}")
+        return True
+    # Crawl state is recorded once the buffered write has actually been flushed
+    return save_to_mongodb(product_data, on_written=lambda: crawl_state.record(url, product_data, validators))
 
 
 # --- MAIN EXECUTION ---
@@ -451,45 +454,52 @@ if __name__ == "__main__":
     start_time = time.time()
     print(f"\n--- Starting Scraper ---")
 
-    # Step 1: Get Product URLs from Category Page
-    product_urls = get_product_urls_from_category(category_page_url, max_products_to_scrape)
+    # URLs and their status live on disk: an interrupted run resumes where it stopped
+    frontier = Frontier(os.path.splitext(os.path.basename(__file__))[0], seed=category_page_url)
+
+    if frontier.checkpoint_value("seeded"):
+        print(f"Resuming previous run (category already scraped): {frontier.counts()}")
+    else:
+        # Step 1: Get Product URLs from Category Page
+        found_urls = get_product_urls_from_category(category_page_url, max_products_to_scrape)
+        frontier.add_many(found_urls)
+        if found_urls: # An empty scrape is retried on the next run
+            frontier.checkpoint("seeded", len(found_urls))
+    pending_count = frontier.counts()[PENDING]
 
     successful_scrapes = 0
     failed_scrapes = 0
+    stats = None
 
     # Step 2: Process Each Product URL
-    if product_urls:
-        print(f"\n--- Processing {len(product_urls)} Product URLs ---")
-        for i, url in enumerate(product_urls):
-            print(f"\n[{i+1}/{len(product_urls)}] Processing URL: {url}")
-            try:
-                product_data = extract_product_data(url)
-                if product_data:
-                    if save_to_mongodb(product_data):
-                        successful_scrapes += 1
-                    else:
-                        failed_scrapes += 1 # Count save failures
-                else:
-                    failed_scrapes += 1 # Count extraction failures
-
-                # Add delay between requests
-                print(f"  Waiting for {REQUEST_DELAY} second(s)...")
-                time.sleep(REQUEST_DELAY)
-
-            except Exception as e:
-                print(f"  Unhandled error processing URL {url}: {e}")
-                failed_scrapes += 1
-                import traceback
-                traceback.print_exc()
-                # Optionally add delay even after failure
-                # time.sleep(REQUEST_DELAY)
+    if pending_count:
+        print(f"\n--- Processing {pending_count} Product URLs ---")
+        # Product pages run on CRAWL_WORKERS workers, each with its own pooled browser;
+        # failed pages are retried up to FRONTIER_MAX_ATTEMPTS times. Pending URLs are read
+        # (and their crawl state loaded) in batches, and only count as done once written.
+        stats = crawl_frontier(frontier, process_product_url, rate=host_rate(REQUEST_DELAY),
+                               writer=product_writer, on_batch=crawl_state.load,
+                           skip=lambda url: not crawl_state.should_fetch(url))
+        successful_scrapes = stats.succeeded
+        failed_scrapes = stats.failed
 
     else:
         print("No product URLs found or extracted. Exiting.")
 
+    product_writer.close() # Flush the remaining buffered writes
+    crawl_state.close()
     end_time = time.time()
+    driver_pool.close()
     print("\n--- Scraper Finished ---")
-    print(f"Total URLs Processed: {len(product_urls)}")
+    print(f"Total URLs Processed: {pending_count}")
     print(f"Successful Scrapes/Saves: {successful_scrapes}")
     print(f"Failed Scrapes/Saves: {failed_scrapes}")
+    if stats:
+        stats.print_summary()
+        page_fetcher.print_summary()
+        crawl_state.print_summary()
+        product_writer.print_summary()
+    wait_stats.print_summary()
+    frontier.print_summary()
+    frontier.close()
     print(f"Total Time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
@@ -6,20 +6,25 @@ from urllib.parse import urljoin
 import traceback # Import traceback for better error logging
 
 import requests # requests imported but not used
-from bs4 import BeautifulSoup
 from pymongo import MongoClient
 
 # Selenium imports
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException
 
-# Webdriver Manager import
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
+# Shared pool of warm browsers, HTTP-first page fetching and the parallel crawl runner
+from driver_pool import DriverPool, crawl_profile
+from html_parse import (CATEGORY_REGIONS, parse_page, PRODUCT_ITEMS, PRODUCT_LINK, PRODUCT_ITEM_NAME,
+                        PRODUCT_ITEM_PRICE, DESCRIPTION_ITEMS, GALLERY_LINKS)
+from page_fetch import PageFetcher
+from crawl_state import CrawlState, CRAWL_STATE_COLLECTION
+from bulk_writer import BulkWriter
+from waits import (SHOW_MORE_TIMEOUT, SETTLE_TIMEOUT, wait_stats, wait_until, element_count,
+                   count_increased, button_state, button_changed, any_of, dom_settled)
+from crawl_runner import CRAWL_WORKERS, host_rate
+from frontier import Frontier, PENDING, crawl_frontier
 
 from dotenv import load_dotenv
 
@@ -66,24 +71,16 @@ def clean_price(price_str):
         print(f"Warning: Could not convert price string '{price_str}' to float after cleaning. Input: '{cleaned_str}'. Returning 0.")
         return 0
 
-def get_driver():
-    # (Keep the existing get_driver function)
-    options = EdgeOptions()
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 Edg/100.0.1185.39")
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    try:
-        service = EdgeService(executable_path=EdgeChromiumDriverManager().install())
-        driver = webdriver.Edge(service=service, options=options)
-        driver.set_page_load_timeout(60) # Add page load timeout
-        return driver
-    except Exception as e:
-        print(f"Error initializing WebDriver: {e}")
-        return None
+# One browser per crawl worker for the whole run; pages reuse a warm browser instead of starting Edge
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36 Edg/100.0.1185.39"
+# Text and image URLs are read from the markup: images, fonts, media and trackers are not loaded
+driver_pool = DriverPool(size=CRAWL_WORKERS, user_agent=USER_AGENT, profile=crawl_profile())
+
+# Per-URL crawl time, HTTP validators and content hash, so re-crawls skip unchanged products
+crawl_state = CrawlState(db[CRAWL_STATE_COLLECTION])
+
+# Product upserts are buffered and written in unordered bulk batches (unique index on url)
+product_writer = BulkWriter(collection, label="products")
 
 def get_base_product_info(full_name):
     """Parses full product name to guess base name, storage, and brand."""
@@ -146,7 +143,7 @@ def get_base_product_info(full_name):
 def scrape_category_page(category_url):
     """Loads category page, clicks 'Show More', extracts initial product data."""
     print(f"Attempting to scrape category page: {category_url}")
-    driver = get_driver()
+    driver = driver_pool.acquire()
     if not driver:
         return []
 
@@ -156,6 +153,7 @@ def scrape_category_page(category_url):
         # Wait for the main product list container area
         list_container_selector = "div.filter-sort__list-product"
         show_more_button_selector = "a.button.btn-show-more.button__show-more-product"
+        product_item_selector = f"{list_container_selector} .product-info-container.product-item"
 
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, list_container_selector))
@@ -175,12 +173,17 @@ def scrape_category_page(category_url):
                     EC.element_to_be_clickable((By.CSS_SELECTOR, show_more_button_selector))
                 )
                 print(f"Found 'Show More' button. Attempting click {click_count + 1}...")
+                items_before = element_count(driver, product_item_selector)
+                button_before = button_state(show_more_button)
                 # Use JavaScript click as it's often more reliable
                 driver.execute_script("arguments[0].click();", show_more_button)
                 click_count += 1
-                # Wait for content to potentially load - adjust sleep time as needed
                 print("Waiting for more products to load...")
-                time.sleep(3) # Pause after click for content loading
+                # Done when new product items appear or the button changes (hidden, disabled, removed)
+                wait_until(driver, "show_more", any_of(
+                    count_increased(product_item_selector, items_before),
+                    button_changed(show_more_button, button_before)
+                ), SHOW_MORE_TIMEOUT)
 
             except (TimeoutException, NoSuchElementException):
                 print("'Show More' button not found or not clickable anymore.")
@@ -200,8 +203,9 @@ def scrape_category_page(category_url):
              print(f"Warning: Reached maximum 'Show More' clicks ({max_clicks}).")
 
         print("Finished clicking 'Show More'. Parsing full page...")
+        wait_until(driver, "category_settled", dom_settled(), SETTLE_TIMEOUT)
         # --- Parse Fully Loaded Page ---
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        soup = parse_page(driver.page_source, CATEGORY_REGIONS)
         product_list_container = soup.select_one(list_container_selector)
 
         if not product_list_container:
@@ -209,7 +213,7 @@ def scrape_category_page(category_url):
             return []
 
         # Select product items *within* the target container
-        product_items = product_list_container.select('.product-info-container.product-item')
+        product_items = PRODUCT_ITEMS.select(product_list_container)
         print(f"Found {len(product_items)} product items in '{list_container_selector}'.")
 
         for item in product_items:
@@ -217,9 +221,9 @@ def scrape_category_page(category_url):
             if item.find_parent('div', class_='boxHotSale'):
                 continue
 
-            link_tag = item.select_one('.product-info a.product__link')
-            name_tag = item.select_one('.product__name h3')
-            price_tag = item.select_one('.product__price--show') # Get the final price shown
+            link_tag = PRODUCT_LINK.select_one(item)
+            name_tag = PRODUCT_ITEM_NAME.select_one(item)
+            price_tag = PRODUCT_ITEM_PRICE.select_one(item) # Get the final price shown
 
             if link_tag and name_tag and price_tag:
                 href = link_tag.get('href')
@@ -245,8 +249,7 @@ def scrape_category_page(category_url):
         traceback.print_exc()
         return []
     finally:
-        if driver:
-            driver.quit()
+        driver_pool.release(driver)
 
 # --- Step 2: Consolidate Products ---
 def consolidate_products(initial_product_list):
@@ -297,27 +300,38 @@ def consolidate_products(initial_product_list):
     print(f"Consolidated into {len(result_list)} base products.")
     return result_list
 
-# --- Step 3: Extract Detail Data (Simplified) ---
-def extract_detail_data(url):
-    """Scrapes product detail page mainly for description and images."""
-    print(f"    Fetching details from: {url}")
-    driver = get_driver()
-    if not driver:
-        return {"description": [], "images": []} # Return empty structure
-
+# --- Step 3: Browser Fallback for Detail Pages ---
+def render_detail_page(url):
+    """Renders a detail page in a pooled browser and returns its HTML"""
+    driver = driver_pool.acquire()
+    if not driver: return None
     try:
         driver.get(url)
         # Wait for essential elements like title or description area
         WebDriverWait(driver, 45).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, ".box-product-name h1, .ksp-content, #cpsContentSEO"))
         )
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        return driver.page_source
+    finally:
+        driver_pool.release(driver)
+
+# Detail pages come from plain HTTP when the server-rendered HTML has the description and images
+page_fetcher = PageFetcher(required=("description", "images"), render=render_detail_page, user_agent=USER_AGENT)
+
+# --- Step 3: Extract Detail Data (Simplified) ---
+def extract_detail_data(url):
+    """Scrapes product detail page mainly for description and images."""
+    print(f"    Fetching details from: {url}")
+    try:
+        soup = page_fetcher.fetch(url)
+        if soup is None:
+            return {"description": [], "images": []} # Return empty structure
 
         # Description from specifications section
-        description = [item.get_text(strip=True) for item in soup.select('.ksp-content ul li, #cpsContentSEO li')]
+        description = [item.get_text(strip=True) for item in DESCRIPTION_ITEMS.select(soup)]
 
         # Main product images
-        images = [a["href"] for a in soup.select('.gallery-top .swiper-slide:not(#v2Gallery) a.spotlight') if a.has_attr("href")]
+        images = [a["href"] for a in GALLERY_LINKS.select(soup) if a.has_attr("href")]
 
         # Optionally re-verify brand here if needed from detail page elements
 
@@ -330,13 +344,10 @@ def extract_detail_data(url):
         print(f"    Error during detail scraping {url}: {str(e)}")
         # traceback.print_exc() # Enable for deep debugging
         return {"description": [], "images": []}
-    finally:
-        if driver:
-             driver.quit()
 
 # --- Step 4: Save to MongoDB ---
-def save_consolidated_product(data):
-    """Upserts the consolidated product data based on representative URL."""
+def save_consolidated_product(data, on_written=None):
+    """Queues an upsert of the consolidated product data based on representative URL."""
     if not data or "representative_url" not in data:
         print("  Missing representative_url in data, skipping save.")
         return False
@@ -357,24 +368,31 @@ def save_consolidated_product(data):
         "url": target_url, # Store the representative URL
     }
 
-    update_doc = {"$set": final_doc}
+    # Queued; written with other products in one unordered bulk_write (see bulk_writer.py)
+    return product_writer.upsert(target_url, final_doc, on_written)
 
-    try:
-        result = collection.update_one(
-            {"url": target_url}, # Use representative URL to find the document
-            update_doc,
-            upsert=True
-        )
-        if result.upserted_id:
-            print(f"  Inserted new base product: {data['base_name']} ({data['brand_name']})")
-        elif result.modified_count > 0: # Only report if actually modified
-            print(f"  Updated existing base product: {data['base_name']} ({data['brand_name']})")
-        elif result.matched_count > 0:
-            print(f"  Data for base product {data['base_name']} ({data['brand_name']}) already up-to-date.")
+
+# --- Step 3-4 for One Base Product (run by the crawl workers) ---
+def process_base_product(base_product):
+    """Fetches details for one consolidated product and saves it. Returns True on success (including skips)."""
+    print(f"  Base Product: {base_product['base_name']} ({base_product['brand_name']})")
+    url = base_product['representative_url']
+    # Step 3: Fetch additional details (description, images)
+    # (no conditional GET here: the saved document also holds variants from the category page)
+    details = extract_detail_data(url)
+
+    # Merge details into the base product data
+    base_product['description'] = details.get('description', [])
+    base_product['images'] = details.get('images', [])
+    base_product['tags'] = [] # Add default tags
+    base_product['popularity'] = 0 # Add default popularity
+
+    if not crawl_state.changed(url, base_product):
+        print(f"  Unchanged since last crawl, skipping write: {url}")
         return True
-    except Exception as e:
-        print(f"  Error saving to MongoDB for base product {data['base_name']} (URL {target_url}): {e}")
-        return False
+    # Step 4: Save the final consolidated product data
+    # Crawl state is recorded once the buffered write has actually been flushed
+    return save_consolidated_product(base_product, on_written=lambda: crawl_state.record(url, base_product))
 
 
 # --- MAIN EXECUTION ---
@@ -385,55 +403,57 @@ if __name__ == "__main__":
     start_time = time.time()
     print(f"\n--- Starting Scraper ---")
 
-    # Step 1: Scrape category page for initial product list
-    initial_list = scrape_category_page(category_page_url)
+    # Base products and their status live on disk: an interrupted run resumes where it stopped
+    frontier = Frontier(os.path.splitext(os.path.basename(__file__))[0], seed=category_page_url)
+    representative_url = lambda product: product['representative_url']
+
+    if frontier.checkpoint_value("seeded"):
+        print(f"Resuming previous run (category already scraped): {frontier.counts()}")
+    else:
+        # Step 1: Scrape category page for initial product list
+        initial_list = scrape_category_page(category_page_url)
+        if initial_list:
+            # Step 2: Consolidate products by base name/brand
+            consolidated_list = consolidate_products(initial_list)
+            frontier.add_many(consolidated_list, url_of=representative_url)
+            frontier.checkpoint("seeded", len(consolidated_list))
 
     processed_count = 0
     failed_count = 0
-
-    if initial_list:
-        # Step 2: Consolidate products by base name/brand
-        consolidated_list = consolidate_products(initial_list)
-
-        print(f"\n--- Processing {len(consolidated_list)} Base Products ---")
-        for i, base_product in enumerate(consolidated_list):
-            print(f"\n[{i+1}/{len(consolidated_list)}] Processing Base Product: {base_product['base_name']} ({base_product['brand_name']})")
-            rep_url = base_product['representative_url']
-
-            try:
-                # Step 3: Fetch additional details (description, images)
-                details = extract_detail_data(rep_url)
-
-                # Merge details into the base product data
-                base_product['description'] = details.get('description', [])
-                base_product['images'] = details.get('images', [])
-                # Add other fields required by schema with defaults
-                base_product['tags'] = []
-                base_product['popularity'] = 0
-
-                # Step 4: Save the final consolidated product data
-                if save_consolidated_product(base_product):
-                    processed_count += 1
-                else:
-                    failed_count += 1
-
-                # Add delay between processing base products
-                print(f"  Waiting for {REQUEST_DELAY} second(s)...")
-                time.sleep(REQUEST_DELAY)
-
-            except Exception as e:
-                print(f"  Unhandled error processing base product {base_product['base_name']} (URL {rep_url}): {e}")
-                traceback.print_exc()
-                failed_count += 1
-                # time.sleep(REQUEST_DELAY) # Optional delay on error
+    stats = None
+    total_to_process = frontier.counts()[PENDING]
+
+    if total_to_process:
+        print(f"\n--- Processing {total_to_process} Base Products ---")
+
+        # Detail pages run on CRAWL_WORKERS workers, each with its own pooled browser;
+        # failed pages are retried up to FRONTIER_MAX_ATTEMPTS times. Pending products are read
+        # (and their crawl state loaded) in batches, and only count as done once written.
+        stats = crawl_frontier(frontier, process_base_product, url_of=representative_url,
+                               rate=host_rate(REQUEST_DELAY), label="base product", writer=product_writer,
+                               on_batch=lambda batch: crawl_state.load(representative_url(p) for p in batch),
+                               skip=lambda url: not crawl_state.should_fetch(url))
+        processed_count = stats.succeeded
+        failed_count = stats.failed
 
     else:
         print("No initial products extracted from category page. Exiting.")
 
+    product_writer.close() # Flush the remaining buffered writes
+    crawl_state.close()
     end_time = time.time()
+    driver_pool.close()
     print("\n--- Scraper Finished ---")
     # Note: Counts are now per base product processed
-    print(f"Total Base Products Found: {len(consolidated_list) if 'consolidated_list' in locals() else 0}")
+    print(f"Total Base Products Found: {frontier.checkpoint_value('seeded', 0)}")
     print(f"Successfully Processed/Saved: {processed_count}")
     print(f"Failed Processing/Saving: {failed_count}")
+    if stats:
+        stats.print_summary()
+        page_fetcher.print_summary()
+        crawl_state.print_summary()
+        product_writer.print_summary()
+    wait_stats.print_summary()
+    frontier.print_summary()
+    frontier.close()
     print(f"Total Time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
@@ -8,20 +8,26 @@ from urllib.parse import urljoin
 import traceback # Import traceback for better error logging
 
 # import requests # requests imported but not used
-from bs4 import BeautifulSoup
 from pymongo import MongoClient
 
 # Selenium imports
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException, StaleElementReferenceException
 
-# Webdriver Manager import
-from webdriver_manager.microsoft import EdgeChromiumDriverManager
+# Shared pool of warm browsers, HTTP-first page fetching and the parallel crawl runner
+from driver_pool import DriverPool, crawl_profile
+from html_parse import (CATEGORY_REGIONS, parse_page, PRODUCT_ITEMS, PRODUCT_LINK, PRODUCT_NAME,
+                        PRODUCT_PRICE, ANY_PRICE, DESCRIPTION_ITEMS, GALLERY_LINKS, LIST_LINKED,
+                        LINKED_ITEMS)
+from page_fetch import PageFetcher, NOT_MODIFIED
+from crawl_state import CrawlState, CRAWL_STATE_COLLECTION
+from bulk_writer import BulkWriter
+from waits import (SHOW_MORE_TIMEOUT, SETTLE_TIMEOUT, wait_stats, wait_until, element_count,
+                   count_increased, button_state, button_changed, any_of, dom_settled, page_settled)
+from crawl_runner import CRAWL_WORKERS, host_rate
+from frontier import Frontier, PENDING, crawl_frontier
 
 from dotenv import load_dotenv
 
@@ -75,31 +81,16 @@ def clean_price(price_str):
         # print(f"Warning: Could not convert price string '{price_str}' to float after cleaning. Input: '{cleaned_str}'. Returning 0.")
         return 0
 
-def get_driver():
-    """Initialize Microsoft Edge browser with Selenium"""
-    options = EdgeOptions()
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    # Using a more recent-looking user agent string
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36 Edg/123.0.0.0")
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    # Suppress verbose console logs from WebDriver/Browser
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    options.add_argument('--log-level=3') # Further attempt to silence logs
+# One browser per crawl worker for the whole run; pages reuse a warm browser instead of starting Edge
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36 Edg/123.0.0.0"
+# Text and image URLs are read from the markup: images, fonts, media and trackers are not loaded
+driver_pool = DriverPool(size=CRAWL_WORKERS, user_agent=USER_AGENT, profile=crawl_profile())
 
-    try:
-        # Check if running in a container or environment where paths might be different
-        # You might need to explicitly provide paths if DriverManager fails
-        service = EdgeService(executable_path=EdgeChromiumDriverManager().install(), log_output=os.devnull) # Attempt to silence service logs
-        driver = webdriver.Edge(service=service, options=options)
-        driver.set_page_load_timeout(60) # Add page load timeout
-        return driver
-    except Exception as e:
-        print(f"Error initializing WebDriver: {e}")
-        print("Ensure Edge browser is installed and WebDriver can be downloaded/accessed.")
-        return None
+# Per-URL crawl time, HTTP validators and content hash, so re-crawls skip unchanged products
+crawl_state = CrawlState(db[CRAWL_STATE_COLLECTION])
+
+# Product upserts are buffered and written in unordered bulk batches (unique index on url)
+product_writer = BulkWriter(collection, label="products")
 
 def guess_brand_from_name(product_name):
     """Simple brand guessing based on substrings in the product name."""
@@ -134,7 +125,7 @@ def guess_brand_from_name(product_name):
 def scrape_category_urls(category_url):
     """Loads category page, clicks 'Show More', extracts unique product URLs."""
     print(f"Attempting to scrape category page for URLs: {category_url}")
-    driver = get_driver()
+    driver = driver_pool.acquire()
     if not driver: return []
 
     unique_product_urls = set()
@@ -142,6 +133,7 @@ def scrape_category_urls(category_url):
         driver.get(category_url)
         list_container_selector = "div.filter-sort__list-product"
         show_more_button_selector = "a.button.btn-show-more.button__show-more-product"
+        product_item_selector = f"{list_container_selector} .product-info-container.product-item"
 
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, list_container_selector))
@@ -160,6 +152,8 @@ def scrape_category_urls(category_url):
                     EC.element_to_be_clickable((By.CSS_SELECTOR, show_more_button_selector))
                 )
                 print(f"Found 'Show More' button. Attempting click {click_count + 1}...")
+                items_before = element_count(driver, product_item_selector)
+                button_before = button_state(show_more_button)
                 # Try JS click first, fallback to selenium click
                 try:
                     driver.execute_script("arguments[0].click();", show_more_button)
@@ -169,8 +163,11 @@ def scrape_category_urls(category_url):
 
                 click_count += 1
                 print("Waiting for more products to load...")
-                # Increase sleep time slightly, maybe check product count change later
-                time.sleep(4)
+                # Done when new product items appear or the button changes (hidden, disabled, removed)
+                wait_until(driver, "show_more", any_of(
+                    count_increased(product_item_selector, items_before),
+                    button_changed(show_more_button, button_before)
+                ), SHOW_MORE_TIMEOUT)
 
             except (TimeoutException, NoSuchElementException):
                 print("'Show More' button not found or not clickable anymore.")
@@ -191,9 +188,9 @@ def scrape_category_urls(category_url):
              print(f"Warning: Reached maximum 'Show More' clicks ({max_clicks}). May not have all products.")
 
         print("Finished clicking 'Show More'. Parsing page for URLs...")
-        # Allow final JS rendering
-        time.sleep(3)
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        # Allow final JS rendering: wait until the DOM stops changing
+        wait_until(driver, "category_settled", dom_settled(), SETTLE_TIMEOUT)
+        soup = parse_page(driver.page_source, CATEGORY_REGIONS)
         product_list_container = soup.select_one(list_container_selector)
 
         if not product_list_container:
@@ -201,14 +198,14 @@ def scrape_category_urls(category_url):
             return []
 
         # Find links *within* the target container
-        product_items = product_list_container.select('.product-info-container.product-item')
+        product_items = PRODUCT_ITEMS.select(product_list_container)
         print(f"Found {len(product_items)} product items in '{list_container_selector}'. Extracting URLs...")
 
         for item in product_items:
             # Skip potential nested sale boxes (should be redundant if main container is correct)
             if item.find_parent('div', class_='boxHotSale'): continue
 
-            link_tag = item.select_one('.product-info a.product__link')
+            link_tag = PRODUCT_LINK.select_one(item)
             if link_tag and link_tag.has_attr('href'):
                 href = link_tag['href']
                 # Basic filtering for non-product links
@@ -228,48 +225,60 @@ def scrape_category_urls(category_url):
         traceback.print_exc()
         return []
     finally:
-        if driver:
-            driver.quit()
+        driver_pool.release(driver)
 
 
 # --- Step 2 & 3: Extract Product Data (Skip if No Variants) ---
-def extract_product_data(url):
-    """Scrapes product detail page for all info, including variants from 'list-linked'.
-       Returns None if no valid variants are found."""
-    print(f"  Extracting data from: {url}")
-    driver = get_driver()
+def render_product_page(url):
+    """Browser fallback for detail pages: renders in a pooled browser, returns the HTML"""
+    driver = driver_pool.acquire()
     if not driver: return None
-
-    product_data = {}
     try:
         driver.get(url)
         WebDriverWait(driver, 45).until(
             EC.visibility_of_element_located((By.CSS_SELECTOR, ".box-product-name h1"))
         )
-        time.sleep(3) # Delay for dynamic content
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        # Dynamic content: wait for network idle and a quiet DOM instead of a fixed delay
+        wait_until(driver, "detail_settled", page_settled(), SETTLE_TIMEOUT)
+        return driver.page_source
+    finally:
+        driver_pool.release(driver)
+
+# Detail pages come from plain HTTP when the server-rendered HTML has every field read below
+page_fetcher = PageFetcher(required=("name", "description", "variants", "images"),
+                           render=render_product_page, user_agent=USER_AGENT)
+
+def extract_product_data(url):
+    """Scrapes product detail page for all info, including variants from 'list-linked'.
+       Returns None if no valid variants are found."""
+    print(f"  Extracting data from: {url}")
+    product_data = {}
+    try:
+        soup = page_fetcher.fetch(url, crawl_state.validators(url))
+        if soup is None: return None
+        if soup is NOT_MODIFIED: return NOT_MODIFIED
 
         # --- Extract Base Info ---
         name = "Unknown Product"
-        name_element = soup.select_one('.box-product-name h1')
+        name_element = PRODUCT_NAME.select_one(soup)
         if name_element: name = name_element.text.strip()
 
         base_price = 0
-        price_element = soup.select_one('.box-product-name .price .tpt---price') or soup.select_one('.tpt---price')
+        price_element = PRODUCT_PRICE.select_one(soup) or ANY_PRICE.select_one(soup)
         if price_element: base_price = clean_price(price_element.text)
 
-        description = [item.get_text(strip=True) for item in soup.select('.ksp-content ul li, #cpsContentSEO li')]
-        images = [a["href"] for a in soup.select('.gallery-top .swiper-slide:not(#v2Gallery) a.spotlight') if a.has_attr("href")]
+        description = [item.get_text(strip=True) for item in DESCRIPTION_ITEMS.select(soup)]
+        images = [a["href"] for a in GALLERY_LINKS.select(soup) if a.has_attr("href")]
 
         # --- Dynamic Brand Extraction ---
         brand_name = guess_brand_from_name(name)
 
         # --- Extract Variants EXPLICITLY from 'div.list-linked' ---
         variants = [] # Initialize empty list
-        list_linked_div = soup.select_one('div.list-linked')
+        list_linked_div = LIST_LINKED.select_one(soup)
         if list_linked_div:
             print(f"    Found 'div.list-linked'. Processing variant links...")
-            variant_links = list_linked_div.select('a.item-linked')
+            variant_links = LINKED_ITEMS.select(list_linked_div)
             print(f"      Found {len(variant_links)} variant links in 'list-linked'.")
 
             for link_tag in variant_links:
@@ -331,14 +340,11 @@ def extract_product_data(url):
         print(f"  Error during scraping {url}: {str(e)}")
         traceback.print_exc()
         return None # Return None on other errors
-    finally:
-        if driver:
-             driver.quit()
 
 
 # --- Step 4: Save Product Data ---
-def save_product_data(data):
-    """Formats and upserts product data based on URL."""
+def save_product_data(data, on_written=None):
+    """Formats product data and queues its upsert (by URL) on the bulk writer."""
     if not data or "url" not in data:
         print("  Missing URL or data, skipping save.")
         return False
@@ -355,15 +361,30 @@ def save_product_data(data):
         "popularity": data.get("popularity", 0),
         "url": target_url,
     }
-    update_doc = {"$set": doc_to_save}
-    try:
-        result = collection.update_one({"url": target_url}, update_doc, upsert=True)
-        if result.upserted_id: print(f"  Inserted: {doc_to_save['name']} ({doc_to_save['brand_name']})")
-        elif result.modified_count > 0: print(f"  Updated: {doc_to_save['name']} ({doc_to_save['brand_name']})")
+    # Queued; written with other products in one unordered bulk_write (see bulk_writer.py)
+    return product_writer.upsert(target_url, doc_to_save, on_written)
+
+# --- Step 2-4 for One URL (run by the crawl workers) ---
+def process_product_url(url):
+    """Extracts and saves one product. Returns True on success (including skips).
+    URLs crawled recently are skipped before this runs (crawl_frontier skip=)."""
+    # Step 2 & 3: Extract data including variants from list-linked
+    product_data = extract_product_data(url)
+    validators = page_fetcher.validators_for(url)
+    if product_data is NOT_MODIFIED:
+        print(f"  Not modified since last crawl: {url}")
+        crawl_state.not_modified(url)
         return True
-    except Exception as e:
-        print(f"  Error saving to MongoDB for {doc_to_save.get('name', 'Unknown')} (URL {target_url}): {e}")
+    if not product_data:
+        print(f"  Failed to extract data for URL: {url}")
         return False
+    if not crawl_state.changed(url, product_data, validators):
+        print(f"  Unchanged since last crawl, skipping write: {url}")
+        return True
+    # Step 4: Save the extracted data
+    # Crawl state is recorded once the buffered write has actually been flushed
+    return save_product_data(product_data, on_written=lambda: crawl_state.record(url, product_data, validators))
+
 
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
@@ -377,61 +398,55 @@ if __name__ == "__main__":
     start_time = time.time()
     print(f"\n--- Starting Scraper for Category: {category_page_url} ---")
 
-    # Step 1: Get unique product URLs
-    product_urls = scrape_category_urls(category_page_url)
+    # URLs and their status live on disk: an interrupted run resumes where it stopped
+    frontier = Frontier(os.path.splitext(os.path.basename(__file__))[0], seed=category_page_url)
 
-    processed_count = 0
-    failed_count = 0
-    urls_to_process = product_urls
-
-    # Apply limit if set
+    if frontier.checkpoint_value("seeded"):
+        found_count = frontier.checkpoint_value("seeded")
+        print(f"Resuming previous run (category already scraped): {frontier.counts()}")
+    else:
+        # Step 1: Get unique product URLs
+        product_urls = scrape_category_urls(category_page_url)
+        found_count = len(product_urls)
+
+        # Apply limit if set
+        if max_products_to_process is not None and max_products_to_process > 0:
+            product_urls = product_urls[:max_products_to_process]
+        frontier.add_many(product_urls)
+        if product_urls: # An empty scrape is retried on the next run
+            frontier.checkpoint("seeded", found_count)
+
+    pending_count = frontier.counts()[PENDING]
     if max_products_to_process is not None and max_products_to_process > 0:
-        urls_to_process = product_urls[:max_products_to_process]
-        print(f"\n--- Processing {len(urls_to_process)} URLs (Limit Applied: {max_products_to_process}) ---")
+        print(f"\n--- Processing {pending_count} URLs (Limit Applied: {max_products_to_process}) ---")
     else:
-        print(f"\n--- Processing {len(urls_to_process)} URLs ---")
-
-    # Main processing loop
-    for i, url in enumerate(urls_to_process):
-        print(f"\n[{i+1}/{len(urls_to_process)}] Processing URL: {url}")
-        try:
-            # Step 2 & 3: Extract data including variants from list-linked
-            product_data = extract_product_data(url)
-
-            if product_data:
-                # Step 4: Save the extracted data
-                if save_product_data(product_data):
-                    processed_count += 1
-                else:
-                    failed_count += 1
-            else:
-                print(f"  Failed to extract data for URL: {url}")
-                failed_count += 1 # Count extraction failures
-
-            # Add delay between processing product pages
-            print(f"  Waiting for {REQUEST_DELAY} second(s)...")
-            time.sleep(REQUEST_DELAY)
-
-        except KeyboardInterrupt:
-             print("\nCtrl+C detected. Stopping scraper...")
-             break # Exit loop immediately
-        except Exception as e:
-            # Catch unexpected errors in the main loop
-            print(f"  Unhandled error processing URL {url}: {e}")
-            traceback.print_exc()
-            failed_count += 1
-            # Optional delay even after error?
-            # print(f"  Waiting for {REQUEST_DELAY} second(s) after error...")
-            # time.sleep(REQUEST_DELAY)
-    else: # Only executes if the loop completes without a 'break'
-        print("\nFinished processing all designated URLs.")
+        print(f"\n--- Processing {pending_count} URLs ---")
+
+    # Detail pages run on CRAWL_WORKERS workers, each with its own pooled browser;
+    # failed pages are retried up to FRONTIER_MAX_ATTEMPTS times. Pending URLs are read
+    # (and their crawl state loaded) in batches, and only count as done once written.
+    stats = crawl_frontier(frontier, process_product_url, rate=host_rate(REQUEST_DELAY),
+                           writer=product_writer, on_batch=crawl_state.load,
+                           skip=lambda url: not crawl_state.should_fetch(url))
+    processed_count = stats.succeeded
+    failed_count = stats.failed
 
     # Final Summary
+    product_writer.close() # Flush the remaining buffered writes
+    crawl_state.close()
     end_time = time.time()
+    driver_pool.close()
     print("\n--- Scraper Finished ---")
-    print(f"Total Unique URLs Found: {len(product_urls)}")
+    print(f"Total Unique URLs Found: {found_count}")
     if max_products_to_process is not None:
-         print(f"Attempted to Process (Limit Applied): {len(urls_to_process)}")
+         print(f"Attempted to Process (Limit Applied): {pending_count}")
     print(f"Successfully Processed/Saved: {processed_count}")
     print(f"Failed Processing/Saving: {failed_count}")
+    stats.print_summary()
+    page_fetcher.print_summary()
+    crawl_state.print_summary()
+    product_writer.print_summary()
+    wait_stats.print_summary()
+    frontier.print_summary()
+    frontier.close()
     print(f"Total Time: {end_time - start_time:.2f} seconds")
\ No newline at end of file
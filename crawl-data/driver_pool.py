@@ -0,0 +1,298 @@
+import atexit
+import os
+import queue
+import threading
+
+# Selenium imports
+from selenium import webdriver
+from selenium.webdriver.edge.service import Service as EdgeService
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.common.exceptions import WebDriverException
+
+# Webdriver Manager import
+from webdriver_manager.microsoft import EdgeChromiumDriverManager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Pool Settings ---
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "1")) # Browsers kept alive at once
+DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES", "50")) # Recycle a browser after this many pages
+EDGE_DRIVER_PATH = os.getenv("EDGE_DRIVER_PATH") # Skip webdriver-manager entirely when set
+PAGE_LOAD_TIMEOUT = 60
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36 Edg/123.0.0.0"
+
+# --- Crawl Profile Settings ---
+BROWSER_PROFILE = os.getenv("BROWSER_PROFILE", "light").strip().lower() # light | full (loads everything, for debugging)
+BLOCK_HOSTS = [h.strip() for h in os.getenv("BLOCK_HOSTS", "").split(",") if h.strip()] # Extra hosts to block
+
+# Resource types the crawlers never read (image URLs come from href attributes, not from loading them)
+IMAGE_PATTERNS = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"]
+FONT_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+MEDIA_PATTERNS = ["*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg", "*youtube.com/embed*", "*ytimg.com*"]
+
+# Analytics, ads, chat and social widgets loaded by the product pages
+THIRD_PARTY_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "googleadservices.com",
+    "doubleclick.net", "adservice.google.com", "connect.facebook.net", "facebook.com/tr",
+    "analytics.tiktok.com", "clarity.ms", "hotjar.com", "criteo.com", "criteo.net",
+    "sp.zalo.me", "chat.zalo.me", "widget.subiz.net", "useinsider.com",
+    "onesignal.com", "ads.pubmatic.com", "adnxs.com", "yandex.ru", "bing.com/bat",
+] + BLOCK_HOSTS
+
+# Clears what a page may leave behind and returns the bytes it transferred (same-origin and
+# Timing-Allow-Origin resources only, so a lower bound). Storage access throws on about:blank.
+RESET_SCRIPT = """
+var bytes = 0;
+try {
+    performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+        .forEach(function (entry) { bytes += entry.transferSize || 0; });
+} catch (e) {}
+try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}
+return bytes;
+"""
+
+
+# --- Driver Binary ---
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def driver_path():
+    """Resolves the msedgedriver binary once per process.
+       EdgeChromiumDriverManager().install() checks versions (and may hit the network)
+       on every call, so the path is cached after the first success."""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = EDGE_DRIVER_PATH or EdgeChromiumDriverManager().install()
+        return _driver_path
+
+
+# --- Crawl Profile ---
+class BrowserProfile:
+    """What a crawl browser loads and how long driver.get() waits.
+
+    Blocked requests fail inside the browser (Network.setBlockedURLs), so pages
+    render their markup, and the crawlers' selectors, unchanged. An "eager" page
+    load returns at DOMContentLoaded; the crawlers wait for their elements afterwards.
+    """
+
+    def __init__(self, name="light", block_images=True, block_fonts=True, block_media=True,
+                 blocked_hosts=THIRD_PARTY_HOSTS, page_load_strategy="eager", window_size=(800, 600)):
+        self.name = name
+        self.block_images = block_images
+        self.block_fonts = block_fonts
+        self.block_media = block_media
+        self.blocked_hosts = list(blocked_hosts)
+        self.page_load_strategy = page_load_strategy
+        self.window_size = window_size # (width, height), None = browser default
+
+    def blocked_urls(self):
+        patterns = [f"*{host}*" for host in self.blocked_hosts]
+        if self.block_images: patterns += IMAGE_PATTERNS
+        if self.block_fonts: patterns += FONT_PATTERNS
+        if self.block_media: patterns += MEDIA_PATTERNS
+        return patterns
+
+    def replace(self, **changes):
+        """Copy with some settings changed, e.g. crawl_profile().replace(block_images=False)"""
+        return BrowserProfile(**dict(vars(self), **changes))
+
+    def __repr__(self):
+        return f"BrowserProfile({self.name!r}, {len(self.blocked_urls())} blocked pattern(s), {self.page_load_strategy})"
+
+
+LIGHT_PROFILE = BrowserProfile()
+FULL_PROFILE = BrowserProfile("full", block_images=False, block_fonts=False, block_media=False,
+                              blocked_hosts=(), page_load_strategy="normal", window_size=None)
+PROFILES = {"light": LIGHT_PROFILE, "full": FULL_PROFILE}
+
+
+def crawl_profile(**changes):
+    """The BROWSER_PROFILE chosen in .env, with per-crawler changes applied"""
+    profile = PROFILES.get(BROWSER_PROFILE)
+    if profile is None:
+        print(f"Warning: Unknown BROWSER_PROFILE '{BROWSER_PROFILE}'; using 'light'.")
+        profile = LIGHT_PROFILE
+    return profile.replace(**changes) if changes else profile
+
+
+def build_options(user_agent=DEFAULT_USER_AGENT, profile=LIGHT_PROFILE):
+    """Headless Edge options shared by all crawlers"""
+    options = EdgeOptions()
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.window_size:
+        options.add_argument("--window-size={},{}".format(*profile.window_size))
+    if profile.block_images:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    if profile.block_media:
+        options.add_argument("--autoplay-policy=user-gesture-required")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={user_agent}")
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    # Suppress verbose console logs from WebDriver/Browser
+    options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    options.add_argument('--log-level=3')
+    return options
+
+
+def block_requests(driver, profile):
+    """Installs the profile's URL blocklist; it holds for every later page in this browser"""
+    patterns = profile.blocked_urls()
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except WebDriverException as e:
+        print(f"Warning: Could not block resources ({e.msg}); pages load in full.")
+
+
+def new_driver(user_agent=DEFAULT_USER_AGENT, page_load_timeout=PAGE_LOAD_TIMEOUT, profile=LIGHT_PROFILE):
+    """Starts one headless Edge browser. Returns None if it cannot be started."""
+    try:
+        service = EdgeService(executable_path=driver_path(), log_output=os.devnull)
+        driver = webdriver.Edge(service=service, options=build_options(user_agent, profile))
+        driver.set_page_load_timeout(page_load_timeout)
+        block_requests(driver, profile)
+        return driver
+    except Exception as e:
+        print(f"Error initializing WebDriver: {e}")
+        print("Ensure Edge browser is installed and WebDriver can be downloaded/accessed.")
+        return None
+
+
+# --- Driver Pool ---
+class DriverPool:
+    """Keeps up to `size` headless browsers alive and hands them out one page at a time.
+
+    Usage mirrors the old get_driver()/quit() pair:
+        driver = pool.acquire()
+        try: ... finally: pool.release(driver)
+
+    On release the browser is reset (cookies, storage, extra windows, about:blank) and
+    returned to the pool. A browser that fails the reset (crashed or hung session) or
+    has served `max_pages` pages is quit and replaced on the next acquire.
+    Thread-safe, so several workers can share one pool.
+    Browsers start with `profile` (default: BROWSER_PROFILE from .env).
+    """
+
+    def __init__(self, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES,
+                 user_agent=DEFAULT_USER_AGENT, page_load_timeout=PAGE_LOAD_TIMEOUT, profile=None):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.user_agent = user_agent
+        self.page_load_timeout = page_load_timeout
+        self.profile = profile or crawl_profile()
+        self._idle = queue.LifoQueue() # Most recently used first keeps the warm browsers warm
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"started": 0, "recycled": 0, "crashed": 0, "pages": 0, "bytes": 0}
+        atexit.register(self.close)
+
+    def _start(self):
+        driver = new_driver(self.user_agent, self.page_load_timeout, self.profile)
+        if driver:
+            with self._lock:
+                self._pages[driver] = 0
+                self.stats["started"] += 1
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass # Browser process already gone
+
+    def _reset(self, driver):
+        """Returns False if the browser no longer responds"""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            transferred = driver.execute_script(RESET_SCRIPT) or 0
+            with self._lock:
+                self.stats["bytes"] += transferred
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except WebDriverException:
+            return False
+
+    def warm(self):
+        """Starts all `size` browsers up front instead of on first use"""
+        started = []
+        for _ in range(self.size):
+            driver = self.acquire()
+            if not driver:
+                break
+            started.append(driver)
+        for driver in started:
+            self.release(driver, count_page=False)
+        return len(started)
+
+    def acquire(self, timeout=None):
+        """Borrows a browser; blocks while all `size` browsers are in use.
+           Returns None if no browser could be started (or the wait timed out)."""
+        if self._closed or not self._slots.acquire(timeout=timeout):
+            return None
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        driver = self._start()
+        if not driver:
+            self._slots.release()
+        return driver
+
+    def release(self, driver, count_page=True):
+        """Returns a browser to the pool, recycling it if it crashed or is worn out"""
+        if not driver:
+            return
+        try:
+            with self._lock:
+                if count_page:
+                    self._pages[driver] = self._pages.get(driver, 0) + 1
+                    self.stats["pages"] += 1
+                pages = self._pages.get(driver, 0)
+
+            if self._closed:
+                self._discard(driver)
+            elif not self._reset(driver):
+                print("  Browser stopped responding; replacing it.")
+                with self._lock:
+                    self.stats["crashed"] += 1
+                self._discard(driver)
+            elif pages >= self.max_pages:
+                with self._lock:
+                    self.stats["recycled"] += 1
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Quits every idle browser. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        print(f"Driver pool closed: {self.stats['started']} browser(s) started for {self.stats['pages']} page(s), "
+              f"{self.stats['recycled']} recycled, {self.stats['crashed']} crashed; "
+              f"{self.profile.name} profile, >= {self.stats['bytes'] / 1048576:.1f} MiB transferred.")
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from crawl_runner import CRAWL_WORKERS, CrawlStats, crawl_all
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Frontier Settings ---
+FRONTIER_DIR = os.getenv("FRONTIER_DIR", "frontier") # One SQLite file per crawler script
+FRONTIER_MAX_ATTEMPTS = int(os.getenv("FRONTIER_MAX_ATTEMPTS", "3")) # Tries per URL before it is marked failed
+FRONTIER_RESET = os.getenv("FRONTIER_RESET", "0").strip().lower() in ("1", "true", "yes") # Discard a saved run
+FRONTIER_CAPACITY = int(os.getenv("FRONTIER_CAPACITY", "100000")) # Expected URLs; the Bloom filter grows past it
+FRONTIER_BATCH_SIZE = int(os.getenv("FRONTIER_BATCH_SIZE", "500")) # Pending rows read (and crawled) at a time
+BLOOM_ERROR_RATE = 0.001
+
+PENDING, IN_PROGRESS, WRITING, DONE, FAILED = "pending", "in_progress", "writing", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    payload TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS urls_status ON urls (status, position);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS bloom (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    capacity INTEGER,
+    error_rate REAL,
+    count INTEGER,
+    bits BLOB
+);
+"""
+
+
+# --- Seen-URL Filter ---
+class BloomFilter:
+    """Fixed-size set membership with no false negatives: `url in bloom` is False
+    for every URL never added and True for added ones (and for about `error_rate`
+    of the others). 100k URLs at 0.1% take ~180 KB instead of a set of strings."""
+
+    def __init__(self, capacity=FRONTIER_CAPACITY, error_rate=BLOOM_ERROR_RATE, bits=None, count=0):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2)) # Bits
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, url):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, url):
+        for position in self._positions(url):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, url):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(url))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+# --- Disk-Backed Frontier ---
+class Frontier:
+    """The URLs of one crawl run with their status, kept in SQLite so a run that
+    dies (Ctrl+C, browser crash, timeout) resumes where it stopped.
+
+    Each URL is pending -> in_progress -> writing -> done, or back to pending after
+    a failed attempt until `max_attempts` is reached (then failed). "writing" means
+    the result sits in a BulkWriter buffer; the URL is done once that write lands.
+    URLs a killed run left in_progress or writing are queued again on resume. Checkpoints record finished steps (e.g.
+    the category scrape) so they are not repeated on resume. Once every URL is
+    done or failed the run is complete and the next run starts from scratch.
+
+    `seed` identifies the run (e.g. the category URL); a saved frontier with a
+    different seed is discarded. Safe to use from several crawl workers.
+    """
+
+    def __init__(self, name, seed, max_attempts=FRONTIER_MAX_ATTEMPTS, reset=FRONTIER_RESET, directory=FRONTIER_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # Durable across crashes of the crawler, fast commits
+        self._db.executescript(SCHEMA)
+
+        saved_seed = self.checkpoint_value("seed")
+        if reset or (saved_seed is not None and saved_seed != seed) or self.checkpoint_value("complete"):
+            self.clear()
+        # Work (or buffered writes) of a run that died never completed
+        self._execute("UPDATE urls SET status = ? WHERE status IN (?, ?)", (PENDING, IN_PROGRESS, WRITING))
+        self.resumed = not self._empty_run()
+        self.checkpoint("seed", seed)
+        self.bloom = self._load_bloom()
+
+    # --- Storage helpers ---
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _empty_run(self):
+        return not self._execute("SELECT 1 FROM urls LIMIT 1") and not self.checkpoint_value("seeded")
+
+    def clear(self):
+        with self._lock:
+            self._db.executescript("DELETE FROM urls; DELETE FROM checkpoints; DELETE FROM bloom;")
+
+    # --- Checkpoints ---
+    def checkpoint(self, key, value=True):
+        """Records that a step finished (value is stored as JSON)"""
+        self._execute("INSERT OR REPLACE INTO checkpoints (key, value, updated_at) VALUES (?, ?, ?)",
+                      (key, json.dumps(value), time.time()))
+
+    def checkpoint_value(self, key, default=None):
+        rows = self._execute("SELECT value FROM checkpoints WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    # --- Seen URLs ---
+    def _load_bloom(self):
+        rows = self._execute("SELECT capacity, error_rate, count, bits FROM bloom WHERE id = 1")
+        if rows:
+            capacity, error_rate, count, bits = rows[0]
+            return BloomFilter(capacity, error_rate, bits, count)
+        return self._rebuild_bloom(FRONTIER_CAPACITY)
+
+    def _rebuild_bloom(self, capacity):
+        """Refills the filter from the urls table (streamed, not loaded at once)"""
+        total = self._execute("SELECT COUNT(*) FROM urls")[0][0]
+        bloom = BloomFilter(max(capacity, total * 2))
+        with self._lock:
+            for (url,) in self._db.execute("SELECT url FROM urls"):
+                bloom.add(url)
+        return bloom
+
+    def _save_bloom(self):
+        with self._lock:
+            bloom = self.bloom
+            self._db.execute("INSERT OR REPLACE INTO bloom (id, capacity, error_rate, count, bits) VALUES (1, ?, ?, ?, ?)",
+                             (bloom.capacity, bloom.error_rate, bloom.count, bytes(bloom.bits)))
+
+    def seen(self, url):
+        """True if url is already in the frontier. The Bloom filter answers most
+           new URLs without a query; a positive is confirmed in SQLite."""
+        if url not in self.bloom:
+            return False
+        return bool(self._execute("SELECT 1 FROM urls WHERE url = ?", (url,)))
+
+    def add_many(self, items, url_of=lambda item: item):
+        """Queues the items not seen before, in order; returns how many were new.
+           Non-string items (e.g. product dicts) are stored as JSON payloads."""
+        added = 0
+        with self._lock:
+            position = self._db.execute("SELECT COALESCE(MAX(position), 0) FROM urls").fetchone()[0]
+            self._db.execute("BEGIN")
+            try:
+                for item in items:
+                    url = url_of(item)
+                    if url in self.bloom and self._db.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone():
+                        continue
+                    position += 1
+                    payload = None if isinstance(item, str) else json.dumps(item, ensure_ascii=False, default=str)
+                    self._db.execute("INSERT INTO urls (url, position, payload, updated_at) VALUES (?, ?, ?, ?)",
+                                     (url, position, payload, time.time()))
+                    self.bloom.add(url)
+                    added += 1
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if self.bloom.full:
+            self.bloom = self._rebuild_bloom(self.bloom.capacity * 2)
+        self._save_bloom()
+        return added
+
+    # --- Work Queue ---
+    def pending(self, batch_size=FRONTIER_BATCH_SIZE):
+        """Yields the pending items in the order they were added, `batch_size` rows
+           at a time, so the frontier is never loaded whole. Rows that become pending
+           again behind the cursor (failed attempts) wait for the next pass."""
+        last = 0
+        while True:
+            rows = self._execute("SELECT position, url, payload FROM urls WHERE status = ? AND position > ? "
+                                 "ORDER BY position LIMIT ?", (PENDING, last, batch_size))
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [json.loads(payload) if payload is not None else url for _, url, payload in rows]
+
+    def start(self, url):
+        self._execute("UPDATE urls SET status = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                      (IN_PROGRESS, time.time(), url))
+
+    def finish(self, url, ok, error=None):
+        """done, or pending again (failed once out of attempts)"""
+        if ok:
+            self._execute("UPDATE urls SET status = ?, last_error = NULL, updated_at = ? WHERE url = ?",
+                          (DONE, time.time(), url))
+            return
+        self._execute("UPDATE urls SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, last_error = ?, "
+                      "updated_at = ? WHERE url = ?",
+                      (self.max_attempts, FAILED, PENDING, error or "task returned False", time.time(), url))
+
+    def track(self, task, url_of=lambda item: item, writer=None):
+        """Wraps a crawl task so every attempt is recorded in the frontier.
+           With a BulkWriter, a successful URL is only done once its buffered
+           write has been flushed; a crash before that re-crawls it."""
+        def tracked(item):
+            url = url_of(item)
+            self.start(url)
+            try:
+                ok = bool(task(item))
+            except Exception as e:
+                self.finish(url, False, f"{type(e).__name__}: {e}")
+                raise
+            if ok and writer is not None:
+                self._execute("UPDATE urls SET status = ?, updated_at = ? WHERE url = ?", (WRITING, time.time(), url))
+                writer.when_written(url, lambda: self.finish(url, True))
+            else:
+                self.finish(url, ok)
+            return ok
+        return tracked
+
+    def counts(self):
+        counts = {PENDING: 0, IN_PROGRESS: 0, WRITING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(self._execute("SELECT status, COUNT(*) FROM urls GROUP BY status")))
+        return counts
+
+    def failed(self, limit=10):
+        return self._execute("SELECT url, attempts, last_error FROM urls WHERE status = ? ORDER BY position LIMIT ?",
+                             (FAILED, limit))
+
+    def complete(self):
+        """Seeded and nothing left to crawl"""
+        counts = self.counts()
+        return bool(self.checkpoint_value("seeded")) and not (counts[PENDING] or counts[IN_PROGRESS] or counts[WRITING])
+
+    def close(self):
+        """Saves the Bloom filter and marks a finished run complete"""
+        if self.complete():
+            self.checkpoint("complete")
+        self._save_bloom()
+        with self._lock:
+            self._db.close()
+
+    def print_summary(self):
+        counts = self.counts()
+        state = "complete" if self.complete() else "will resume on next run"
+        print(f"Frontier ({self.path}): {counts[DONE]} done, {counts[FAILED]} failed, "
+              f"{counts[PENDING] + counts[IN_PROGRESS] + counts[WRITING]} left -- {state}")
+        for url, attempts, error in self.failed():
+            print(f"  Failed after {attempts} attempt(s): {url} ({error})")
+
+
+def crawl_frontier(frontier, task, url_of=lambda item: item, workers=CRAWL_WORKERS, rate=1, label="URL",
+                   writer=None, on_batch=None, skip=None):
+    """crawl_all over the frontier's pending items, one batch at a time, then again
+       over the failed ones until they succeed or run out of attempts. Stops on Ctrl+C.
+       on_batch(items) runs before each batch (e.g. to prefetch crawl state); `writer`
+       is the BulkWriter the task saves through (see Frontier.track). skip(url) is
+       checked before the rate limiter (see crawl_all); skipped URLs are marked done.
+       stats.failed is the number of items that ran out of attempts, each counted once."""
+    stats = CrawlStats()
+    tracked = frontier.track(task, url_of, writer)
+
+    def skipped(url):
+        if skip(url):
+            frontier.finish(url, True)
+            return True
+        return False
+    for attempt in range(frontier.max_attempts):
+        remaining = frontier.counts()[PENDING]
+        if not remaining:
+            break
+        if attempt:
+            print(f"\n--- Retrying {remaining} {label}(s) (pass {attempt + 1} of {frontier.max_attempts}) ---")
+        for items in frontier.pending():
+            if on_batch:
+                on_batch(items)
+            crawl_all(items, tracked, url_of=url_of, workers=workers, rate=rate, label=label, stats=stats,
+                      skip=skipped if skip else None)
+            if stats.interrupted:
+                break
+        if stats.interrupted:
+            break
+    stats.failed = frontier.counts()[FAILED]
+    return stats
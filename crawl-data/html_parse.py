@@ -0,0 +1,100 @@
+import os
+from functools import lru_cache
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Parser Settings ---
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml").strip() # lxml (C, fast), html5lib or html.parser (pure Python)
+PARSE_REGIONS = os.getenv("PARSE_REGIONS", "1").strip().lower() not in ("0", "false", "no") # Set 0 to build the whole tree
+
+
+def resolve_parser(name):
+    """Falls back to the built-in html.parser when the configured backend is not installed"""
+    if name == "html.parser":
+        return name
+    try:
+        BeautifulSoup("", name)
+        return name
+    except Exception: # bs4.FeatureNotFound
+        print(f"Warning: HTML parser '{name}' is not installed (pip install {name}); using html.parser.")
+        return "html.parser"
+
+
+PARSER = resolve_parser(HTML_PARSER)
+
+
+# --- Region-Restricted Parsing ---
+class RegionStrainer(SoupStrainer):
+    """Keeps only the elements carrying one of `classes` (or `ids`), with everything
+    inside them; the rest of the page is never turned into Tag objects.
+    Selectors that run on the result must not reach outside these regions."""
+
+    def __init__(self, classes=(), ids=()):
+        super().__init__()
+        self.classes = frozenset(classes)
+        self.ids = frozenset(ids)
+
+    def in_region(self, attrs):
+        if attrs.get("id") in self.ids:
+            return True
+        classes = attrs.get("class") or ()
+        if isinstance(classes, str):
+            classes = classes.split() # Raw attribute value while parsing
+        return not self.classes.isdisjoint(classes)
+
+    # beautifulsoup4 >= 4.13 asks before creating each top-level tag / string
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.in_region(attrs or {})
+
+    def allow_string_creation(self, string):
+        return False
+
+    # Older beautifulsoup4 releases call search_tag() instead
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        attrs = getattr(markup_name, "attrs", None) or markup_attrs
+        return markup_name if self.in_region(dict(attrs)) else None
+
+    def __repr__(self):
+        return f"RegionStrainer(classes={sorted(self.classes)}, ids={sorted(self.ids)})"
+
+
+# Category listings: the product grid (crawler2 waits for the outer .product-list-filter)
+CATEGORY_REGIONS = RegionStrainer(classes=("filter-sort__list-product", "product-list-filter"))
+
+# Product detail pages: title/price box, storage variants, gallery and specifications
+DETAIL_REGIONS = RegionStrainer(
+    classes=("box-product-name", "tpt---price", "list-linked", "list-variants", "gallery-top", "ksp-content"),
+    ids=("cpsContentSEO",),
+)
+
+
+def parse_page(html, regions=None):
+    """Parses `html` (str or bytes) with the configured backend, restricted to `regions`"""
+    return BeautifulSoup(html, PARSER, parse_only=regions if PARSE_REGIONS else None)
+
+
+# --- Precompiled Selectors ---
+@lru_cache(maxsize=None)
+def css(selector):
+    """Compiled once, reused for every page: css(s).select(soup) / .select_one(soup)"""
+    return soupsieve.compile(selector)
+
+
+PRODUCT_ITEMS = css(".product-info-container.product-item")
+PRODUCT_LINK = css(".product-info a.product__link")
+PRODUCT_ITEM_NAME = css(".product__name h3")
+PRODUCT_ITEM_PRICE = css(".product__price--show")
+
+PRODUCT_NAME = css(".box-product-name h1")
+PRODUCT_PRICE = css(".box-product-name .price .tpt---price")
+ANY_PRICE = css(".tpt---price")
+DESCRIPTION_ITEMS = css(".ksp-content ul li, #cpsContentSEO li")
+GALLERY_LINKS = css(".gallery-top .swiper-slide:not(#v2Gallery) a.spotlight")
+LIST_LINKED = css("div.list-linked")
+LINKED_ITEMS = css("a.item-linked")
+STORAGE_LINKS = css("div.list-linked a.item-linked")
@@ -0,0 +1,133 @@
+"""Writes the offline pages bench_parse.py benchmarks by default.
+
+    python make_fixtures.py [directory]   # default ./fixtures
+
+The pages copy the markup the crawlers read (product grid, title/price box,
+variants, gallery, specifications) and surround it with the header, menus,
+inline scripts and footer a saved page carries, so the parse cost is realistic.
+Output is deterministic; the generated files are checked in under fixtures/.
+"""
+import os
+import random
+import sys
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SEED = 20240521
+
+BRANDS = ("Samsung", "Apple", "Xiaomi", "OPPO", "vivo", "realme", "ASUS", "Lenovo", "HP", "Dell")
+SERIES = ("Galaxy", "iPhone", "Redmi Note", "Reno", "Vivobook", "IdeaPad", "Pavilion", "Inspiron", "Watch", "Pad")
+STORAGE = ("64GB", "128GB", "256GB", "512GB", "1TB")
+
+
+def price(rng):
+    return f"{rng.randrange(2_000, 60_000) * 1000:,}".replace(",", ".") + "đ"
+
+
+def chrome(rng, body):
+    """Wraps `body` in the site header, navigation, scripts and footer"""
+    menu = "".join(
+        f'<li class="menu-item"><a href="/{s.lower().replace(" ", "-")}.html" class="menu-link">'
+        f'<span class="icon icon-{i}"></span>{s}</a><div class="sub-menu">'
+        + "".join(f'<a href="/{b.lower()}-{i}-{j}.html" class="sub-link">{b} {s}</a>' for j, b in enumerate(BRANDS))
+        + "</div></li>"
+        for i, s in enumerate(SERIES)
+    )
+    scripts = "".join(
+        f'<script type="text/javascript">window.__state_{i} = {{"id": {i}, "items": ['
+        + ",".join(f'{{"sku": "{rng.randrange(10**8)}", "stock": {rng.randrange(100)}}}' for _ in range(40))
+        + "]};</script>"
+        for i in range(12)
+    )
+    footer = "".join(
+        f'<div class="footer-col"><h4>Column {i}</h4><ul>'
+        + "".join(f'<li><a href="/policy-{i}-{j}.html">Policy link {i}.{j}</a></li>' for j in range(12))
+        + "</ul></div>"
+        for i in range(6)
+    )
+    return (
+        '<!DOCTYPE html><html lang="vi"><head><meta charset="utf-8"><title>Fixture</title>'
+        '<link rel="stylesheet" href="/css/app.css">' + scripts + "</head><body>"
+        f'<header class="header"><nav class="menu-tree"><ul>{menu}</ul></nav></header>'
+        f'<main id="layout-page">{body}</main>'
+        f'<footer class="footer">{footer}</footer></body></html>'
+    )
+
+
+def product_name(rng):
+    return f"{rng.choice(BRANDS)} {rng.choice(SERIES)} {rng.randrange(5, 20)} {rng.choice(STORAGE)}"
+
+
+def category_page(rng, items):
+    cards = "".join(
+        '<div class="product-info-container product-item"><div class="item-product__box-sticker">'
+        f'<p class="product__sticker">Trả góp 0%</p></div><div class="product-info">'
+        f'<a href="/product-{i}.html" class="product__link button__link">'
+        f'<div class="product__image"><img src="/img/{i}.webp" alt="p{i}" loading="lazy"></div>'
+        f'<div class="product__name"><h3>{product_name(rng)}</h3></div>'
+        f'<div class="block-box-price"><p class="product__price--show">{price(rng)}</p>'
+        f'<p class="product__price--through">{price(rng)}</p></div></a>'
+        '<div class="product__promotions"><p>Giảm thêm tới 1.000.000đ khi thanh toán qua thẻ</p></div>'
+        "</div></div>"
+        for i in range(items)
+    )
+    filters = "".join(f'<a class="btn-filter" href="?brand={b}">{b}</a>' for b in BRANDS * 4)
+    return chrome(rng, (
+        f'<div class="block-filter-sort"><div class="filter-sort__title">{filters}</div></div>'
+        f'<div class="product-list-filter"><div class="filter-sort__list-product">{cards}</div></div>'
+        '<div class="cps-block-content"><p>' + "Nội dung giới thiệu danh mục. " * 200 + "</p></div>"
+    ))
+
+
+def detail_page(rng, pid):
+    name = product_name(rng)
+    variants = "".join(
+        f'<a href="/product-{pid}-{s}.html" class="item-linked button__link"><strong>{s}</strong>'
+        f'<span>{price(rng)}</span></a>'
+        for s in STORAGE
+    )
+    gallery = '<div class="swiper-slide" id="v2Gallery"><a class="spotlight" href="/video.mp4">video</a></div>' + "".join(
+        f'<div class="swiper-slide"><a class="spotlight" href="/img/{pid}-{i}.jpg"><img src="/img/{pid}-{i}-thumb.jpg"></a></div>'
+        for i in range(12)
+    )
+    ksp = "".join(f"<li>Điểm nổi bật {i}: {product_name(rng)}</li>" for i in range(6))
+    seo = "".join(f"<li>Thông số {i}: {rng.randrange(1000)}</li>" for i in range(20))
+    reviews = "".join(
+        f'<div class="review-item"><p class="name">Khách hàng {i}</p><p class="content">'
+        + "Sản phẩm tốt, giao hàng nhanh. " * 6 + "</p></div>"
+        for i in range(60)
+    )
+    related = "".join(
+        f'<div class="related-item"><a href="/product-{rng.randrange(10**5)}.html">{product_name(rng)}</a>'
+        f'<span>{price(rng)}</span></div>'
+        for _ in range(40)
+    )
+    return chrome(rng, (
+        f'<div class="box-product-name"><h1>{name}</h1><div class="price">'
+        f'<p class="tpt---price">{price(rng)}</p></div></div>'
+        f'<div class="list-linked">{variants}</div>'
+        f'<div class="gallery-top swiper-container"><div class="swiper-wrapper">{gallery}</div></div>'
+        f'<div class="ksp-content"><ul>{ksp}</ul></div>'
+        f'<div class="block-reviews">{reviews}</div><div class="block-related">{related}</div>'
+        f'<div id="cpsContentSEO"><ul>{seo}</ul>' + "<p>" + "Bài viết đánh giá chi tiết. " * 300 + "</p></div>"
+    ))
+
+
+def write(directory=FIXTURE_DIR):
+    rng = random.Random(SEED)
+    os.makedirs(directory, exist_ok=True)
+    pages = {
+        "category_mobile.html": category_page(rng, 160),  # After a few 'Show More' clicks
+        "product_detail.html": detail_page(rng, 1),
+    }
+    paths = []
+    for name, html in pages.items():
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        paths.append(path)
+        print(f"Wrote {path} ({len(html.encode()) / 1024:.0f} KiB)")
+    return paths
+
+
+if __name__ == "__main__":
+    write(sys.argv[1] if len(sys.argv) > 1 else FIXTURE_DIR)
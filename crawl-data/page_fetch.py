@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from html_parse import DETAIL_REGIONS, parse_page, css
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Fetch Settings ---
+HTTP_FIRST = os.getenv("HTTP_FIRST", "1").strip().lower() not in ("0", "false", "no") # Set 0 to always use the browser
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10")) # Keep-alive connections per host
+
+# Fields the crawlers read from a product detail page, as CSS selectors.
+# A plain HTTP response is only used when every required field is in the HTML.
+# All of them lie inside html_parse.DETAIL_REGIONS.
+PRODUCT_FIELDS = {
+    "name": ".box-product-name h1",
+    "description": ".ksp-content ul li, #cpsContentSEO li",
+    "variants": "div.list-linked a.item-linked",
+    "images": ".gallery-top .swiper-slide:not(#v2Gallery) a.spotlight",
+}
+
+
+# Returned by PageFetcher.fetch when the server answers 304 to a conditional request
+NOT_MODIFIED = object()
+
+
+# --- Pooled HTTP Session ---
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(user_agent):
+    """One keep-alive session shared by all workers (connections are reused per host)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers.update({
+                "User-Agent": user_agent,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+            })
+        return _session
+
+
+# --- HTTP First, Browser Fallback ---
+class PageFetcher:
+    """Returns a parsed page for a URL, trying a plain HTTP GET before the browser.
+
+    `required` names entries of PRODUCT_FIELDS that must be present in the HTML.
+    `validators` (If-None-Match / If-Modified-Since headers) make the GET conditional;
+    a 304 returns NOT_MODIFIED without touching the browser.
+    `render(url)` is the Selenium fallback and returns the rendered page source
+    (or None); exceptions it raises (e.g. TimeoutException) propagate to the caller.
+    Pages are parsed with html_parse, restricted to `regions` (None = whole page).
+    Counts how often each path produced the page and which fields were missing.
+    """
+
+    def __init__(self, required, render, user_agent, http_first=HTTP_FIRST, timeout=HTTP_TIMEOUT,
+                 regions=DETAIL_REGIONS):
+        self.selectors = {name: css(PRODUCT_FIELDS[name]) for name in required}
+        self.regions = regions
+        self.render = render
+        self.user_agent = user_agent
+        self.http_first = http_first
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.stats = Counter() # http / browser / failed / not_modified
+        self.response_validators = {} # url -> {"etag", "lastModified"} of the last HTTP response
+        self.missing = Counter() # field (or http status) -> escalations it caused
+
+    def _count(self, path, missing=()):
+        with self._lock:
+            self.stats[path] += 1
+            self.missing.update(missing)
+
+    def missing_fields(self, soup):
+        return [name for name, selector in self.selectors.items() if not selector.select_one(soup)]
+
+    def fetch_http(self, url, validators=None):
+        """Returns (soup, missing); soup is None when the static HTML is not usable"""
+        try:
+            response = get_session(self.user_agent).get(url, timeout=self.timeout, headers=validators)
+        except requests.RequestException as e:
+            return None, [type(e).__name__]
+        if response.status_code == 304:
+            return NOT_MODIFIED, []
+        if response.status_code != 200:
+            return None, [f"http_{response.status_code}"]
+        soup = parse_page(response.content, self.regions)
+        missing = self.missing_fields(soup)
+        if missing:
+            return None, missing
+        # Validators are only kept for complete static pages: a later 304 on a shell
+        # whose fields came from the browser says nothing about the rendered prices
+        if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+            with self._lock:
+                self.response_validators[url] = {
+                    "etag": response.headers.get("ETag"),
+                    "lastModified": response.headers.get("Last-Modified"),
+                }
+        return soup, missing
+
+    def validators_for(self, url):
+        """Validators of the last HTTP response for url (to store with the crawl state)"""
+        with self._lock:
+            return self.response_validators.pop(url, None)
+
+    def fetch(self, url, validators=None):
+        missing = []
+        if self.http_first:
+            soup, missing = self.fetch_http(url, validators)
+            if soup is NOT_MODIFIED:
+                self._count("not_modified")
+                return NOT_MODIFIED
+            if soup is not None:
+                self._count("http")
+                return soup
+            print(f"    Static HTML incomplete ({', '.join(missing)}); rendering in browser...")
+
+        try:
+            html = self.render(url)
+        except Exception:
+            self._count("failed", missing)
+            raise
+        if not html:
+            self._count("failed", missing)
+            return None
+        self._count("browser", missing)
+        return parse_page(html, self.regions)
+
+    def print_summary(self):
+        total = sum(self.stats.values())
+        if not total:
+            return
+        without_browser = self.stats['http'] + self.stats['not_modified']
+        print(f"Page fetches: {self.stats['http']} via HTTP, {self.stats['browser']} via browser, "
+              f"{self.stats['not_modified']} not modified, {self.stats['failed']} failed "
+              f"({without_browser / total:.0%} served without a browser)")
+        if self.missing:
+            print(f"Browser fallbacks caused by: {dict(self.missing.most_common())}")
@@ -0,0 +1,130 @@
+import threading
+import time
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException
+
+POLL_INTERVAL = 0.1
+# Upper bounds (seconds) for the waits that replaced the crawlers' fixed sleeps
+SHOW_MORE_TIMEOUT = 10 # Was time.sleep(3-4) after each 'Show More' click
+SETTLE_TIMEOUT = 5 # Was time.sleep(2-3) before parsing a rendered page
+
+# Installs one MutationObserver per document and returns ms since the last DOM change
+MUTATION_SCRIPT = """
+if (!window.__crawlMutations) {
+    window.__crawlMutations = {last: performance.now()};
+    new MutationObserver(function () { window.__crawlMutations.last = performance.now(); })
+        .observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__crawlMutations.last;
+"""
+
+# Finished resource loads so far and whether the document itself is done
+NETWORK_SCRIPT = "return [performance.getEntriesByType('resource').length, document.readyState];"
+
+
+# --- Wait Accounting ---
+class WaitStats:
+    """Thread-safe time actually spent per named wait, and how often it hit its bound"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waits = {} # name -> {"count", "seconds", "max", "timeouts"}
+
+    def record(self, name, seconds, timed_out):
+        with self._lock:
+            entry = self.waits.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0, "timeouts": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["timeouts"] += int(timed_out)
+
+    def print_summary(self):
+        with self._lock:
+            waits = {name: dict(entry) for name, entry in self.waits.items()}
+        for name, entry in sorted(waits.items()):
+            print(f"Wait '{name}': {entry['count']}x, avg {entry['seconds'] / entry['count']:.2f}s, "
+                  f"max {entry['max']:.2f}s, {entry['timeouts']} hit the bound")
+
+
+wait_stats = WaitStats()
+
+
+def wait_until(driver, name, condition, timeout):
+    """Polls condition(driver) until it is truthy or `timeout` seconds pass.
+       Never raises on timeout: returns False so the caller carries on with what
+       has loaded. The time waited is recorded under `name` in wait_stats."""
+    start = time.monotonic()
+    timed_out = False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        timed_out = True
+    wait_stats.record(name, time.monotonic() - start, timed_out)
+    return not timed_out
+
+
+# --- Conditions ---
+def element_count(driver, selector):
+    return driver.execute_script("return document.querySelectorAll(arguments[0]).length;", selector)
+
+
+def count_increased(selector, previous):
+    """More elements match `selector` than before (e.g. product items after 'Show More')"""
+    return lambda driver: element_count(driver, selector) > previous
+
+
+def button_state(element):
+    """Snapshot used by button_changed: class, disabled flag, text and visibility"""
+    return (element.get_attribute("class"), element.get_attribute("disabled"),
+            element.text, element.is_displayed())
+
+
+def button_changed(element, before):
+    """The button was removed, hidden, disabled or relabelled since `before` was taken"""
+    def condition(driver):
+        try:
+            return button_state(element) != before
+        except StaleElementReferenceException:
+            return True # Replaced or removed from the DOM
+    return condition
+
+
+def any_of(*conditions):
+    return lambda driver: any(condition(driver) for condition in conditions)
+
+
+def dom_settled(quiet=0.5):
+    """No DOM mutation for `quiet` seconds. The first poll installs the observer,
+       so at least `quiet` seconds are waited."""
+    return lambda driver: driver.execute_script(MUTATION_SCRIPT) >= quiet * 1000
+
+
+def network_idle(quiet=0.5):
+    """Document loaded and no new resource finished loading for `quiet` seconds"""
+    state = {"count": -1, "since": 0.0}
+
+    def condition(driver):
+        count, ready = driver.execute_script(NETWORK_SCRIPT)
+        now = time.monotonic()
+        if count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return ready == "complete" and now - state["since"] >= quiet
+    return condition
+
+
+def page_settled(quiet=0.5):
+    """Network idle and DOM quiet: dynamic content has finished rendering"""
+    idle = network_idle(quiet)
+    settled = dom_settled(quiet)
+
+    def condition(driver):
+        try:
+            # Both are polled every time so the mutation observer starts with the wait
+            network_quiet = idle(driver)
+            dom_quiet = settled(driver)
+            return network_quiet and dom_quiet
+        except WebDriverException:
+            return False # Navigation in progress; poll again
+    return condition
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from single_flight import single_flight
+import hashlib
+import logging
+import os
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a successful check is trusted for the same token and user
+ACCESS_CHECK_TTL = int(os.getenv("ACCESS_CHECK_TTL", "60"))
+ACCESS_CHECK_CACHE_SIZE = int(os.getenv("ACCESS_CHECK_CACHE_SIZE", "10000"))
+
+
+class AccessChecker:
+    # Whether a bearer token may read a user's personalised data. The Node API only
+    # returns a user's purchases to that user or an admin, so that call is the check.
+    # Grants are remembered per (token digest, user) for `ttl` seconds and concurrent
+    # first checks share one upstream call, so repeat traffic costs no round trip.
+    def __init__(self, ttl=ACCESS_CHECK_TTL, size=ACCESS_CHECK_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._granted = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, node_api_url, api_key, user_id, jwt_token):
+        # Returns when access is granted; raises requests.HTTPError (401/403 when
+        # refused) or another requests.RequestException when Node cannot answer
+        key = (hashlib.sha256(jwt_token.encode('utf-8')).hexdigest(), str(user_id))
+        now = time.time()
+        with self._lock:
+            expires = self._granted.get(key)
+            if expires is not None and expires > now:
+                self._granted.move_to_end(key)
+                return
+        single_flight.do(("access",) + key, self._fetch, node_api_url, api_key, user_id, jwt_token)
+        with self._lock:
+            self._granted[key] = time.time() + self.ttl
+            self._granted.move_to_end(key)
+            while len(self._granted) > self.size:
+                self._granted.popitem(last=False)
+
+    def _fetch(self, node_api_url, api_key, user_id, jwt_token):
+        response = requests.get(
+            f"{node_api_url}/user/{user_id}/purchased-products",
+            headers={"Authorization": f"Bearer {jwt_token}", "x-api-key": api_key},
+            timeout=5
+        )
+        response.raise_for_status()
+
+
+access_checker = AccessChecker()
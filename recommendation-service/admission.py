@@ -0,0 +1,154 @@
+from collections import Counter, OrderedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Concurrent full hybrid computations; everything else degrades instead of queueing
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+# How long a request may wait for a slot before it is served from a cheaper tier
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.5"))
+ADMISSION_CACHE_SIZE = int(os.getenv("ADMISSION_CACHE_SIZE", "10000"))
+TRENDING_TTL = int(os.getenv("TRENDING_TTL", "300"))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", "100"))
+# Comma-separated product ids served when nothing better is available
+STATIC_RECOMMENDATIONS = [p for p in os.getenv("STATIC_RECOMMENDATIONS", "").split(",") if p]
+
+TIERS = ('full', 'cached', 'trending', 'static')
+
+
+class ResultCache:
+    # Last full result per request key; served (however old) when the service is saturated
+    def __init__(self, size=ADMISSION_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class TrendingList:
+    # Most purchased products in the already-built catalog registry, refreshed on a
+    # TTL. Never triggers a catalog build itself: under load that is the last thing to do.
+    def __init__(self, ttl=TRENDING_TTL, size=TRENDING_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.catalog = None
+        self.indices = None
+        self.built_at = 0
+
+    def get(self, catalog):
+        if catalog is None:
+            return self.catalog, self.indices
+        if self.indices is None or catalog is not self.catalog or time.time() - self.built_at > self.ttl:
+            from catalog import top_k_indices
+            import numpy as np
+            popularity = np.where(catalog.alive, catalog.popularity, -np.inf)
+            self.indices = top_k_indices(popularity, self.size)
+            self.catalog = catalog
+            self.built_at = time.time()
+        return self.catalog, self.indices
+
+
+class AdmissionController:
+    # Bounds concurrent full computations. A request that cannot get a slot within the
+    # queue timeout steps down: cached result for the same key, then the fallback
+    # tiers in order. When every slot is busy and recent waits already exceed the
+    # timeout, requests skip the wait entirely. A full computation that raises steps
+    # down the same way.
+    def __init__(self, max_in_flight=ADMISSION_MAX_IN_FLIGHT, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                 cache_size=ADMISSION_CACHE_SIZE):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.cache = ResultCache(cache_size)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.queue_wait = 0.0
+        self.stats = Counter()
+
+    def _observe_wait(self, seconds):
+        with self._lock:
+            # EWMA of how long requests waited for a slot
+            self.queue_wait = 0.8 * self.queue_wait + 0.2 * seconds
+
+    def _saturated(self):
+        return self.in_flight >= self.max_in_flight and self.queue_wait >= self.queue_timeout
+
+    def run(self, key, compute, fallbacks=()):
+        # fallbacks: (tier, fn) pairs tried in order; fn returns None when unavailable.
+        # Returns (tier, result).
+        start = time.perf_counter()
+        timeout = 0 if self._saturated() else self.queue_timeout
+        admitted = self._slots.acquire(timeout=timeout)
+        self._observe_wait(time.perf_counter() - start if admitted else max(timeout, self.queue_wait))
+
+        if admitted:
+            with self._lock:
+                self.in_flight += 1
+            failed = False
+            try:
+                result = compute()
+            except Exception as e:
+                logger.error("Full computation failed, degrading: %s", e, exc_info=True)
+                failed = True
+                self.stats['failed'] += 1
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._slots.release()
+            if not failed:
+                self.cache.put(key, result)
+                self.stats['full'] += 1
+                return 'full', result
+        else:
+            self.stats['shed'] += 1
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats['cached'] += 1
+            return 'cached', cached
+        for tier, fallback in fallbacks:
+            try:
+                result = fallback()
+            except Exception as e:
+                logger.error("Degraded tier %s failed: %s", tier, e)
+                result = None
+            if result is not None:
+                self.stats[tier] += 1
+                return tier, result
+        self.stats['static'] += 1
+        return 'static', []
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queue_wait_ms': round(self.queue_wait * 1000, 2),
+                'cached_results': len(self.cache),
+                'tiers': {tier: self.stats[tier] for tier in TIERS},
+                'shed': self.stats['shed'],
+                'failed': self.stats['failed']
+            }
+
+
+admission = AdmissionController()
+trending = TrendingList()
@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BootProfile:
+    # Durations of the import / initialisation steps a process goes through before
+    # it is fully warm. Steps may run on the main thread or on the warm-up thread.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.warm = threading.Event()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages.append({
+                    'stage': name,
+                    'thread': threading.current_thread().name,
+                    'startedAt': round(start - self.started, 4),
+                    'seconds': round(elapsed, 4),
+                    **({'error': error} if error else {})
+                })
+            logger.debug("Boot stage %s: %.1f ms", name, elapsed * 1000)
+
+    def import_module(self, name):
+        with self.stage(f"import {name}"):
+            return importlib.import_module(name)
+
+    def mark_warm(self):
+        self.warm.set()
+        logger.info("Warm after %.2fs: %s", time.perf_counter() - self.started, ", ".join(
+            f"{s['stage']}={s['seconds'] * 1000:.0f}ms" for s in self.report()['stages']
+        ))
+
+    def report(self):
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            'uptime': round(time.perf_counter() - self.started, 3),
+            'warm': self.warm.is_set(),
+            'stages': stages
+        }
+
+
+boot = BootProfile()
@@ -0,0 +1,213 @@
+import threading
+
+import numpy as np
+
+COLUMN_DTYPES = {
+    # float64 so base_price served from the registry (mode=ids projections) matches
+    # /products/batch exactly; float32 rounds prices above 2**24
+    'price': np.float64,
+    'category': np.int32,
+    'brand': np.int32,
+    'stock': np.int32,
+    'popularity': np.float32,
+    # False once a product drops out of the catalog; its index is kept (and revived
+    # if it comes back) so indices held by the content index stay valid
+    'alive': np.bool_,
+}
+
+
+def _ref_id(ref):
+    # category / brand arrive either populated ({_id, name}) or as a bare ObjectId
+    if isinstance(ref, dict):
+        return str(ref.get('_id', '')), ref.get('name', '')
+    if ref:
+        return str(ref), ''
+    return '', ''
+
+
+def _stock(product):
+    # BE list endpoints send the variant total as `stock`; variants there are bare ObjectIds
+    stock = product.get('stock')
+    if isinstance(stock, (int, float)):
+        return int(stock)
+    variants = product.get('variants') or []
+    return sum(int(v.get('stock', 0) or 0) for v in variants if isinstance(v, dict))
+
+
+def top_k_indices(scores, k, exclude=None):
+    # Indices of the k highest scores, best first; exclude is an index or array of indices
+    scores = np.asarray(scores)
+    if exclude is not None:
+        scores = scores.copy()
+        scores[exclude] = -np.inf
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int32)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    top = top[np.isfinite(scores[top])]
+    return top.astype(np.int32)
+
+
+class CatalogRegistry:
+    # Interns product ObjectIds to dense int32 indices and keeps only the
+    # attributes ranking needs as NumPy columns, plus the fields used in responses.
+    # `lock` guards every mutation of the registry and of the index built over it.
+    def __init__(self, capacity=64):
+        self.lock = threading.RLock()
+        self.index = {}
+        self.ids = []
+        self.names = []
+        self.images = []
+        self.category_codes = {}
+        self.category_refs = []
+        self.brand_codes = {}
+        self.brand_refs = []
+        self._columns = {
+            name: np.zeros(max(capacity, 1), dtype=dtype)
+            for name, dtype in COLUMN_DTYPES.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, product_id):
+        return self.index_of(product_id) >= 0
+
+    def _ensure_capacity(self, size):
+        capacity = len(self._columns['price'])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self._columns[name] = grown
+
+    def _intern_ref(self, ref, codes, refs):
+        ref_id, ref_name = _ref_id(ref)
+        if not ref_id:
+            return -1
+        code = codes.get(ref_id)
+        if code is None:
+            code = len(refs)
+            codes[ref_id] = code
+            refs.append({'_id': ref_id, 'name': ref_name})
+        elif ref_name and not refs[code]['name']:
+            refs[code]['name'] = ref_name
+        return code
+
+    def add(self, product):
+        product_id = str(product['_id'])
+        with self.lock:
+            idx = self.index.get(product_id)
+            if idx is None:
+                idx = len(self.ids)
+                self._ensure_capacity(idx + 1)
+                self.index[product_id] = idx
+                self.ids.append(product_id)
+                self.names.append('')
+                self.images.append('')
+
+            images = product.get('images') or []
+            self.names[idx] = product.get('name', '')
+            self.images[idx] = images[0] if images else ''
+
+            columns = self._columns
+            columns['price'][idx] = product.get('base_price', 0) or 0
+            columns['category'][idx] = self._intern_ref(
+                product.get('category'), self.category_codes, self.category_refs)
+            columns['brand'][idx] = self._intern_ref(
+                product.get('brand'), self.brand_codes, self.brand_refs)
+            columns['stock'][idx] = _stock(product)
+            columns['popularity'][idx] = product.get('purchasedQuantity', product.get('popularity', 0)) or 0
+            columns['alive'][idx] = True
+        return idx
+
+    def add_many(self, products):
+        with self.lock:
+            return np.array([self.add(p) for p in products], dtype=np.int32)
+
+    def retain(self, indices):
+        # Tombstones every product not in `indices` (the products seen by a full
+        # catalog sync); returns how many were retired
+        with self.lock:
+            keep = np.zeros(len(self.ids), dtype=bool)
+            keep[np.asarray(indices, dtype=np.int64)] = True
+            alive = self.column('alive')
+            retired = int(np.count_nonzero(alive & ~keep))
+            alive &= keep
+        return retired
+
+    def live_indices(self):
+        return np.flatnonzero(self.alive).astype(np.int32)
+
+    def index_of(self, product_id):
+        # -1 for unknown and for retired products
+        idx = self.index.get(str(product_id), -1)
+        return idx if idx >= 0 and self._columns['alive'][idx] else -1
+
+    def indices_of(self, product_ids):
+        index = self.index
+        indices = np.array([index.get(str(pid), -1) for pid in product_ids], dtype=np.int32)
+        if len(indices):
+            indices[~self._columns['alive'][np.maximum(indices, 0)]] = -1
+        return indices
+
+    def ids_of(self, indices):
+        ids = self.ids
+        return [ids[i] for i in indices]
+
+    def column(self, name):
+        return self._columns[name][:len(self.ids)]
+
+    @property
+    def price(self):
+        return self.column('price')
+
+    @property
+    def category(self):
+        return self.column('category')
+
+    @property
+    def brand(self):
+        return self.column('brand')
+
+    @property
+    def stock(self):
+        return self.column('stock')
+
+    @property
+    def popularity(self):
+        return self.column('popularity')
+
+    @property
+    def alive(self):
+        return self.column('alive')
+
+    def category_id(self, idx):
+        code = self._columns['category'][idx]
+        return self.category_refs[code]['_id'] if code >= 0 else None
+
+    def category_code(self, category_id):
+        return self.category_codes.get(str(category_id), -1)
+
+    def brand_code(self, brand_id):
+        return self.brand_codes.get(str(brand_id), -1)
+
+    def record(self, idx):
+        columns = self._columns
+        category = columns['category'][idx]
+        brand = columns['brand'][idx]
+        return {
+            '_id': self.ids[idx],
+            'name': self.names[idx],
+            'base_price': float(columns['price'][idx]),
+            'images': [self.images[idx]] if self.images[idx] else [],
+            'category': dict(self.category_refs[category]) if category >= 0 else None,
+            'brand': dict(self.brand_refs[brand]) if brand >= 0 else None,
+        }
+
+    def records(self, indices):
+        return [self.record(i) for i in indices]
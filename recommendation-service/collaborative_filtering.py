@@ -2,9 +2,31 @@ import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import requests
 import logging
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+CATEGORY_PREFIX = "category_"
+# How long one category's product list (a CF partition) is reused before refetching
+CF_PARTITION_TTL = int(os.getenv("CF_PARTITION_TTL", "300"))
+
+# Category partitions shared by every instance: (API url, category id) -> (fetched_at, products).
+# /productsByCategory is public, so partitions are not tied to the caller's token.
+_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def _category_id(category):
+    # /productsByCategory populates category as {_id, name}
+    if isinstance(category, dict):
+        category = category.get('_id')
+    return str(category) if category else None
+
 class CollaborativeFiltering:
     def __init__(self, node_api_url, api_key, jwt_token):
         self.NODE_API_URL = node_api_url
@@ -15,39 +37,73 @@ class CollaborativeFiltering:
             "x-api-key": api_key
         }
 
-    def fetch_user_item_matrix(self, user_id):
+    def fetch_user_purchases(self, user_id):
+        user_purchases = requests.get(
+            f"{self.NODE_API_URL}/user/{user_id}/purchased-products",
+            headers=self.headers,
+            timeout=10
+        )
+        user_purchases.raise_for_status()
+        return user_purchases.json()
+
+    def fetch_category_products(self, category_ids):
+        # Each category is a partition with its own TTL: only missing or expired ones
+        # are fetched (in one request), so a busy category does not refetch the others
+        now = time.time()
+        products, missing = [], []
+        with _partitions_lock:
+            for category_id in category_ids:
+                entry = _partitions.get((self.NODE_API_URL, category_id))
+                if entry is not None and now - entry[0] <= CF_PARTITION_TTL:
+                    products.extend(entry[1])
+                else:
+                    missing.append(category_id)
+        if not missing:
+            return products
+
+        similar_products = requests.get(
+            f"{self.NODE_API_URL}/productsByCategory",
+            params={'category': ','.join(missing)},
+            headers=self.headers,
+            timeout=10
+        )
+        similar_products.raise_for_status()
+        fetched = {category_id: [] for category_id in missing}
+        for product in similar_products.json():
+            partition = fetched.get(_category_id(product.get('category')))
+            if partition is not None:
+                partition.append({'_id': str(product['_id']), 'category': _category_id(product.get('category'))})
+        with _partitions_lock:
+            for category_id, partition in fetched.items():
+                _partitions[(self.NODE_API_URL, category_id)] = (now, partition)
+        for partition in fetched.values():
+            products.extend(partition)
+        return products
+
+    def fetch_user_item_matrix(self, user_id, categories=None, purchases=None):
+        # purchases: the user's purchase list when the caller already fetched it
         try:
-            user_purchases = requests.get(
-                f"{self.NODE_API_URL}/user/{user_id}/purchased-products",
-                headers=self.headers,
-                timeout=10
-            )
-            user_purchases.raise_for_status()
-            user_data = user_purchases.json()
+            user_data = self.fetch_user_purchases(user_id) if purchases is None else purchases
 
             category_ids = list(set(
                 [str(item['categoryId']) for item in user_data
                 if item.get('categoryId')]
             ))
+            if categories:
+                # Only the requested category partitions are loaded and scored
+                category_ids = [str(c) for c in categories]
 
             if not category_ids:
                 return {}
 
-            similar_products = requests.get(
-                f"{self.NODE_API_URL}/productsByCategory",
-                params={'category': ','.join(category_ids)},
-                headers=self.headers,
-                timeout=10
-            )
-            similar_products.raise_for_status()
-            products_data = similar_products.json()
+            products_data = self.fetch_category_products(category_ids)
 
             matrix_data = {
                 user_id: {str(item['productId']): 1 for item in user_data}
             }
 
             for product in products_data:
-                pseudo_user_id = f"category_{product.get('category')}"
+                pseudo_user_id = f"{CATEGORY_PREFIX}{_category_id(product.get('category'))}"
                 if pseudo_user_id not in matrix_data:
                     matrix_data[pseudo_user_id] = {}
                 matrix_data[pseudo_user_id][str(product['_id'])] = 1
@@ -55,7 +111,7 @@ class CollaborativeFiltering:
             return matrix_data
 
         except Exception as e:
-            logger.error(f"User-item matrix error: {str(e)}")
+            logger.error("User-item matrix error: %s", e)
             return {}
 
     def create_similarity_matrix(self, data):
@@ -77,12 +133,14 @@ class CollaborativeFiltering:
                     
             return cosine_similarity(matrix), user_ids, item_index
         except Exception as e:
-            logger.error(f"Matrix creation error: {str(e)}")
+            logger.error("Matrix creation error: %s", e)
             return None, [], {}
 
-    def recommend(self, user_id, k=5):
+    def recommend(self, user_id, k=5, categories=None, with_categories=False, purchases=None):
+        # (item_id, score) pairs; with_categories adds each item's category id as
+        # listed by /productsByCategory, for items the catalog registry does not hold
         try:
-            data = self.fetch_user_item_matrix(user_id)
+            data = self.fetch_user_item_matrix(user_id, categories, purchases)
             if not data:
                 return []
                 
@@ -105,7 +163,15 @@ class CollaborativeFiltering:
                         recommendations[item_id] = recommendations.get(item_id, 0) + \
                             count * sim_matrix[user_idx, sim_user_idx]
                             
-            return sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:k]
+            ranked = sorted(recommendations.items(), key=lambda x: x[1], reverse=True)[:k]
+            if not with_categories:
+                return ranked
+            item_categories = {
+                item_id: pseudo_user_id[len(CATEGORY_PREFIX):]
+                for pseudo_user_id, items in data.items() if pseudo_user_id.startswith(CATEGORY_PREFIX)
+                for item_id in items
+            }
+            return [(item_id, score, item_categories.get(item_id)) for item_id, score in ranked]
         except Exception as e:
-            logger.error(f"Collaborative filtering error: {str(e)}")
+            logger.error("Collaborative filtering error: %s", e)
             return []
\ No newline at end of file
@@ -1,13 +1,50 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
+from catalog import CatalogRegistry, top_k_indices
+from sharded_index import ShardedContentIndex
+from single_flight import single_flight
+from user_profiles import profile_store
+from json_stream import iter_response_items
 import requests
 import logging
+import os
+import threading
+import time
 import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+MODEL_TTL = int(os.getenv("CONTENT_MODEL_TTL", "300"))
+# "tfidf" refits a vocabulary on every build; "hashing" supports incremental updates
+CONTENT_MODEL = os.getenv("CONTENT_MODEL", "tfidf")
+HASHING_FEATURES = int(os.getenv("HASHING_FEATURES", str(2 ** 18)))
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+# Products requested per /products page; 0 fetches the catalog in one streamed response
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "500"))
+
+# Built similarity models shared by every recommender instance, keyed by (API url, mode)
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+
+def cached_model(node_api_url, mode=None):
+    # Already-built model or None; never triggers a build
+    with _model_cache_lock:
+        return _model_cache.get((node_api_url, mode or CONTENT_MODEL))
+
+
+def clear_model_cache():
+    with _model_cache_lock:
+        _model_cache.clear()
+
+
+def product_text(product):
+    return f"{product.get('name', '')} {product.get('description', '')} {(product.get('category') or {}).get('name', '')}"
+
+
 class ContentBasedRecommender:
-    def __init__(self, node_api_url, api_key, jwt_token):
+    def __init__(self, node_api_url, api_key, jwt_token, mode=None, profiles=None):
         self.NODE_API_URL = node_api_url
         self.API_KEY = api_key
         self.JWT_TOKEN = jwt_token
@@ -15,67 +52,187 @@ class ContentBasedRecommender:
             "Authorization": f"Bearer {jwt_token}",
             "x-api-key": api_key
         }
-        self.tfidf = TfidfVectorizer(stop_words='english')
-        self.cosine_sim = None
-        self.products = []
-        self.product_ids = []
+        self.mode = mode or CONTENT_MODEL
+        self.profiles = profiles or profile_store
+        self.index = None
+        self.catalog = None
 
-    def fetch_products(self):
-        try:
-            response = requests.get(
+    def iter_products(self):
+        # Streams the catalog page by page and parses each response incrementally, so
+        # only about one page of raw product dicts is alive at a time
+        page, first_id = 1, None
+        while True:
+            params = {'sort': '_id:asc', 'page': page, 'limit': CATALOG_PAGE_SIZE} if CATALOG_PAGE_SIZE else None
+            count = 0
+            with requests.get(
                 f"{self.NODE_API_URL}/products",
                 headers=self.headers,
+                params=params,
+                stream=True,
                 timeout=5
-            )
-            response.raise_for_status()
-            self.products = response.json()
-            self.product_ids = [str(p['_id']) for p in self.products]
-            return self.products
+            ) as response:
+                response.raise_for_status()
+                for product in iter_response_items(response):
+                    if count == 0:
+                        # A server that ignores paging sends the same first product again
+                        if product.get('_id') == first_id:
+                            return
+                        first_id = product.get('_id')
+                    count += 1
+                    yield product
+            if not CATALOG_PAGE_SIZE or count != CATALOG_PAGE_SIZE:
+                return
+            page += 1
+
+    def fetch_products(self):
+        try:
+            return list(self.iter_products())
         except Exception as e:
-            logger.error(f"Product fetch error: {str(e)}")
+            logger.error("Product fetch error: %s", e)
             return []
 
-    def prepare_similarity_matrix(self):
-        try:
-            products = self.fetch_products()
-            if not products:
+    def prepare_similarity_matrix(self, force=False):
+        key = (self.NODE_API_URL, self.mode)
+        with _model_cache_lock:
+            model = _model_cache.get(key)
+        if force or model is None or time.time() - model['built_at'] > MODEL_TTL:
+            try:
+                # Expired or missing: concurrent callers share a single rebuild
+                model = single_flight.do(("content-model",) + key, self._build_model)
+            except Exception as e:
+                logger.error("Similarity matrix error: %s", e)
+                model = None
+            if model is None:
                 return None
-                
-            descriptions = [
-                f"{p.get('name', '')} {p.get('description', '')} {p.get('category', {}).get('name', '')}"
-                for p in products
-            ]
-            
-            tfidf_matrix = self.tfidf.fit_transform(descriptions)
-            self.cosine_sim = linear_kernel(tfidf_matrix, tfidf_matrix)
-            return self.cosine_sim
+
+        self.catalog = model['catalog']
+        self.index = model['index']
+        return model
+
+    def _build_model(self):
+        # The registry and index are reused across refreshes so catalog indices stay
+        # stable and only shards whose products changed get rebuilt
+        with _model_cache_lock:
+            model = _model_cache.get((self.NODE_API_URL, self.mode))
+        if model is None:
+            model = {
+                'catalog': CatalogRegistry(capacity=CATALOG_PAGE_SIZE or INGEST_CHUNK_SIZE),
+                'index': ShardedContentIndex(self.mode, HASHING_FEATURES),
+            }
+
+        # Products are consumed as they stream in: each chunk fills the registry and the
+        # corpus and is then dropped, so raw dicts never accumulate for the whole catalog
+        catalog = model['catalog']
+        indices, descriptions, seen = [], [], set()
+        chunk = []
+        try:
+            for product in self.iter_products():
+                product_id = str(product.get('_id', ''))
+                if not product_id or product_id in seen:
+                    continue
+                seen.add(product_id)
+                chunk.append(product)
+                if len(chunk) >= INGEST_CHUNK_SIZE:
+                    indices.extend(catalog.add_many(chunk).tolist())
+                    descriptions.extend(product_text(p) for p in chunk)
+                    chunk = []
         except Exception as e:
-            logger.error(f"Similarity matrix error: {str(e)}")
+            logger.error("Product fetch error: %s", e)
+            return None
+        if chunk:
+            indices.extend(catalog.add_many(chunk).tolist())
+            descriptions.extend(product_text(p) for p in chunk)
+        del chunk
+        if not indices:
             return None
 
-    def recommend(self, product_id, k=5):
+        # Products that were not streamed this time were deleted or delisted
+        retired = catalog.retain(indices)
+        if retired:
+            logger.info("Retired %d product(s) no longer in the catalog", retired)
+        model['index'].sync(catalog, indices, descriptions)
+        model['built_at'] = time.time()
+        with _model_cache_lock:
+            _model_cache[(self.NODE_API_URL, self.mode)] = model
+        return model
+
+    def add_products(self, products):
+        # Insert new or edited products without a full rebuild (hashing mode).
+        # The TF-IDF mode has to refit vocabularies, so it re-syncs from the API;
+        # only the shards containing changed products are rebuilt.
+        if self.mode != 'hashing':
+            return len(products) if self.prepare_similarity_matrix(force=True) is not None else 0
+        if self.prepare_similarity_matrix() is None:
+            return 0
+
+        changed = 0
+        for start in range(0, len(products), INGEST_CHUNK_SIZE):
+            chunk = products[start:start + INGEST_CHUNK_SIZE]
+            # One registry lock across add + upsert, so a concurrent rebuild's sync
+            # never sees rows that are not in the index yet
+            with self.catalog.lock:
+                indices = self.catalog.add_many(chunk)
+                changed += self.index.upsert(self.catalog, indices, [product_text(p) for p in chunk])
+        return changed
+
+    def recommend_for_user(self, user_id, history, k=5, categories=None):
+        # history: purchased product ids, oldest first. Each shard the user bought from
+        # keeps a profile in that shard's feature space; one sparse mat-vec per shard
+        # replaces a similarity lookup per purchased item.
         try:
-            if self.cosine_sim is None:
-                if not self.prepare_similarity_matrix():
+            if self.catalog is None:
+                if self.prepare_similarity_matrix() is None:
                     return []
-            
-            product_id = str(product_id)
-            try:
-                idx = self.product_ids.index(product_id)
-            except ValueError:
-                logger.warning(f"Product {product_id} not found")
+
+            owned = self.catalog.indices_of(history)
+            owned = owned[owned >= 0]
+            keys = {self.index.shard_of.get(int(idx)) for idx in owned} - {None}
+            if categories:
+                keys &= set(self.index.shard_keys(categories))
+            if not keys:
                 return []
-            
-            sim_scores = list(enumerate(self.cosine_sim[idx]))
-            sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-            sim_scores = [s for s in sim_scores if s[0] != idx][:k]
-            
-            # Get product indices and return product data
-            product_indices = [i[0] for i in sim_scores]
-            recommended_products = [self.products[i] for i in product_indices]
-            
-            return recommended_products
+
+            def score_shard(shard):
+                vectorize = lambda pid: shard.profile_vector(self.catalog.index_of(pid))
+                profile = self.profiles.profile(
+                    f"{user_id}:{shard.key}", history, vectorize, shard.feature_space()
+                )
+                return shard.scores(shard.profile_query(profile)) if profile is not None else None
+
+            members, scores = [], []
+            for shard, shard_scores in self.index.map_shards(score_shard, keys):
+                if shard_scores is not None:
+                    members.append(shard.members)
+                    scores.append(shard_scores)
+            if not members:
+                return []
+
+            members = np.concatenate(members)
+            scores = np.concatenate(scores)
+            top = top_k_indices(scores, k, exclude=np.flatnonzero(np.isin(members, owned)))
+            return self.catalog.records(members[top]) if len(top) else []
 
         except Exception as e:
-            logger.error(f"Content-based error: {str(e)}")
-            return []
\ No newline at end of file
+            logger.error("Content-based profile error: %s", e)
+            return []
+
+    def recommend_indices(self, product_id, k=5):
+        if self.catalog is None:
+            if self.prepare_similarity_matrix() is None:
+                return np.empty(0, dtype=np.int32)
+
+        idx = self.catalog.index_of(product_id)
+        if idx < 0:
+            logger.warning("Product %s not found", product_id)
+            return np.empty(0, dtype=np.int32)
+
+        return self.index.similar(idx, k)
+
+    def recommend(self, product_id, k=5):
+        try:
+            indices = self.recommend_indices(product_id, k)
+            return self.catalog.records(indices) if len(indices) else []
+
+        except Exception as e:
+            logger.error("Content-based error: %s", e)
+            return []
@@ -0,0 +1,269 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from recommendation_engine import HybridRecommender
+from user_profiles import UserProfileStore
+from writeback import MONGO_URI, DB_NAME
+import numpy as np
+from logger import setup_logging
+import argparse
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Admin token: the hybrid engine reads the live catalog through the Node API
+EVAL_JWT = os.getenv("PRECOMPUTE_JWT")
+
+
+def load_invoices(db):
+    # (createdAt, userId, [productId, ...]) for every non-failed order, oldest first
+    cursor = db.invoices.find(
+        {"paymentStatus": {"$nin": ["failed", "cancelled"]}},
+        {"user": 1, "items.product": 1, "createdAt": 1}
+    ).sort("createdAt", 1)
+    return [
+        (invoice["createdAt"], str(invoice["user"]), [str(item["product"]) for item in invoice.get("items", [])])
+        for invoice in cursor if invoice.get("createdAt") is not None
+    ]
+
+
+def time_split(invoices, test_fraction):
+    # Everything before the cutoff is history; what each user bought afterwards (and
+    # had not bought before) is the ground truth. Only users with both are evaluated.
+    cutoff = invoices[min(int(len(invoices) * (1 - test_fraction)), len(invoices) - 1)][0]
+    train, test = {}, {}
+    for created_at, user_id, products in invoices:
+        if created_at < cutoff:
+            train.setdefault(user_id, []).extend(products)
+        else:
+            test.setdefault(user_id, set()).update(products)
+    test = {
+        user_id: items - set(train[user_id])
+        for user_id, items in test.items() if user_id in train
+    }
+    return train, {user_id: items for user_id, items in test.items() if items}, cutoff
+
+
+def load_known_products(db, cutoff, train):
+    # Products that existed before the cutoff: created earlier (documents from before
+    # timestamps were added have no createdAt) or sold in the training split. Only
+    # these may be recommended, and they are the coverage denominator.
+    cursor = db.products.find(
+        {"$or": [{"createdAt": {"$lt": cutoff}}, {"createdAt": {"$exists": False}}]},
+        {"_id": 1}
+    )
+    known = {str(product["_id"]) for product in cursor}
+    known.update(pid for history in train.values() for pid in history)
+    return known
+
+
+class Engine(ABC):
+    # fit(train, known) builds whatever the engine needs from the training split and
+    # the products known before the cutoff; recommend(user_id, k) returns ranked
+    # product ids. recommend_batch can be overridden with a vectorised version.
+    name = None
+    workers = 8
+
+    def fit(self, train, known):
+        self.train = train
+        self.known = known
+
+    @abstractmethod
+    def recommend(self, user_id, k):
+        pass
+
+    def recommend_batch(self, user_ids, k):
+        def timed(user_id):
+            start = time.perf_counter()
+            recs = self.recommend(user_id, k)
+            return recs, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(timed, user_ids))
+        return [recs for recs, _ in results], [elapsed for _, elapsed in results]
+
+
+class PopularityEngine(Engine):
+    name = "popularity"
+
+    def fit(self, train, known):
+        super().fit(train, known)
+        counts = Counter(pid for history in train.values() for pid in history)
+        self.ranked = np.array([pid for pid, _ in counts.most_common()], dtype=object)
+
+    def recommend(self, user_id, k):
+        return self.recommend_batch([user_id], k)[0][0]
+
+    def recommend_batch(self, user_ids, k):
+        start = time.perf_counter()
+        # One slice covers every user: nobody owns more than their history length
+        depth = k + max((len(self.train.get(u, ())) for u in user_ids), default=0)
+        head = self.ranked[:depth].tolist()
+        recs = []
+        for user_id in user_ids:
+            owned = set(self.train.get(user_id, ()))
+            recs.append([pid for pid in head if pid not in owned][:k])
+        elapsed = (time.perf_counter() - start) / max(len(user_ids), 1)
+        return recs, [elapsed] * len(user_ids)
+
+
+class HybridEngine(Engine):
+    name = "hybrid"
+
+    def fit(self, train, known):
+        from content_based import clear_model_cache
+
+        super().fit(train, known)
+        # Cold build, so build time is comparable between engines
+        clear_model_cache()
+        recommender = HybridRecommender(EVAL_JWT)
+        # Profiles are built from the training split only and kept out of the live store
+        recommender.cb.profiles = UserProfileStore(path=None)
+        # The content model only indexes products known before the cutoff, so products
+        # added later are never candidates
+        live_products = recommender.cb.iter_products
+        recommender.cb.iter_products = lambda: (p for p in live_products() if str(p.get('_id')) in known)
+        if recommender.cb.prepare_similarity_matrix() is None:
+            raise RuntimeError("Content model could not be built")
+        catalog = recommender.cb.catalog
+
+        def replay_purchases(user_id):
+            # Same shape as /user/<id>/purchased-products (newest first), from the training split
+            return [
+                {"productId": pid, "categoryId": catalog.category_id(catalog.index_of(pid))}
+                for pid in reversed(train.get(user_id, [])) if pid in catalog
+            ]
+
+        # CF neighbours are the training split's buyers of each category, not the live
+        # /productsByCategory listing, so products first sold after the cutoff stay unseen
+        sold_before_cutoff = {}
+        for history in train.values():
+            for pid in history:
+                if pid in catalog:
+                    sold_before_cutoff.setdefault(pid, str(catalog.category_id(catalog.index_of(pid))))
+
+        def replay_category_products(category_ids):
+            wanted = {str(c) for c in category_ids}
+            return [
+                {"_id": pid, "category": category_id}
+                for pid, category_id in sold_before_cutoff.items() if category_id in wanted
+            ]
+
+        recommender.get_purchased_products = replay_purchases
+        recommender.cf.fetch_user_purchases = replay_purchases
+        recommender.cf.fetch_category_products = replay_category_products
+        self.recommender = recommender
+        self.catalog = catalog
+
+    def recommend(self, user_id, k):
+        return [pid for pid, _ in self.recommender.rank(user_id, k)]
+
+
+class ContentEngine(HybridEngine):
+    name = "content"
+
+    def recommend(self, user_id, k):
+        history = [pid for pid in self.train.get(user_id, []) if pid in self.catalog]
+        return [p["_id"] for p in self.recommender.cb.recommend_for_user(user_id, history, k)]
+
+
+ENGINES = {engine.name: engine for engine in (HybridEngine, ContentEngine, PopularityEngine)}
+
+
+def run_queries(engine, users, k, batch_size):
+    recommendations, latencies = [], []
+    for offset in range(0, len(users), batch_size):
+        recs, elapsed = engine.recommend_batch(users[offset:offset + batch_size], k)
+        recommendations.extend(recs)
+        latencies.extend(elapsed)
+    return recommendations, latencies
+
+
+def evaluate(engine_class, train, test, k_values, known, batch_size):
+    users = sorted(test)
+    k_max = max(k_values)
+    catalog_size = len(known)
+
+    # Timed pass runs without tracemalloc, which slows every allocation
+    engine = engine_class()
+    start = time.perf_counter()
+    engine.fit(train, known)
+    build_seconds = time.perf_counter() - start
+    query_start = time.perf_counter()
+    recommendations, latencies = run_queries(engine, users, k_max, batch_size)
+    query_seconds = time.perf_counter() - query_start
+
+    # Separate pass on a fresh engine for peak memory of build + queries
+    del engine
+    tracemalloc.start()
+    engine = engine_class()
+    engine.fit(train, known)
+    run_queries(engine, users, k_max, batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    report = {
+        "engine": engine.name,
+        "users": len(users),
+        "build_s": round(build_seconds, 3),
+        "query_s": round(query_seconds, 3),
+        "latency_ms_mean": round(float(latencies.mean()), 3) if len(latencies) else None,
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3) if len(latencies) else None,
+        "peak_mem_mb": round(peak / 2 ** 20, 2),
+    }
+    for k in k_values:
+        hits = np.array([len(set(recs[:k]) & test[user]) for user, recs in zip(users, recommendations)])
+        truth = np.array([len(test[user]) for user in users])
+        shown = {pid for recs in recommendations for pid in recs[:k]}
+        report[f"precision@{k}"] = round(float((hits / k).mean()), 4) if len(users) else 0.0
+        report[f"recall@{k}"] = round(float((hits / truth).mean()), 4) if len(users) else 0.0
+        report[f"coverage@{k}"] = round(len(shown) / catalog_size, 4) if catalog_size else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-split replay of historical invoices")
+    parser.add_argument("--engines", default="hybrid,content,popularity",
+                        help=f"comma-separated, from: {', '.join(ENGINES)}")
+    parser.add_argument("--k", default="5,10", help="comma-separated cut-offs")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-users", type=int, default=0)
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    db = MongoClient(MONGO_URI)[DB_NAME]
+    invoices = load_invoices(db)
+    if not invoices:
+        logger.error("No invoices to replay")
+        return 1
+    train, test, cutoff = time_split(invoices, args.test_fraction)
+    if args.max_users:
+        test = dict(sorted(test.items())[:args.max_users])
+    known = load_known_products(db, cutoff, train)
+    logger.info("Cutoff %s: %d users with history, %d test users, %d products known",
+                cutoff, len(train), len(test), len(known))
+
+    k_values = [int(k) for k in args.k.split(",") if k]
+    reports = []
+    for name in args.engines.split(","):
+        report = evaluate(ENGINES[name], train, test, k_values, known, args.batch_size)
+        reports.append(report)
+        print(json.dumps(report))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == '__main__':
+    setup_logging()
+    raise SystemExit(main())
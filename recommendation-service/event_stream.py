@@ -0,0 +1,183 @@
+from collections import Counter, OrderedDict, deque
+import heapq
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EVENT_WINDOW_SECONDS = int(os.getenv("EVENT_WINDOW_SECONDS", "1800"))
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "100000"))
+MAX_TRACKED_SESSIONS = int(os.getenv("MAX_TRACKED_SESSIONS", "50000"))
+MAX_TRACKED_PRODUCTS = int(os.getenv("MAX_TRACKED_PRODUCTS", "20000"))
+SESSION_ITEMS = int(os.getenv("SESSION_ITEMS", "20"))
+
+EVENT_TYPES = ('view', 'cart')
+# Weight of each co-occurrence kind when ranking session recommendations
+EVENT_WEIGHTS = {'view': 1.0, 'cart': 2.0}
+
+
+class SessionEventStream:
+    # Sliding-window co-view / co-cart counts fed by streamed storefront events.
+    # Events live in a bounded ring buffer; each one remembers the pairs it added,
+    # so when it leaves the window (by age or by buffer overflow) its counts are
+    # taken back out. Memory is capped by buffer size, session and product limits.
+    # Events are placed at their own `timestamp` (epoch ms, as the BE sends it),
+    # clamped so the buffer stays in time order and nothing lands in the future.
+    def __init__(self, window=EVENT_WINDOW_SECONDS, buffer_size=EVENT_BUFFER_SIZE,
+                 max_sessions=MAX_TRACKED_SESSIONS, max_products=MAX_TRACKED_PRODUCTS,
+                 session_items=SESSION_ITEMS):
+        self.window = window
+        self.buffer_size = buffer_size
+        self.max_sessions = max_sessions
+        self.max_products = max_products
+        self.session_items = session_items
+        self._lock = threading.Lock()
+        self._events = deque()
+        self._sessions = OrderedDict()
+        self._co = {kind: {} for kind in EVENT_TYPES}
+        self.stats = Counter()
+
+    def ingest(self, events, now=None):
+        now = time.time() if now is None else now
+        accepted = 0
+        with self._lock:
+            self._expire(now)
+            for event in events:
+                if not isinstance(event, dict):
+                    self.stats['rejected'] += 1
+                    continue
+                kind = event.get('type', 'view')
+                session_id = event.get('sessionId') or event.get('userId')
+                product_id = event.get('productId')
+                if kind not in self._co or not session_id or not product_id:
+                    self.stats['rejected'] += 1
+                    continue
+                ts = self._event_time(event, now)
+                if ts < now - self.window:
+                    self.stats['stale'] += 1
+                    continue
+                if self._events:
+                    ts = max(ts, self._events[-1][0])
+                self._add(ts, kind, str(session_id), str(product_id))
+                accepted += 1
+        self.stats['accepted'] += accepted
+        return accepted
+
+    def _event_time(self, event, now):
+        ts = event.get('timestamp')
+        if not isinstance(ts, (int, float)) or isinstance(ts, bool):
+            return now
+        return min(ts / 1000.0, now)
+
+    def _add(self, now, kind, session_id, product_id):
+        if len(self._events) >= self.buffer_size:
+            self._retire(self._events.popleft())
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats['sessions_evicted'] += 1
+            session = deque(maxlen=self.session_items)
+            self._sessions[session_id] = session
+        else:
+            self._sessions.move_to_end(session_id)
+
+        cutoff = now - self.window
+        partners = tuple({
+            pid for ts, pid, k in session
+            if k == kind and pid != product_id and ts >= cutoff
+        })
+        partners = self._admit(self._co[kind], product_id, partners)
+        co = self._co[kind]
+        for partner in partners:
+            self._bump(co, product_id, partner, 1)
+            self._bump(co, partner, product_id, 1)
+
+        session.append((now, product_id, kind))
+        self._events.append((now, kind, product_id, partners))
+
+    def _admit(self, co, product_id, partners):
+        # Every pair adds both products as keys, so the max_products cap has to cover
+        # the partners too: already tracked ones are always kept, new ones only while
+        # there is room
+        room = self.max_products - len(co)
+        admitted = []
+        if product_id not in co:
+            room -= 1
+        if room >= 0:
+            for partner in partners:
+                if partner in co:
+                    admitted.append(partner)
+                elif room > 0:
+                    admitted.append(partner)
+                    room -= 1
+        if len(admitted) < len(partners):
+            self.stats['pairs_capped'] += len(partners) - len(admitted)
+        return tuple(admitted)
+
+    def _bump(self, co, a, b, delta):
+        counts = co.get(a)
+        if counts is None:
+            counts = co[a] = Counter()
+        counts[b] += delta
+        if counts[b] <= 0:
+            del counts[b]
+            if not counts:
+                del co[a]
+
+    def _retire(self, event):
+        _, kind, product_id, partners = event
+        co = self._co[kind]
+        for partner in partners:
+            self._bump(co, product_id, partner, -1)
+            self._bump(co, partner, product_id, -1)
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        events = self._events
+        while events and events[0][0] < cutoff:
+            self._retire(events.popleft())
+
+    def also(self, product_id, kind='view', k=10, now=None):
+        # "Customers viewing (or carting) this also viewed (carted)"
+        with self._lock:
+            self._expire(time.time() if now is None else now)
+            counts = self._co.get(kind, {}).get(str(product_id))
+            if not counts:
+                return []
+            return heapq.nlargest(k, counts.items(), key=lambda x: x[1])
+
+    def session_recommendations(self, session_id, k=10, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(str(session_id))
+            if not session:
+                return []
+            seen = {pid for ts, pid, _ in session}
+            scores = Counter()
+            # Later interactions in the session count more than earlier ones
+            for age, (ts, pid, kind) in enumerate(reversed(session)):
+                if ts < now - self.window:
+                    continue
+                weight = EVENT_WEIGHTS[kind] / (1 + age)
+                for other in EVENT_TYPES:
+                    for partner, count in self._co[other].get(pid, {}).items():
+                        if partner not in seen:
+                            scores[partner] += weight * EVENT_WEIGHTS[other] * count
+            return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'events': len(self._events),
+                'sessions': len(self._sessions),
+                'products': {kind: len(co) for kind, co in self._co.items()},
+                **self.stats
+            }
+
+
+event_stream = SessionEventStream()
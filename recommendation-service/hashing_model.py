@@ -0,0 +1,171 @@
+from sklearn.feature_extraction.text import HashingVectorizer
+import scipy.sparse as sp
+import numpy as np
+import threading
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HashingContentModel:
+    # Stateless feature hashing plus stored document frequencies: products can be
+    # vectorised and (re)inserted on their own, without refitting a vocabulary.
+    # Rows hold raw term counts; idf weighting and cosine normalisation are applied
+    # at query time, so similarities always reflect the current document frequencies.
+    def __init__(self, n_features=2 ** 18, max_blocks=16):
+        self.n_features = n_features
+        self.max_blocks = max_blocks
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            norm=None
+        )
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_docs = 0
+        self._lock = threading.RLock()
+        self._blocks = []
+        self._owners = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._row_of = {}
+        self._text_hash = {}
+        self._weights = None
+
+    def __len__(self):
+        return self.n_docs
+
+    def upsert(self, indices, texts):
+        # indices are catalog indices; unchanged texts are skipped. Returns the
+        # catalog indices that were (re)vectorised.
+        with self._lock:
+            pending = {}
+            for idx, text in zip(indices, texts):
+                idx = int(idx)
+                text_hash = zlib.crc32(text.encode('utf-8'))
+                if self._text_hash.get(idx) != text_hash:
+                    pending[idx] = (text, text_hash)
+            if not pending:
+                return []
+
+            for idx in pending:
+                self._remove_row(idx)
+
+            changed = list(pending)
+            block = self.vectorizer.transform([pending[i][0] for i in changed]).tocsr()
+            block.sum_duplicates()
+            self.df += np.diff(block.tocsc().indptr).astype(np.int32)
+            self.n_docs += len(changed)
+
+            start = len(self._owners)
+            self._blocks.append(block)
+            self._owners = np.concatenate([self._owners, np.array(changed, dtype=np.int32)])
+            self._alive = np.concatenate([self._alive, np.ones(len(changed), dtype=bool)])
+            for offset, idx in enumerate(changed):
+                self._row_of[idx] = start + offset
+                self._text_hash[idx] = pending[idx][1]
+
+            self._weights = None
+            if len(self._blocks) > self.max_blocks:
+                self._compact()
+            return changed
+
+    def fit_chunks(self, chunks):
+        # chunks yields (catalog_indices, texts) pairs, e.g. one per fetched page
+        changed = 0
+        for indices, texts in chunks:
+            changed += len(self.upsert(indices, texts))
+        return changed
+
+    def remove(self, idx):
+        with self._lock:
+            if self._remove_row(int(idx)):
+                self._text_hash.pop(int(idx), None)
+                self._weights = None
+
+    def _remove_row(self, idx):
+        row = self._row_of.pop(idx, None)
+        if row is None:
+            return False
+        old = self._row(row)
+        self.df[old.indices] -= 1
+        self.n_docs -= 1
+        self._alive[row] = False
+        return True
+
+    def _row(self, row):
+        for block in self._blocks:
+            if row < block.shape[0]:
+                return block[row]
+            row -= block.shape[0]
+        raise IndexError(row)
+
+    def _compact(self):
+        alive = self._alive
+        matrix = sp.vstack(self._blocks, format='csr')[alive]
+        self._blocks = [matrix]
+        self._owners = self._owners[alive]
+        self._alive = np.ones(len(self._owners), dtype=bool)
+        self._row_of = {int(idx): row for row, idx in enumerate(self._owners)}
+        logger.debug("Compacted hashing index to %d rows", len(self._owners))
+
+    def _idf_and_norms(self):
+        if self._weights is None:
+            # Same smoothing as TfidfVectorizer(smooth_idf=True)
+            idf = np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0
+            idf_sq = idf ** 2
+            norms = np.concatenate([
+                np.sqrt(block.multiply(block) @ idf_sq) for block in self._blocks
+            ]) if self._blocks else np.empty(0)
+            norms[norms == 0] = 1.0
+            self._weights = (idf, norms)
+        return self._weights
+
+    def vector(self, idx):
+        # l2-normalised tf-idf vector (1 x n_features) of one catalog item, or None
+        with self._lock:
+            row = self._row_of.get(int(idx))
+            if row is None:
+                return None
+            idf, norms = self._idf_and_norms()
+            return self._row(row).multiply(idf).tocsr() / norms[row]
+
+    def tf_vector(self, idx):
+        # l2-normalised raw term counts of one item (no idf). Sums of these, e.g. user
+        # profiles, stay valid as document frequencies change; weight() applies the
+        # current idf when they are queried.
+        with self._lock:
+            row = self._row_of.get(int(idx))
+            if row is None:
+                return None
+            vector = self._row(row).astype(np.float64)
+            norm = np.sqrt(vector.multiply(vector).sum())
+            return (vector / norm).tocsr() if norm else vector.tocsr()
+
+    def weight(self, vector):
+        # A tf vector (see tf_vector) as a tf-idf query under the current df
+        with self._lock:
+            idf, _ = self._idf_and_norms()
+            return vector.multiply(idf).tocsr()
+
+    def scores(self, query, size):
+        # Cosine similarity of a tf-idf query vector against every live row,
+        # scattered into a dense array indexed by catalog index (-inf where absent).
+        with self._lock:
+            out = np.full(size, -np.inf, dtype=np.float32)
+            if not self._blocks:
+                return out
+            idf, norms = self._idf_and_norms()
+            weighted = sp.csc_matrix(query.multiply(idf)).T
+            sims = np.concatenate([
+                (block @ weighted).toarray().ravel() for block in self._blocks
+            ]) / norms
+            alive = self._alive & (self._owners < size)
+            out[self._owners[alive]] = sims[alive]
+            return out
+
+    def similarities(self, idx, size):
+        query = self.vector(idx)
+        if query is None:
+            return np.zeros(size, dtype=np.float32)
+        return self.scores(query, size)
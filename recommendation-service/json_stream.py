@@ -0,0 +1,54 @@
+import codecs
+import json
+import logging
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(chunks):
+    # Yields the elements of a top-level JSON array of objects from an iterable of
+    # byte chunks, holding at most one partial element plus one chunk in memory
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    buffer = ''
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ',')):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                break
+            pos = end
+            yield item
+    raise ValueError("Truncated JSON array")
+
+
+def iter_response_items(response, chunk_size=64 * 1024):
+    # Elements of a streamed (stream=True) JSON array response
+    if ijson is not None:
+        response.raw.decode_content = True
+        return ijson.items(response.raw, 'item', use_float=True)
+    return iter_json_array(response.iter_content(chunk_size=chunk_size))
@@ -1,9 +1,136 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# setup_logging() runs before any other module loads .env
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# text | json
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-logger sampling of records below WARNING, e.g. "recommendation_engine=0.1,werkzeug=0.05"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    # Like the stdlib QueueHandler, the message is merged and the traceback rendered
+    # before enqueueing, so no live args or frames cross to the listener thread;
+    # formatting into text/JSON happens on the listener. A full queue drops the
+    # record instead of blocking the caller.
+    dropped = 0
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    # The stop sentinel waits for room instead of failing on a full queue, so
+    # everything queued before shutdown is still written
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps a fraction of DEBUG/INFO records per logger (prefix match on the logger
+    # name); warnings and errors always pass
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while True:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate >= 1 or random.random() < rate
+            if '.' not in name:
+                return True
+            name = name.rsplit('.', 1)[0]
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_sampling(spec):
+    rates = {}
+    for part in spec.split(','):
+        if '=' in part:
+            name, rate = part.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sampling=LOG_SAMPLING, queue_size=LOG_QUEUE_SIZE):
+    # Root logger writes into a bounded queue; a QueueListener thread owns the real
+    # (blocking) stream handler. Safe to call more than once.
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = DrainingQueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 def get_logger(name):
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
@@ -0,0 +1,205 @@
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Set to a frame depth (e.g. 1 or 10) to trace allocations from startup
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "0"))
+
+
+def array_bytes(obj):
+    # NumPy arrays and SciPy sparse matrices; 0 for anything else
+    if obj is None:
+        return 0
+    if hasattr(obj, 'nbytes'):
+        return int(obj.nbytes)
+    if all(hasattr(obj, attr) for attr in ('data', 'indices', 'indptr')):
+        return int(obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes)
+    return 0
+
+
+def container_bytes(container, sample=200):
+    # Shallow size plus the sizes of the elements (dict keys and values), extrapolated
+    # from the first `sample` elements; good enough to rank components, not exact
+    total = sys.getsizeof(container)
+    n = len(container)
+    if not n:
+        return total
+    items = container.items() if isinstance(container, dict) else container
+    measured = 0
+    count = 0
+    for item in items:
+        if isinstance(item, tuple):
+            measured += sum(sys.getsizeof(part) for part in item)
+        else:
+            measured += sys.getsizeof(item)
+        count += 1
+        if count >= sample:
+            break
+    return total + int(measured / count * n)
+
+
+def nested_bytes(mapping, sample=200):
+    # Sizes of the containers held as values of a dict (e.g. Counter per product)
+    values = list(mapping.values())
+    if not values:
+        return 0
+    measured = values[:sample]
+    return int(sum(container_bytes(value) for value in measured) / len(measured) * len(values))
+
+
+def catalog_bytes(catalog):
+    return {
+        'columns': sum(array_bytes(column) for column in catalog._columns.values()),
+        'ids': container_bytes(catalog.ids),
+        'names': container_bytes(catalog.names),
+        'images': container_bytes(catalog.images),
+        'index': container_bytes(catalog.index),
+    }
+
+
+def shard_bytes(shard):
+    sizes = {'members': array_bytes(shard.members), 'position': container_bytes(shard.position)}
+    if shard.hashing is not None:
+        sizes['hashing_rows'] = sum(array_bytes(block) for block in shard.hashing._blocks)
+        sizes['hashing_df'] = array_bytes(shard.hashing.df)
+        sizes['hashing_text_hash'] = container_bytes(shard.hashing._text_hash)
+    else:
+        sizes['tfidf_matrix'] = array_bytes(shard.tfidf_matrix)
+        sizes['cosine_sim'] = array_bytes(shard.cosine_sim)
+    return sizes
+
+
+def _total(sizes):
+    return sum(_total(v) if isinstance(v, dict) else v for v in sizes.values())
+
+
+def component_bytes():
+    # Byte sizes of the long-lived model state of this worker. Modules that were never
+    # imported (lazy loading) simply do not appear. Each structure is measured under
+    # its owner's lock, since iterating a dict or deque that is being written raises.
+    components = {}
+    content_based = sys.modules.get('content_based')
+    if content_based is not None:
+        with content_based._model_cache_lock:
+            models = list(content_based._model_cache.items())
+        for (url, mode), model in models:
+            with model['catalog'].lock:
+                components[f"content_model[{mode}]"] = {
+                    'catalog': catalog_bytes(model['catalog']),
+                    'shards': {key: shard_bytes(shard) for key, shard in model['index'].shards.items()},
+                }
+
+    user_profiles = sys.modules.get('user_profiles')
+    if user_profiles is not None and user_profiles.profile_store._profiles is not None:
+        with user_profiles.profile_store._lock:
+            profiles = dict(user_profiles.profile_store._profiles)
+        components['user_profiles'] = {
+            'vectors': sum(array_bytes(entry['vector']) for entry in profiles.values()),
+            'entries': container_bytes(profiles),
+        }
+
+    neighbour_index = sys.modules.get('neighbour_index')
+    if neighbour_index is not None and neighbour_index.neighbour_index.table is not None:
+        neighbours = neighbour_index.neighbour_index.table.neighbours
+        components['neighbour_table'] = {
+            'arrays': sum(array_bytes(m) + array_bytes(s) for m, s in list(neighbours.values())),
+            'entries': container_bytes(neighbours),
+        }
+
+    event_stream = sys.modules.get('event_stream')
+    if event_stream is not None:
+        stream = event_stream.event_stream
+        with stream._lock:
+            components['event_stream'] = {
+                'events': container_bytes(stream._events),
+                'sessions': container_bytes(stream._sessions),
+                'co_counts': sum(container_bytes(co) + nested_bytes(co) for co in stream._co.values()),
+            }
+
+    admission = sys.modules.get('admission')
+    if admission is not None:
+        cache = admission.admission.cache
+        with cache._lock:
+            components['result_cache'] = {'entries': container_bytes(cache._items)}
+
+    return components
+
+
+def process_memory():
+    memory = {}
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux
+        memory['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            memory['rss'] = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    return memory
+
+
+class MemoryReporter:
+    # Each report is compared with the previous one: component byte deltas and, when
+    # tracemalloc is running, the allocation sites that grew the most since then
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_components = None
+        self._last_snapshot = None
+
+    def report(self, top=15, start_tracing=False):
+        if start_tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(max(TRACEMALLOC_FRAMES, 1))
+
+        with self._lock:
+            components = component_bytes()
+            totals = {name: _total(sizes) for name, sizes in components.items()}
+            report = {
+                'process': process_memory(),
+                'components': components,
+                'totals': totals,
+            }
+            if self._last_components is not None:
+                report['growth'] = {
+                    name: total - self._last_components.get(name, 0) for name, total in totals.items()
+                }
+            self._last_components = totals
+
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                ))
+                current, peak = tracemalloc.get_traced_memory()
+                report['tracemalloc'] = {
+                    'current': current,
+                    'peak': peak,
+                    'top': [_stat(stat) for stat in snapshot.statistics('lineno')[:top]],
+                }
+                if self._last_snapshot is not None:
+                    report['tracemalloc']['growth'] = [
+                        _stat(stat) for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:top]
+                    ]
+                self._last_snapshot = snapshot
+            return report
+
+
+def _stat(stat):
+    frame = stat.traceback[0]
+    entry = {'site': f"{frame.filename}:{frame.lineno}", 'size': stat.size, 'count': stat.count}
+    if hasattr(stat, 'size_diff'):
+        entry['size_diff'] = stat.size_diff
+        entry['count_diff'] = stat.count_diff
+    return entry
+
+
+if TRACEMALLOC_FRAMES > 0 and not tracemalloc.is_tracing():
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+memory_reporter = MemoryReporter()
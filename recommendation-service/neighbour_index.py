@@ -0,0 +1,165 @@
+from catalog import top_k_indices
+from single_flight import single_flight
+from collections import Counter
+import numpy as np
+import requests
+import logging
+import math
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored per product; /similar can return at most this many
+NEIGHBOURS_K = int(os.getenv("NEIGHBOURS_K", "50"))
+NEIGHBOURS_TTL = int(os.getenv("NEIGHBOURS_TTL", "600"))
+# Blend: content * w + co-purchase * (1 - w); products nobody bought fall back to content
+NEIGHBOURS_CONTENT_WEIGHT = float(os.getenv("NEIGHBOURS_CONTENT_WEIGHT", "0.6"))
+# Admin token for /admin/users/purchases; without it neighbours are content-only
+PRECOMPUTE_JWT = os.getenv("PRECOMPUTE_JWT")
+
+
+def fetch_purchases(node_api_url, api_key, jwt_token):
+    # {userId: {productId: count}} over every user's invoices
+    try:
+        response = requests.get(
+            f"{node_api_url}/admin/users/purchases",
+            headers={"Authorization": f"Bearer {jwt_token}", "x-api-key": api_key},
+            timeout=60
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.error("Purchases fetch error: %s", e)
+        return {}
+
+
+def co_purchase_similarities(purchases, catalog):
+    # Item-item cosine over purchase baskets: co(a, b) / sqrt(n(a) * n(b)),
+    # where n counts buyers and co counts buyers of both
+    buyers = Counter()
+    co = {}
+    for items in purchases.values():
+        basket = sorted({idx for idx in catalog.indices_of(list(items)).tolist() if idx >= 0})
+        buyers.update(basket)
+        for i, a in enumerate(basket):
+            for b in basket[i + 1:]:
+                co.setdefault(a, Counter())[b] += 1
+                co.setdefault(b, Counter())[a] += 1
+    return {
+        a: {b: count / math.sqrt(buyers[a] * buyers[b]) for b, count in partners.items()}
+        for a, partners in co.items()
+    }
+
+
+class NeighbourTable:
+    # Top-K similar products for every catalog product, blended from content and
+    # co-purchase similarity. Built offline; a lookup is a dict hit plus a mask over
+    # K stored candidates, so filters never touch the full catalog.
+    def __init__(self, catalog, neighbours, built_at):
+        self.catalog = catalog
+        self.neighbours = neighbours
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    @classmethod
+    def build(cls, cb, purchases=None, k=NEIGHBOURS_K, content_weight=NEIGHBOURS_CONTENT_WEIGHT):
+        catalog = cb.catalog
+        co = co_purchase_similarities(purchases, catalog) if purchases else {}
+        neighbours = {}
+        for idx in catalog.live_indices().tolist():
+            members, scores = cb.index.similar(idx, k, with_scores=True)
+            partners = co.get(idx)
+            if partners:
+                blended = dict(zip(members.tolist(), (np.asarray(scores) * content_weight).tolist()))
+                for other, score in partners.items():
+                    blended[other] = blended.get(other, 0.0) + score * (1 - content_weight)
+                members = np.fromiter(blended, dtype=np.int32, count=len(blended))
+                scores = np.fromiter(blended.values(), dtype=np.float32, count=len(blended))
+                top = top_k_indices(scores, k)
+                members, scores = members[top], scores[top]
+            if len(members):
+                neighbours[catalog.ids[idx]] = (members.astype(np.int32), np.asarray(scores, dtype=np.float32))
+        logger.info("Neighbour table built for %d products (%d with co-purchases)",
+                    len(neighbours), len(co))
+        return cls(catalog, neighbours, time.time())
+
+    def lookup(self, product_id, limit=10, category=None, brand=None,
+               min_price=None, max_price=None, in_stock=False):
+        entry = self.neighbours.get(str(product_id))
+        if entry is None or self.catalog.index_of(product_id) < 0:
+            return []
+        members, scores = entry
+        catalog = self.catalog
+        # Products retired after the table was built are masked out until it is rebuilt
+        mask = catalog.alive[members]
+        if category is not None:
+            code = catalog.category_code(category)
+            if code < 0:
+                return []
+            mask = _and(mask, catalog.category[members] == code)
+        if brand is not None:
+            code = catalog.brand_code(brand)
+            if code < 0:
+                return []
+            mask = _and(mask, catalog.brand[members] == code)
+        if min_price is not None:
+            mask = _and(mask, catalog.price[members] >= min_price)
+        if max_price is not None:
+            mask = _and(mask, catalog.price[members] <= max_price)
+        if in_stock:
+            mask = _and(mask, catalog.stock[members] > 0)
+        members, scores = members[mask], scores[mask]
+        ids = catalog.ids
+        return [(ids[i], float(s)) for i, s in zip(members[:limit].tolist(), scores[:limit].tolist())]
+
+
+def _and(mask, condition):
+    return condition if mask is None else mask & condition
+
+
+class NeighbourIndex:
+    # Holds the current table. Stale tables keep serving while a refresh runs in the
+    # background; only the very first request waits for a build.
+    def __init__(self, ttl=NEIGHBOURS_TTL):
+        self.ttl = ttl
+        self.table = None
+        self._refreshing = threading.Lock()
+
+    def get(self, node_api_url, api_key):
+        table = self.table
+        if table is None:
+            return single_flight.do(("neighbours", node_api_url), self.refresh, node_api_url, api_key)
+        if time.time() - table.built_at > self.ttl and self._refreshing.acquire(blocking=False):
+            threading.Thread(
+                target=self._background_refresh, args=(node_api_url, api_key),
+                name="neighbour-refresh", daemon=True
+            ).start()
+        return table
+
+    def _background_refresh(self, node_api_url, api_key):
+        try:
+            self.refresh(node_api_url, api_key)
+        except Exception as e:
+            logger.error("Neighbour refresh error: %s", e)
+        finally:
+            self._refreshing.release()
+
+    def refresh(self, node_api_url, api_key):
+        from content_based import ContentBasedRecommender
+
+        cb = ContentBasedRecommender(node_api_url, api_key, PRECOMPUTE_JWT)
+        if cb.prepare_similarity_matrix() is None:
+            return self.table
+        purchases = fetch_purchases(node_api_url, api_key, PRECOMPUTE_JWT) if PRECOMPUTE_JWT else {}
+        self.table = NeighbourTable.build(cb, purchases)
+        return self.table
+
+
+neighbour_index = NeighbourIndex()
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from recommendation_engine import HybridRecommender, NODE_API_URL, API_KEY
+from writeback import RecommendationWriter, new_version, USER_RECOMMENDATIONS, PRODUCT_SIMILARITIES
+from neighbour_index import NeighbourTable, fetch_purchases, PRECOMPUTE_JWT
+from logger import setup_logging
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", "5"))
+PRECOMPUTE_SIMILAR_N = int(os.getenv("PRECOMPUTE_SIMILAR_N", "10"))
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "8"))
+
+
+def user_ids(purchases):
+    # Users without purchases only ever get the popularity fallback
+    return [user_id for user_id, items in purchases.items() if items]
+
+
+def user_rows(recommender, user_ids, top_n, workers):
+    def rank(user_id):
+        try:
+            return user_id, recommender.rank(user_id, top_n)
+        except Exception as e:
+            logger.error("Precompute failed for user %s: %s", user_id, e)
+            return user_id, []
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="precompute") as pool:
+        for user_id, ranked in pool.map(rank, user_ids):
+            if ranked:
+                yield user_id, ranked
+
+
+def similarity_rows(table, k):
+    # Same blended content + co-purchase neighbours GET /similar serves
+    for product_id in table.neighbours:
+        yield product_id, table.lookup(product_id, k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendations and write them to MongoDB")
+    parser.add_argument("--top-n", type=int, default=PRECOMPUTE_TOP_N)
+    parser.add_argument("--similar-n", type=int, default=PRECOMPUTE_SIMILAR_N)
+    parser.add_argument("--workers", type=int, default=PRECOMPUTE_WORKERS)
+    parser.add_argument("--skip-users", action="store_true")
+    parser.add_argument("--skip-products", action="store_true")
+    parser.add_argument("--prune", action="store_true", help="delete lists older than this run")
+    args = parser.parse_args()
+
+    if not PRECOMPUTE_JWT:
+        logger.error("PRECOMPUTE_JWT (admin token) is not set")
+        return 1
+
+    recommender = HybridRecommender(PRECOMPUTE_JWT)
+    if recommender.cb.prepare_similarity_matrix() is None:
+        logger.error("Content model could not be built")
+        return 1
+
+    writer = RecommendationWriter()
+    version = new_version()
+    purchases = fetch_purchases(NODE_API_URL, API_KEY, PRECOMPUTE_JWT)
+
+    if not args.skip_products:
+        table = NeighbourTable.build(recommender.cb, purchases)
+        stats = writer.write_product_similarities(similarity_rows(table, args.similar_n), version)
+        if args.prune and not stats["failed"]:
+            writer.prune(PRODUCT_SIMILARITIES, version)
+
+    if not args.skip_users:
+        users = user_ids(purchases)
+        logger.info("Precomputing recommendations for %d users", len(users))
+        stats = writer.write_user_recommendations(
+            user_rows(recommender, users, args.top_n, args.workers), version
+        )
+        if args.prune and not stats["failed"]:
+            writer.prune(USER_RECOMMENDATIONS, version)
+    return 0
+
+
+if __name__ == '__main__':
+    setup_logging()
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+from collections import Counter
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Stage of a sample: the innermost frame whose module is one of these packages or
+# modules (or a submodule of one); names are matched whole, so 'json' is not 'json_stream'
+STAGES = (
+    (('requests', 'urllib3', 'http.client', 'socket', 'ssl'), 'node_api'),
+    (('json_stream', 'ijson'), 'ingest'),
+    (('collaborative_filtering',), 'collaborative'),
+    (('neighbour_index',), 'similar'),
+    (('content_based', 'sharded_index', 'hashing_model', 'user_profiles', 'catalog', 'sklearn', 'scipy'), 'content'),
+    (('event_stream',), 'events'),
+    (('recommendation_engine', 'admission', 'single_flight'), 'hybrid'),
+    (('fast_json',), 'serialize'),
+    (('werkzeug', 'flask'), 'framework'),
+)
+# Codecs used both to parse streamed catalog pages and to encode responses: a frame in
+# them belongs to the stage of its caller
+SHARED_CODECS = (('json', 'orjson'), 'serialize')
+
+
+def _in_package(module, names):
+    return any(module == name or module.startswith(name + '.') for name in names)
+
+
+def _stage_of(modules):
+    codec_names, codec_stage = SHARED_CODECS
+    in_codec = False
+    for module in modules:
+        if _in_package(module, codec_names):
+            in_codec = True
+            continue
+        for names, stage in STAGES:
+            if _in_package(module, names):
+                return stage
+    return codec_stage if in_codec else 'other'
+
+
+class StackSampler:
+    # Statistical profiler: every `interval` seconds it snapshots the stacks of all
+    # threads via sys._current_frames() and counts identical stacks. Nothing is
+    # instrumented, so the cost is one stack walk per thread per tick.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels = {}
+
+    def _label(self, frame):
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                frame.f_globals.get('__name__', '?'),
+                f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            )
+        return label
+
+    def busy(self):
+        return self._lock.locked()
+
+    def sample(self, seconds, interval=0.01, requests_only=True):
+        # Returns (stacks, stats). stacks maps "stage;outer;...;inner" to sample counts.
+        if not self._lock.acquire(blocking=False):
+            return None, None
+        try:
+            seconds = min(seconds, PROFILE_MAX_SECONDS)
+            own = threading.get_ident()
+            threads = set()
+            stacks = Counter()
+            ticks = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                ticks += 1
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    modules, labels = [], []
+                    while frame is not None:
+                        module, label = self._label(frame)
+                        modules.append(module)
+                        labels.append(label)
+                        frame = frame.f_back
+                    # Request threads are the ones inside Flask's dispatch
+                    if requests_only and 'app.py:full_dispatch_request' not in labels:
+                        continue
+                    stacks[_stage_of(modules) + ';' + ';'.join(reversed(labels))] += 1
+                    threads.add(ident)
+                time.sleep(interval)
+            stats = {
+                'seconds': seconds,
+                'interval': interval,
+                'ticks': ticks,
+                'samples': sum(stacks.values()),
+                'threads': len(threads),
+            }
+            return stacks, stats
+        finally:
+            self._lock.release()
+
+
+def folded(stacks):
+    # Brendan Gregg's folded format, as consumed by flamegraph.pl / speedscope
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+def by_stage(stacks):
+    stages = Counter()
+    for stack, count in stacks.items():
+        stages[stack.split(';', 1)[0]] += count
+    return dict(stages.most_common())
+
+
+sampler = StackSampler()
@@ -1,13 +1,72 @@
-from flask import Flask, request, jsonify
-from recommendation_engine import HybridRecommender
-import logging
+from boot_profile import boot
+from logger import setup_logging, NonBlockingQueueHandler
+import os
+import threading
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import requests
 
-app = Flask(__name__)
+# Handlers run on a background queue listener; request threads only enqueue records
+setup_logging()
+
+# Only light modules are imported here; NumPy / SciPy / scikit-learn are pulled in by
+# the warm-up thread (or by the first request that needs them), so the process can
+# answer health checks and event / cached traffic right away.
+with boot.stage("import flask"):
+    from flask import Flask, request, jsonify
+with boot.stage("import service modules"):
+    from recommendation_engine import HybridRecommender, NODE_API_URL, API_KEY
+    from event_stream import event_stream, EVENT_TYPES
+    from single_flight import single_flight
+    from access_check import access_checker
+    from fast_json import json_response
+    from admission import admission, trending, STATIC_RECOMMENDATIONS
+    from profiler import sampler, folded, by_stage
+    from memory_report import memory_reporter
+
+# 0 disables the warm-up thread; WARMUP_BUILD_MODEL also builds the content model
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_BUILD_MODEL = os.getenv("WARMUP_BUILD_MODEL", "1") == "1"
+DEFAULT_TOP_N = 5
+# Diagnostics endpoints under /admin are disabled unless this key is set
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+WARMUP_MODULES = ('numpy', 'scipy.sparse', 'sklearn.feature_extraction.text',
+                  'sklearn.metrics.pairwise', 'collaborative_filtering', 'content_based',
+                  'neighbour_index')
+
+with boot.stage("create app"):
+    app = Flask(__name__)
+
+
+def warm_up():
+    try:
+        for module in WARMUP_MODULES:
+            boot.import_module(module)
+        if WARMUP_BUILD_MODEL:
+            from content_based import ContentBasedRecommender
+            with boot.stage("build content model"):
+                ContentBasedRecommender(NODE_API_URL, API_KEY, None).prepare_similarity_matrix()
+            from neighbour_index import neighbour_index
+            with boot.stage("build neighbour table"):
+                neighbour_index.get(NODE_API_URL, API_KEY)
+    except Exception as e:
+        app.logger.error("Warm-up error: %s", e, exc_info=True)
+    finally:
+        boot.mark_warm()
+
+
+def start_warm_up():
+    if WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        boot.mark_warm()
+
+def is_admin():
+    return bool(ADMIN_API_KEY) and request.headers.get('x-admin-key') == ADMIN_API_KEY
+
+@app.route('/health', methods=['GET'])
+def health():
+    # Liveness answers immediately; "warm" tells whether heavy modules and the model are loaded
+    return json_response({"status": "ok", **boot.report()})
 
 @app.route('/recommendations', methods=['GET'])
 def recommendations():
@@ -21,14 +80,239 @@ def recommendations():
         return jsonify({"error": "Authorization header with Bearer token is required"}), 401
         
     jwt_token = auth_header.split(' ')[1]
-    
+    # Optional comma-separated category ids: only those index shards are queried
+    category = request.args.get('category')
+    categories = tuple(sorted(c for c in category.split(',') if c)) if category else None
+    # mode=ids returns only ranked ids and scores; fields=a,b adds a projection of each product
+    mode = request.args.get('mode', 'full')
+    fields = request.args.get('fields')
+    fields = tuple(f for f in fields.split(',') if f) if fields else None
+    if mode not in ('full', 'ids'):
+        return jsonify({"error": "mode must be 'full' or 'ids'"}), 400
+
     try:
+        # Cached per token and user; purchases themselves are fetched once, inside the
+        # shared and admitted computation below
+        access_checker.check(NODE_API_URL, API_KEY, user_id, jwt_token)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 502
+        if status in (401, 403):
+            return jsonify({"error": "Not allowed to read recommendations for this user"}), status
+        app.logger.error("Authorization check failed: %s", e)
+        return jsonify({"error": "Could not verify access"}), 502
+    except requests.RequestException as e:
+        app.logger.error("Authorization check failed: %s", e)
+        return jsonify({"error": "Could not verify access"}), 502
+
+    def compute():
         recommender = HybridRecommender(jwt_token)
-        recs = recommender.hybrid_recommendations(user_id)
-        return jsonify(recs)
+        if mode == 'ids':
+            return recommender.lean_recommendations(user_id, DEFAULT_TOP_N, categories=categories, fields=fields)
+        return recommender.hybrid_recommendations(user_id, DEFAULT_TOP_N, categories=categories)
+
+    # Access was checked above, so the key (and the cached result) is per user, not per token
+    key = ("recommendations", user_id, categories, mode, fields)
+    fallbacks = (
+        ('trending', lambda: trending_recommendations(mode, fields, categories, DEFAULT_TOP_N)),
+        ('static', lambda: static_recommendations(mode, fields, DEFAULT_TOP_N)),
+    )
+    
+    try:
+        # Identical concurrent requests (same user and query) share one computation;
+        # admission control decides whether it is a full one or a degraded tier
+        tier, recs = single_flight.do(key, admission.run, key, compute, fallbacks)
+        response = json_response(recs)
+        response.headers['X-Recommendation-Tier'] = tier
+        return response
     except Exception as e:
-        app.logger.error(f"API Error: {str(e)}", exc_info=True)
+        app.logger.error("API Error: %s", e, exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+def trending_recommendations(mode, fields, categories, limit):
+    from content_based import cached_model
+    model = cached_model(NODE_API_URL)
+    catalog, indices = trending.get(model['catalog'] if model else None)
+    if indices is None:
+        return None
+    # The list is refreshed on a TTL; products retired since then are dropped here
+    alive = catalog.alive
+    indices = [idx for idx in indices if alive[idx]]
+    if categories:
+        indices = [idx for idx in indices if catalog.category_id(idx) in categories]
+    indices = list(indices[:limit])
+    if not indices:
+        return None
+    if mode != 'ids':
+        return catalog.records(indices)
+    items = []
+    for idx in indices:
+        item = {"productId": catalog.ids[idx], "score": float(catalog.popularity[idx])}
+        if fields:
+            record = catalog.record(idx)
+            item.update({field: record.get(field) for field in fields})
+        items.append(item)
+    return items
+
+def static_recommendations(mode, fields, limit):
+    if not STATIC_RECOMMENDATIONS:
+        return None
+    product_ids = STATIC_RECOMMENDATIONS[:limit]
+    if mode == 'ids' and not fields:
+        return [{"productId": product_id, "score": 0.0} for product_id in product_ids]
+    # Products are resolved through the built registry, like the trending tier; ids
+    # it does not know are dropped rather than returned as bare stubs
+    from content_based import cached_model
+    model = cached_model(NODE_API_URL)
+    if model is None:
+        return None
+    catalog = model['catalog']
+    indices = [idx for idx in catalog.indices_of(product_ids).tolist() if idx >= 0]
+    if not indices:
+        return None
+    if mode != 'ids':
+        return catalog.records(indices)
+    items = []
+    for idx in indices:
+        record = catalog.record(idx)
+        item = {"productId": catalog.ids[idx], "score": 0.0}
+        item.update({field: record.get(field) for field in fields})
+        items.append(item)
+    return items
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return json_response({
+        "admission": admission.snapshot(),
+        "singleFlight": single_flight.in_flight(),
+        "events": event_stream.snapshot(),
+        "logging": {"dropped": NonBlockingQueueHandler.dropped}
+    })
+
+@app.route('/catalog/products', methods=['POST'])
+def catalog_products():
+    if request.headers.get('x-api-key') != API_KEY:
+        return jsonify({"error": "Valid x-api-key header is required"}), 401
+
+    products = request.get_json(silent=True)
+    if not isinstance(products, list) or not all(isinstance(p, dict) and p.get('_id') for p in products):
+        return jsonify({"error": "Body must be a JSON array of products with _id"}), 400
+
+    try:
+        from content_based import ContentBasedRecommender
+        cb = ContentBasedRecommender(NODE_API_URL, API_KEY, None)
+        updated = cb.add_products(products)
+        return jsonify({"received": len(products), "updated": updated})
+    except Exception as e:
+        app.logger.error("Catalog update error: %s", e, exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    if request.headers.get('x-api-key') != API_KEY:
+        return jsonify({"error": "Valid x-api-key header is required"}), 401
+
+    body = request.get_json(silent=True)
+    events = body.get('events') if isinstance(body, dict) else body
+    if not isinstance(events, list):
+        return jsonify({"error": "Body must be a JSON array of events or {\"events\": [...]}"}), 400
+
+    accepted = event_stream.ingest(events)
+    return jsonify({"received": len(events), "accepted": accepted}), 202
+
+@app.route('/also/<product_id>', methods=['GET'])
+def also_interacted(product_id):
+    kind = request.args.get('type', 'view')
+    if kind not in EVENT_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(EVENT_TYPES)}"}), 400
+    limit = request.args.get('limit', 10, type=int)
+
+    items = event_stream.also(product_id, kind, limit)
+    return json_response({
+        "productId": product_id,
+        "type": kind,
+        "items": [{"productId": pid, "score": count} for pid, count in items]
+    })
+
+@app.route('/session-recommendations', methods=['GET'])
+def session_recommendations():
+    # Session ids of signed-in shoppers are their user ids, so only internal callers
+    # (the BE, answering for the authenticated user) may read them
+    if request.headers.get('x-api-key') != API_KEY:
+        return jsonify({"error": "Valid x-api-key header is required"}), 401
+    session_id = request.args.get('sessionId')
+    if not session_id:
+        return jsonify({"error": "sessionId parameter is required"}), 400
+    limit = request.args.get('limit', 10, type=int)
+
+    items = event_stream.session_recommendations(session_id, limit)
+    return json_response({
+        "sessionId": session_id,
+        "items": [{"productId": pid, "score": round(score, 4)} for pid, score in items]
+    })
+
+@app.route('/similar/<product_id>', methods=['GET'])
+def similar_products(product_id):
+    # Served from the precomputed neighbour table; filters only mask its stored candidates
+    limit = request.args.get('limit', 10, type=int)
+    min_price = request.args.get('minPrice', type=float)
+    max_price = request.args.get('maxPrice', type=float)
+    in_stock = request.args.get('inStock', '').lower() in ('1', 'true')
+
+    try:
+        from neighbour_index import neighbour_index
+        table = neighbour_index.get(NODE_API_URL, API_KEY)
+        if table is None:
+            return jsonify({"error": "Similarity index unavailable"}), 503
+        items = table.lookup(
+            product_id, limit,
+            category=request.args.get('category'),
+            brand=request.args.get('brand'),
+            min_price=min_price,
+            max_price=max_price,
+            in_stock=in_stock
+        )
+        return json_response({
+            "productId": product_id,
+            "items": [{"productId": pid, "score": round(score, 4)} for pid, score in items]
+        })
+    except Exception as e:
+        app.logger.error("Similar products error: %s", e, exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/admin/profile', methods=['GET'])
+def profile():
+    # Samples live request threads for a few seconds; format=folded returns
+    # flame-graph input, otherwise JSON with per-stage totals and the folded stacks
+    if not is_admin():
+        return jsonify({"error": "Valid x-admin-key header is required"}), 403
+    seconds = request.args.get('seconds', 5, type=float)
+    interval = request.args.get('interval', 0.01, type=float)
+    requests_only = request.args.get('threads', 'requests') != 'all'
+    if seconds <= 0 or interval <= 0:
+        return jsonify({"error": "seconds and interval must be positive"}), 400
+
+    stacks, stats = sampler.sample(seconds, max(interval, 0.001), requests_only)
+    if stacks is None:
+        return jsonify({"error": "A profile is already running"}), 409
+    if request.args.get('format') == 'folded':
+        return app.response_class(folded(stacks), mimetype='text/plain')
+    return json_response({**stats, "stages": by_stage(stacks), "folded": folded(stacks).splitlines()})
+
+@app.route('/admin/memory', methods=['GET'])
+def memory():
+    # Byte sizes per model component plus growth since the previous call;
+    # trace=1 starts tracemalloc (if not already on) for allocation-site reports
+    if not is_admin():
+        return jsonify({"error": "Valid x-admin-key header is required"}), 403
+    top = request.args.get('top', 15, type=int)
+    start_tracing = request.args.get('trace', '').lower() in ('1', 'true')
+    try:
+        return json_response(memory_reporter.report(top, start_tracing))
+    except Exception as e:
+        app.logger.error("Memory report error: %s", e, exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+start_warm_up()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
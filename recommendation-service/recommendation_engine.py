@@ -1,17 +1,22 @@
 import logging
-from collaborative_filtering import CollaborativeFiltering
-from content_based import ContentBasedRecommender
 import requests
+import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+NODE_API_URL = os.getenv("NODE_API_URL", "http://localhost:8081/v1")
+API_KEY = os.getenv("API_KEY") or "XohvCe34tnpVulX9Xx2kNjsyNbeGWuOL"
+
+# Product fields the catalog registry holds exactly as /products/batch returns them
+REGISTRY_FIELDS = {'_id', 'name', 'base_price', 'category', 'brand'}
+
 class HybridRecommender:
     def __init__(self, jwt_token=None):
-        self.NODE_API_URL = "http://localhost:8081/v1"
-        self.API_KEY = "XohvCe34tnpVulX9Xx2kNjsyNbeGWuOL"
+        self.NODE_API_URL = NODE_API_URL
+        self.API_KEY = API_KEY
         self.JWT_TOKEN = jwt_token
         
         self.headers = {
@@ -21,7 +26,12 @@ class HybridRecommender:
         
         if jwt_token:
             self.headers["Authorization"] = f"Bearer {jwt_token}"
-        
+
+        # NumPy / SciPy / scikit-learn load on first use (or on the API's warm-up
+        # thread), so importing this module for its settings stays cheap
+        from collaborative_filtering import CollaborativeFiltering
+        from content_based import ContentBasedRecommender
+
         self.cf = CollaborativeFiltering(
             self.NODE_API_URL, 
             self.API_KEY, 
@@ -43,63 +53,119 @@ class HybridRecommender:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            logger.error(f"Error fetching purchases: {str(e)}")
+            logger.error("Error fetching purchases: %s", e)
             return []
 
-    def hybrid_recommendations(self, user_id, top_n=5):
+    def rank(self, user_id, top_n=5, categories=None):
+        # Ranked (product_id, score) pairs without purchased items; empty when
+        # there is nothing to personalise on
+        logger.info("Processing recommendations for user: %s", user_id)
+
+        purchased = self.get_purchased_products(user_id)
+        cf_recs = []
+        cb_recs = []
+
+        if purchased:
+            cf_recs = self.cf.recommend(user_id, top_n, categories, with_categories=True,
+                                        purchases=purchased) or []
+
+            try:
+                # Purchases arrive newest first; profiles expect oldest first
+                history = [str(item['productId']) for item in reversed(purchased)]
+                cb_recs = self.cb.recommend_for_user(user_id, history, top_n, categories) or []
+            except KeyError as e:
+                logger.warning("Purchase history error: %s", e)
+
+        all_recs = {}
+        cf_categories = {}
+
+        if cf_recs:
+            for item_id, score, category_id in cf_recs:
+                all_recs[item_id] = score * 1.5
+                cf_categories[item_id] = category_id
+
+        for product in cb_recs:
+            if isinstance(product, dict):
+                product_id = product.get('_id')
+                if product_id:
+
+                    current_score = all_recs.get(product_id, 0)
+                    all_recs[product_id] = current_score + 1.0
+
+        purchased_ids = set(str(item['productId']) for item in purchased)
+        catalog = self.cb.catalog
+
+        def category_of(product_id):
+            # Registry first; CF items it does not hold yet use the category CF listed them under
+            if catalog is not None and product_id in catalog:
+                return catalog.category_id(catalog.index_of(product_id))
+            return cf_categories.get(product_id)
+
+        ranked = [
+            (product_id, score) for product_id, score in all_recs.items()
+            if product_id not in purchased_ids
+            and not (categories and category_of(product_id) not in categories)
+        ]
+        return sorted(ranked, key=lambda x: x[1], reverse=True)[:top_n]
+
+    def hybrid_recommendations(self, user_id, top_n=5, categories=None):
         try:
-            logger.info(f"Processing recommendations for user: {user_id}")
-            
-            purchased = self.get_purchased_products(user_id)
-            cf_recs = []
-            cb_recs = []
-
-            if purchased:
-                cf_recs = self.cf.recommend(user_id, top_n) or []
-                
-                try:
-                    last_purchased = purchased[-1]['productId']
-                    cb_recs = self.cb.recommend(last_purchased, top_n) or []
-                except (IndexError, KeyError) as e:
-                    logger.warning(f"Last purchase error: {str(e)}")
-
-            all_recs = {}
-            
-            if cf_recs:
-                for item_id, score in cf_recs:
-                    all_recs[item_id] = score * 1.5  
-            
-            for product in cb_recs:
-                if isinstance(product, dict):
-                    product_id = product.get('_id')
-                    if product_id:
-                        
-                        current_score = all_recs.get(product_id, 0)
-                        all_recs[product_id] = current_score + 1.0
-            
-            if not all_recs:
+            sorted_recs = self.rank(user_id, top_n, categories)
+            if not sorted_recs:
                 return self.get_fallback_recommendations(top_n)
 
-            sorted_recs = sorted(
-                all_recs.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:top_n]
-            
             product_ids = [item[0] for item in sorted_recs]
             recommendations = self.get_product_details(product_ids)
-            
-            purchased_ids = set(str(item['productId']) for item in purchased)
-            filtered_recommendations = [
-                product for product in recommendations
-                if str(product.get('_id')) not in purchased_ids
-            ]
+
+            # /products/batch returns documents in storage order; restore the ranking
+            position = {product_id: i for i, product_id in enumerate(product_ids)}
+            filtered_recommendations = sorted(
+                (product for product in recommendations if str(product.get('_id')) in position),
+                key=lambda product: position[str(product.get('_id'))]
+            )
+            if categories:
+                filtered_recommendations = [
+                    product for product in filtered_recommendations
+                    if str((product.get('category') or {}).get('_id')) in categories
+                ]
             return filtered_recommendations[:top_n]
-            
+
         except Exception as e:
-            logger.error(f"Hybrid recommendation failed: {str(e)}", exc_info=True)
+            logger.error("Hybrid recommendation failed: %s", e, exc_info=True)
             return self.get_fallback_recommendations(top_n)
 
+    def lean_recommendations(self, user_id, top_n=5, categories=None, fields=None):
+        # Ranked ids and scores only; fields opts into a projection of each product.
+        # Projections the catalog registry can answer skip /products/batch entirely.
+        try:
+            ranked = self.rank(user_id, top_n, categories)
+        except Exception as e:
+            logger.error("Hybrid ranking failed: %s", e, exc_info=True)
+            ranked = []
+        if not ranked:
+            fallback = self.get_fallback_recommendations(top_n)[:top_n]
+            ranked = [(str(p.get('_id')), 0.0) for p in fallback]
+            details = {str(p.get('_id')): p for p in fallback} if fields else {}
+        elif fields:
+            details = self.get_projected_details([pid for pid, _ in ranked], fields)
+        else:
+            details = {}
+
+        items = []
+        for product_id, score in ranked:
+            item = {"productId": product_id, "score": round(float(score), 4)}
+            if fields:
+                product = details.get(product_id) or {}
+                item.update({field: product.get(field) for field in fields})
+            items.append(item)
+        return items
+
+    def get_projected_details(self, product_ids, fields):
+        catalog = self.cb.catalog
+        if catalog is not None and set(fields) <= REGISTRY_FIELDS and all(pid in catalog for pid in product_ids):
+            return {pid: catalog.record(catalog.index_of(pid)) for pid in product_ids}
+        return {str(p.get('_id')): p for p in self.get_product_details(product_ids)}
+
     def get_fallback_recommendations(self, top_n):
         try:
             response = requests.get(
@@ -115,7 +181,7 @@ class HybridRecommender:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            logger.error(f"Fallback failed: {str(e)}")
+            logger.error("Fallback failed: %s", e)
             return []
 
     def get_product_details(self, product_ids):
@@ -132,5 +198,5 @@ class HybridRecommender:
             response.raise_for_status()
             return response.json()
         except Exception as e:
-            logger.error(f"Product details error: {str(e)}")
+            logger.error("Product details error: %s", e)
             return []
\ No newline at end of file
@@ -0,0 +1,255 @@
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+from concurrent.futures import ThreadPoolExecutor
+from catalog import top_k_indices
+from hashing_model import HashingContentModel
+import numpy as np
+import logging
+import os
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# none | category | category_brand
+CONTENT_SHARD_BY = os.getenv("CONTENT_SHARD_BY", "category")
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "4"))
+ALL_SHARD = 'all'
+
+_query_pool = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard-query")
+
+
+def shard_key(catalog, idx, shard_by):
+    if shard_by == 'none':
+        return ALL_SHARD
+    category = catalog.category[idx]
+    key = catalog.category_refs[category]['_id'] if category >= 0 else 'uncategorized'
+    if shard_by == 'category_brand':
+        brand = catalog.brand[idx]
+        key = f"{key}:{catalog.brand_refs[brand]['_id'] if brand >= 0 else 'unbranded'}"
+    return key
+
+
+def _digest(members, texts):
+    checksum = 0
+    for idx, text in sorted(zip(members, texts)):
+        checksum = zlib.crc32(f"{idx}\0{text}\0".encode('utf-8'), checksum)
+    return checksum
+
+
+class ContentShard:
+    # Content model over one partition of the catalog. Rows are ordered like
+    # `members` (catalog indices); every score array is aligned with it.
+    def __init__(self, key, mode, n_features):
+        self.key = key
+        self.mode = mode
+        self.n_features = n_features
+        self.members = np.empty(0, dtype=np.int32)
+        self.position = {}
+        self.digest = None
+        self.tfidf_matrix = None
+        self.cosine_sim = None
+        self.vocabulary_digest = None
+        self.hashing = HashingContentModel(n_features=n_features) if mode == 'hashing' else None
+        self.built_at = None
+
+    def __len__(self):
+        return len(self.members)
+
+    def build(self, members, texts, digest):
+        members = np.asarray(members, dtype=np.int32)
+        if self.hashing is not None:
+            keep = set(members.tolist())
+            for idx in self.members.tolist():
+                if idx not in keep:
+                    self.hashing.remove(idx)
+            self.hashing.upsert(members, texts)
+        else:
+            vectorizer = TfidfVectorizer(stop_words='english')
+            self.tfidf_matrix = vectorizer.fit_transform(texts).tocsr()
+            self.cosine_sim = linear_kernel(self.tfidf_matrix, self.tfidf_matrix)
+            # Terms in column order plus their idf weights fully determine the space
+            checksum = zlib.crc32("\0".join(vectorizer.get_feature_names_out()).encode('utf-8'))
+            self.vocabulary_digest = zlib.crc32(vectorizer.idf_.tobytes(), checksum)
+        self.members = members
+        self.position = {int(idx): pos for pos, idx in enumerate(members)}
+        self.digest = digest
+        self.built_at = time.time()
+
+    def upsert(self, indices, texts):
+        # Hashing shards only: insert new/edited products in place
+        changed = self.hashing.upsert(indices, texts)
+        added = [int(idx) for idx in indices if int(idx) not in self.position]
+        if added:
+            self.members = np.concatenate([self.members, np.array(added, dtype=np.int32)])
+            self.position = {int(idx): pos for pos, idx in enumerate(self.members)}
+        self.digest = None
+        return changed
+
+    def remove(self, idx):
+        if idx not in self.position:
+            return
+        if self.hashing is not None:
+            self.hashing.remove(idx)
+        self.members = self.members[self.members != idx]
+        self.position = {int(i): pos for pos, i in enumerate(self.members)}
+        self.digest = None
+
+    def feature_space(self):
+        # Hashed features are stable across refreshes and hashing profiles hold tf
+        # only; a refit TF-IDF space only changes when its vocabulary or idf weights do
+        if self.hashing is not None:
+            return ('hashing-tf', self.n_features)
+        return ('tfidf', self.key, self.vocabulary_digest)
+
+    def profile_vector(self, idx):
+        # Vector a user profile sums for this item: tf only for hashing shards, whose
+        # idf moves with every insert (applied by profile_query), tf-idf otherwise
+        if self.hashing is not None:
+            return self.hashing.tf_vector(idx) if idx in self.position else None
+        return self.vector(idx)
+
+    def profile_query(self, profile):
+        if self.hashing is not None:
+            return self.hashing.weight(profile)
+        return profile
+
+    def vector(self, idx):
+        pos = self.position.get(idx)
+        if pos is None:
+            return None
+        if self.hashing is not None:
+            return self.hashing.vector(idx)
+        return self.tfidf_matrix[pos]
+
+    def similarities(self, idx):
+        if self.hashing is not None:
+            return self.scores(self.hashing.vector(idx))
+        return self.cosine_sim[self.position[idx]]
+
+    def scores(self, vector):
+        if self.hashing is not None:
+            size = int(self.members.max()) + 1 if len(self.members) else 0
+            return self.hashing.scores(vector, size)[self.members]
+        return (self.tfidf_matrix @ vector.T).toarray().ravel()
+
+
+class ShardedContentIndex:
+    # Content index partitioned by category (optionally category + brand). Shards are
+    # built in parallel, only shards whose products changed are rebuilt on refresh,
+    # and queries only touch the shards they need.
+    def __init__(self, mode, n_features, shard_by=CONTENT_SHARD_BY, workers=SHARD_WORKERS):
+        self.mode = mode
+        self.n_features = n_features
+        self.shard_by = shard_by
+        self.workers = workers
+        self.shards = {}
+        self.shard_of = {}
+        self._deferred = None # Upserts queued while a sync builds shards
+
+    def sync(self, catalog, indices, texts):
+        # indices/texts describe the full current catalog. Returns rebuilt shard keys.
+        # Shard membership is cut from the registry under catalog.lock; the shards are
+        # built outside it, so add_products and registry writers are not held up by a
+        # refresh. Upserts arriving meanwhile are queued and applied after the swap.
+        with catalog.lock:
+            groups = {}
+            for idx, text in zip(indices, texts):
+                idx = int(idx)
+                members, shard_texts = groups.setdefault(shard_key(catalog, idx, self.shard_by), ([], []))
+                members.append(idx)
+                shard_texts.append(text)
+
+            stale = []
+            for key, (members, shard_texts) in groups.items():
+                digest = _digest(members, shard_texts)
+                shard = self.shards.get(key)
+                if shard is not None and shard.digest == digest:
+                    continue
+                # TF-IDF shards are rebuilt off to the side and swapped in; hashing
+                # shards are updated in place since only changed rows are touched
+                if shard is None or self.mode != 'hashing':
+                    shard = ContentShard(key, self.mode, self.n_features)
+                stale.append((shard, members, shard_texts, digest))
+            self._deferred = []
+
+        built = False
+        try:
+            if stale:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard-build") as pool:
+                    list(pool.map(lambda job: job[0].build(*job[1:]), stale))
+            built = True
+        finally:
+            with catalog.lock:
+                deferred, self._deferred = self._deferred, None
+                if built:
+                    shards = {key: self.shards.get(key) for key in groups}
+                    for shard, *_ in stale:
+                        shards[shard.key] = shard
+                    self.shards = shards
+                    self.shard_of = {idx: key for key, (members, _) in groups.items() for idx in members}
+                for upsert_indices, upsert_texts in deferred:
+                    self._upsert(catalog, upsert_indices, upsert_texts)
+
+        rebuilt = [shard.key for shard, *_ in stale]
+        logger.info("Content index synced: rebuilt %d of %d shard(s), %d queued upsert(s) applied",
+                    len(rebuilt), len(groups), len(deferred))
+        return rebuilt
+
+    def upsert(self, catalog, indices, texts):
+        # Incremental insert for hashing shards; moves products whose shard changed.
+        # During a sync the batch is queued and counted as changed.
+        with catalog.lock:
+            if self._deferred is not None:
+                self._deferred.append((list(indices), list(texts)))
+                return len(indices)
+            return self._upsert(catalog, indices, texts)
+
+    def _upsert(self, catalog, indices, texts):
+        groups = {}
+        for idx, text in zip(indices, texts):
+            idx = int(idx)
+            key = shard_key(catalog, idx, self.shard_by)
+            previous = self.shard_of.get(idx)
+            if previous is not None and previous != key and previous in self.shards:
+                self.shards[previous].remove(idx)
+            self.shard_of[idx] = key
+            members, shard_texts = groups.setdefault(key, ([], []))
+            members.append(idx)
+            shard_texts.append(text)
+
+        changed = 0
+        for key, (members, shard_texts) in groups.items():
+            shard = self.shards.get(key)
+            if shard is None:
+                shard = self.shards[key] = ContentShard(key, self.mode, self.n_features)
+            changed += len(shard.upsert(members, shard_texts))
+        return changed
+
+    def shard_keys(self, categories=None):
+        if not categories or self.shard_by == 'none':
+            return list(self.shards)
+        categories = {str(c) for c in categories}
+        return [key for key in self.shards if key.split(':')[0] in categories]
+
+    def shard_for(self, idx):
+        key = self.shard_of.get(idx)
+        return self.shards.get(key) if key is not None else None
+
+    def similar(self, idx, k, with_scores=False):
+        shard = self.shard_for(idx)
+        if shard is None or idx not in shard.position:
+            empty = np.empty(0, dtype=np.int32)
+            return (empty, np.empty(0, dtype=np.float32)) if with_scores else empty
+        scores = shard.similarities(idx)
+        top = top_k_indices(scores, k, exclude=shard.position[idx])
+        if with_scores:
+            return shard.members[top], np.asarray(scores)[top]
+        return shard.members[top]
+
+    def map_shards(self, fn, keys):
+        # Runs fn(shard) over several shards in parallel; returns (shard, result) pairs
+        shards = [self.shards[key] for key in keys if key in self.shards]
+        if len(shards) <= 1:
+            return [(shard, fn(shard)) for shard in shards]
+        return list(zip(shards, _query_pool.map(fn, shards)))
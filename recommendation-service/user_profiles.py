@@ -0,0 +1,182 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DECAY = float(os.getenv("PROFILE_DECAY", "0.8"))
+# Profiles are saved as plain arrays (user_profiles.npz, no pickle) in this directory
+PROFILE_DATA_DIR = os.getenv("PROFILE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+PROFILE_STORE_PATH = os.path.join(PROFILE_DATA_DIR, "user_profiles.npz")
+PROFILE_SAVE_INTERVAL = int(os.getenv("PROFILE_SAVE_INTERVAL", "60"))
+# Stored profiles (one per user per shard); least recently used ones are evicted
+PROFILE_MAX_ENTRIES = int(os.getenv("PROFILE_MAX_ENTRIES", "100000"))
+
+
+def _history_digest(product_ids):
+    return zlib.crc32("\n".join(product_ids).encode('utf-8'))
+
+
+class UserProfileStore:
+    # Per-user content profile: a recency-weighted sum of the content vectors of
+    # everything the user bought (newest weight 1, each older purchase * decay).
+    # Which vectors are summed is up to the caller: hashing shards pass idf-free tf
+    # vectors and weight the profile at query time, so stored profiles survive df changes.
+    # Histories are append-only, so new purchases are folded into the stored vector
+    # instead of re-summing the whole history. At most max_entries profiles are kept,
+    # evicting the least recently used.
+    def __init__(self, path=PROFILE_STORE_PATH, decay=PROFILE_DECAY, save_interval=PROFILE_SAVE_INTERVAL,
+                 max_entries=PROFILE_MAX_ENTRIES):
+        self.path = path
+        self.decay = decay
+        self.save_interval = save_interval
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._profiles = None
+        self._dirty = False
+        self._saved_at = time.time()
+
+    def _entries(self):
+        if self._profiles is None:
+            self._profiles = OrderedDict()
+            if self.path and os.path.exists(self.path):
+                try:
+                    loaded = _load(self.path)
+                    # Oldest first, so the trim below drops the stalest profiles
+                    self._profiles = OrderedDict(sorted(loaded.items(), key=lambda item: item[1]['updated_at']))
+                    self._trim()
+                    logger.info("Loaded %d user profiles from %s", len(self._profiles), self.path)
+                except Exception as e:
+                    logger.error("Profile store load error: %s", e)
+        return self._profiles
+
+    def _trim(self):
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+
+    def profile(self, user_id, history, vectorize, space):
+        # history: purchased product ids, oldest first. vectorize(product_id) returns a
+        # 1 x n_features sparse row or None. space identifies the feature space the
+        # vectors live in; profiles built in another space are recomputed.
+        history = [str(pid) for pid in history]
+        with self._lock:
+            entries = self._entries()
+            entry = entries.get(user_id)
+            if entry is not None:
+                entries.move_to_end(user_id)
+
+        if (entry is None or entry['space'] != space or entry['seen'] > len(history)
+                or entry['digest'] != _history_digest(history[:entry['seen']])):
+            vector, seen = None, 0
+        else:
+            vector, seen = entry['vector'], entry['seen']
+
+        new_items = history[seen:]
+        if not new_items and vector is not None:
+            return vector
+
+        if vector is not None:
+            vector = vector * (self.decay ** len(new_items))
+        for age, product_id in enumerate(reversed(new_items)):
+            item_vector = vectorize(product_id)
+            if item_vector is None:
+                continue
+            weighted = item_vector * (self.decay ** age)
+            vector = weighted if vector is None else vector + weighted
+
+        if vector is None:
+            return None
+
+        vector = vector.tocsr()
+        with self._lock:
+            entries = self._entries()
+            entries[user_id] = {
+                'vector': vector,
+                'seen': len(history),
+                'digest': _history_digest(history),
+                'space': space,
+                'updated_at': time.time()
+            }
+            entries.move_to_end(user_id)
+            self._trim()
+            self._dirty = True
+        self.maybe_save()
+        return vector
+
+    def maybe_save(self):
+        if self._dirty and time.time() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or self._profiles is None:
+                return
+            snapshot = dict(self._profiles)
+            self._dirty = False
+            self._saved_at = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                _dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error("Profile store save error: %s", e)
+
+
+def _dump(profiles, f):
+    # One row per profile; the sparse vectors are concatenated CSR-style (indptr
+    # offsets into indices/data). Spaces are JSON, everything else plain numbers.
+    keys = list(profiles)
+    entries = [profiles[key] for key in keys]
+    vectors = [entry['vector'].tocsr() for entry in entries]
+    np.savez(
+        f,
+        keys=np.array(keys, dtype=str),
+        spaces=np.array([json.dumps(list(entry['space'])) for entry in entries], dtype=str),
+        seen=np.array([entry['seen'] for entry in entries], dtype=np.int64),
+        digest=np.array([entry['digest'] for entry in entries], dtype=np.int64),
+        updated_at=np.array([entry['updated_at'] for entry in entries], dtype=np.float64),
+        n_features=np.array([vector.shape[1] for vector in vectors], dtype=np.int64),
+        indptr=np.concatenate([[0], np.cumsum([vector.nnz for vector in vectors], dtype=np.int64)]),
+        indices=np.concatenate([vector.indices for vector in vectors]) if vectors else np.empty(0, dtype=np.int32),
+        data=np.concatenate([vector.data for vector in vectors]) if vectors else np.empty(0),
+    )
+
+
+def _load(path):
+    with np.load(path, allow_pickle=False) as f:
+        indptr, indices, data = f['indptr'], f['indices'], f['data']
+        profiles = {}
+        for i, key in enumerate(f['keys'].tolist()):
+            start, end = indptr[i], indptr[i + 1]
+            vector = sp.csr_matrix(
+                (data[start:end], indices[start:end], np.array([0, end - start])),
+                shape=(1, int(f['n_features'][i]))
+            )
+            profiles[key] = {
+                'vector': vector,
+                'seen': int(f['seen'][i]),
+                'digest': int(f['digest'][i]),
+                'space': tuple(json.loads(f['spaces'][i])),
+                'updated_at': float(f['updated_at'][i]),
+            }
+    return profiles
+
+
+profile_store = UserProfileStore()
+atexit.register(profile_store.save)
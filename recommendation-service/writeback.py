@@ -0,0 +1,100 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME")
+WRITEBACK_BATCH_SIZE = int(os.getenv("WRITEBACK_BATCH_SIZE", "1000"))
+
+USER_RECOMMENDATIONS = "user_recommendations"
+PRODUCT_SIMILARITIES = "product_similarities"
+
+
+def new_version():
+    # Millisecond timestamp: later precompute runs always carry a larger version
+    return int(time.time() * 1000)
+
+
+class RecommendationWriter:
+    # Writes precomputed lists into MongoDB so the storefront can read them with a
+    # single indexed lookup. Each list is one document keyed by userId / productId,
+    # upserted in unordered bulk_write batches. Documents carry the version of the
+    # run that wrote them and are never overwritten by an older run.
+    def __init__(self, mongo_uri=MONGO_URI, db_name=DB_NAME, batch_size=WRITEBACK_BATCH_SIZE, db=None):
+        if db is None:
+            from pymongo import MongoClient
+            db = MongoClient(mongo_uri)[db_name]
+        self.db = db
+        self.batch_size = batch_size
+        self._indexed = set()
+
+    def _collection(self, name, key):
+        collection = self.db[name]
+        if name not in self._indexed:
+            collection.create_index(key, unique=True)
+            collection.create_index("version")
+            self._indexed.add(name)
+        return collection
+
+    def write_user_recommendations(self, rows, version):
+        # rows: iterable of (user_id, [(product_id, score), ...])
+        return self._write(USER_RECOMMENDATIONS, "userId", rows, version)
+
+    def write_product_similarities(self, rows, version):
+        # rows: iterable of (product_id, [(product_id, score), ...])
+        return self._write(PRODUCT_SIMILARITIES, "productId", rows, version)
+
+    def _write(self, name, key, rows, version):
+        from pymongo import UpdateOne
+
+        collection = self._collection(name, key)
+        stats = {"written": 0, "stale": 0, "failed": 0}
+        updated_at = datetime.now(timezone.utc)
+        batch = []
+        for owner, items in rows:
+            doc = {
+                "items": [{"productId": str(pid), "score": round(float(score), 4)} for pid, score in items],
+                "version": version,
+                "updatedAt": updated_at
+            }
+            # Matching only older versions means a newer document makes the upsert
+            # collide with the unique key instead of being overwritten
+            batch.append(UpdateOne(
+                {key: str(owner), "version": {"$lt": version}},
+                {"$set": doc},
+                upsert=True
+            ))
+            if len(batch) >= self.batch_size:
+                self._flush(collection, batch, stats)
+                batch = []
+        if batch:
+            self._flush(collection, batch, stats)
+        logger.info("Wrote %d %s documents (version %s, %d newer kept, %d failed)",
+                    stats['written'], name, version, stats['stale'], stats['failed'])
+        return stats
+
+    def _flush(self, collection, batch, stats):
+        from pymongo.errors import BulkWriteError
+
+        try:
+            result = collection.bulk_write(batch, ordered=False)
+            stats["written"] += result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            stale = sum(1 for err in details.get("writeErrors", []) if err.get("code") == 11000)
+            stats["stale"] += stale
+            stats["failed"] += len(details.get("writeErrors", [])) - stale
+            stats["written"] += details.get("nUpserted", 0) + details.get("nMatched", 0)
+            if stale != len(details.get("writeErrors", [])):
+                logger.error("Write-back errors in %s: %s", collection.name, details.get('writeErrors', [])[:3])
+
+    def prune(self, name, version):
+        # Drops lists the run that wrote `version` no longer produced
+        # (deleted products, users without enough history any more)
+        return self.db[name].delete_many({"version": {"$lt": version}}).deleted_count